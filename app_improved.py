@@ -2,12 +2,18 @@
 import streamlit as st
 import pandas as pd
 import os
-import tempfile
-import time
+import io
 from datetime import date
-from utils.excel_reader import read_excel_file, validate_row, validate_excel_data
-from utils.pdf_generator import generate_pdf
-from utils.email_sender import send_email, check_smtp_connection
+from utils.excel_reader import read_excel_upload, check_excel_header, detect_file_format
+from utils.pdf_generator import generate_pdf, get_testo_modello
+from utils.attestato_template import check_template
+from utils.email_sender import check_smtp_connection, SmtpConnectionPool, is_throttling_error
+from utils.rate_limiter import AdaptiveRateLimiter
+from utils.outbox import EmailOutbox
+from utils.sheet_history import SheetHistory
+from utils.session_dataset import SessionDataset, spill_idle_datasets
+from utils.job_runner import JobRunner, STATUS_QUEUED, STATUS_RUNNING, STATUS_FAILED, STATUS_CANCELLED
+from utils.batch import create_temp_dir, run_generation_job, run_resume_job
 from utils.ui_components import (
     custom_header, show_info_box, progress_bar_with_status, 
     show_help_section, show_data_preview, show_footer
@@ -28,25 +34,29 @@ st.set_page_config(
     layout="wide"
 )
 
-# Funzione per creare una directory temporanea per i PDF
-def create_temp_dir():
-    temp_dir = os.path.join(tempfile.gettempdir(), "attestati_temp")
-    os.makedirs(temp_dir, exist_ok=True)
-    return temp_dir
-
 # Assicura che la directory logs esista
 logs_dir = os.path.join(os.path.dirname(__file__), "logs")
 os.makedirs(logs_dir, exist_ok=True)
 
+# Scarica su disco i dataset delle sessioni rimaste inattive
+spill_idle_datasets()
+
 # Inizializzazione delle variabili di sessione
-if 'df' not in st.session_state:
-    st.session_state.df = None
+if 'dataset' not in st.session_state:
+    # Dataset del file caricato (SessionDataset), letto con st.session_state.dataset.get()
+    st.session_state.dataset = None
 if 'file_name' not in st.session_state:
     st.session_state.file_name = None
 if 'logo' not in st.session_state:
     st.session_state.logo = None
 if 'firma' not in st.session_state:
     st.session_state.firma = None
+if 'upload_id' not in st.session_state:
+    # Identificativo dell'ultimo file caricato e risultato della sua lettura (SessionDataset o None, errore)
+    st.session_state.upload_id = None
+    st.session_state.upload_result = (None, None)
+    # True se il file è troppo grande per essere caricato e viene letto a blocchi durante la generazione
+    st.session_state.upload_streaming = False
 if 'smtp_configured' not in st.session_state:
     # Verifica se le credenziali SMTP sono state configurate
     st.session_state.smtp_configured = (
@@ -54,88 +64,106 @@ if 'smtp_configured' not in st.session_state:
         config.SMTP_PASSWORD != ""
     )
 
-# Funzione per generare PDF e inviare email
-def process_attestato(row, logo_path, firma_path, send_mail=True):
+@st.cache_resource
+def get_outbox():
+    """
+    Restituisce l'outbox degli invii, condivisa da tutte le sessioni dell'app
+    """
+    return EmailOutbox()
+
+@st.cache_resource
+def get_sheet_history():
+    """
+    Restituisce le impronte delle righe già elaborate dei file, condivise da tutte le sessioni dell'app
+    """
+    return SheetHistory()
+
+def show_results(success_messages, error_messages, retry_policy=None, skipped=0, unchanged=0):
+    """
+    Mostra il riepilogo delle operazioni riuscite e degli errori di un lotto
     """
-    Elabora un singolo attestato: genera il PDF e invia l'email se richiesto.
+    if unchanged:
+        st.info(f"{unchanged} righe non inviate perché invariate rispetto all'invio precedente del file")
     
-    Args:
-        row (pd.Series): Una riga del DataFrame con i dati dell'attestato
-        logo_path (str): Percorso del logo
-        firma_path (str): Percorso della firma
-        send_mail (bool): Se True, invia l'email con l'attestato
-        
-    Returns:
-        bool, str: (True, pdf_path) se l'operazione ha successo, (False, error_message) altrimenti
+    if skipped:
+        st.info(f"{skipped} righe saltate: l'attestato risulta già inviato")
+    
+    if retry_policy is not None and retry_policy.stats['ritentativi']:
+        stats = retry_policy.stats
+        st.info(
+            f"{stats['ritentativi']} invii ripetuti dopo errori temporanei "
+            f"({stats['recuperati']} email recuperate, {stats['tentativi_esauriti']} non riuscite dopo {retry_policy.max_attempts} tentativi)"
+        )
+    
+    if success_messages:
+        st.success(f"{len(success_messages)} attestati generati con successo")
+        with st.expander("Dettagli operazioni riuscite", expanded=False):
+            for msg in success_messages:
+                st.write(f"✅ {msg}")
+    
+    if error_messages:
+        st.error(f"{len(error_messages)} errori durante la generazione")
+        with st.expander("Dettagli errori", expanded=True):
+            for msg in error_messages:
+                st.write(f"❌ {msg}")
+
+@st.cache_resource
+def get_job_runner():
     """
-    try:
-        # Crea un dizionario con i dati per il PDF
-        pdf_data = {
-            'nome_cognome': row['nome_cognome'],
-            'data': row['data'],
-            'ora_inizio': row['ora_inizio'],
-            'ora_fine': row['ora_fine'],
-            'aula': row['aula'],
-            'dipartimento': row['dipartimento'],
-            'indirizzo': row['indirizzo'],
-            'tipo_lezione': row['tipo_lezione'],
-            'tipo_percorso': row['tipo_percorso'],
-            'classe_concorso': row['classe_concorso']
-        }
-        
-        # Genera il PDF con il modello selezionato
-        output_dir = create_temp_dir()
-        modello = st.session_state.get('attestato_modello', 'presenza')
-        pdf_path = generate_pdf(pdf_data, logo_path, firma_path, output_dir, modello)
-        
-        if pdf_path is None:
-            error_msg = "Errore nella generazione del PDF"
-            if error_logger:
-                error_logger.log_error(error_msg, error_code="PDF-001")
-            return False, error_msg
-        
-        # Invia l'email se richiesto
-        if send_mail:
-            try:
-                # Determina il firmatario dell'email
-                if config.DOCENTE_CORSO:
-                    firmatario = f"Centro CAFIS\n{config.DIRETTORE_CAFIS}\nProf. {config.DOCENTE_CORSO}"
-                else:
-                    firmatario = f"Centro CAFIS\n{config.DIRETTORE_CAFIS}"
-                
-                # Formatta il corpo dell'email con tutti i segnaposto disponibili
-                email_body = config.EMAIL_BODY.format(
-                    nome_cognome=row['nome_cognome'],
-                    data=row['data'],
-                    firmatario=firmatario,
-                    universita=config.UNIVERSITA
-                )
-                
-                # Invia l'email
-                success, message = send_email(
-                    row['email'], 
-                    config.EMAIL_SUBJECT, 
-                    email_body, 
-                    pdf_path
-                )
-                
-                if not success:
-                    if error_logger:
-                        error_logger.log_error(f"Errore invio email: {message}", error_code="EMAIL-001")
-                    return False, message
-            except Exception as e:
-                error_msg = f"Errore nella formattazione dell'email: {str(e)}"
-                if error_logger:
-                    error_logger.log_error(error_msg, exception=e, error_code="EMAIL-002")
-                return False, error_msg
-                
-        return True, pdf_path
+    Restituisce il gestore dei lotti eseguiti in background, condiviso da tutte le sessioni dell'app
+    """
+    return JobRunner()
+
+@st.fragment(run_every=config.JOB_POLL_SECONDS)
+def show_jobs():
+    """
+    Mostra i lotti in coda, in esecuzione e conclusi, aggiornati ogni JOB_POLL_SECONDS secondi
     
-    except Exception as e:
-        error_msg = f"Errore nell'elaborazione dell'attestato: {str(e)}"
-        if error_logger:
-            error_logger.log_error(error_msg, exception=e, error_code="PROC-001")
-        return False, error_msg
+    Solo questa parte della pagina viene aggiornata: gli altri widget non vengono rieseguiti.
+    """
+    runner = get_job_runner()
+    for job in runner.jobs():
+        with st.container(border=True):
+            st.markdown(f"**{job['name']}** (avviato il {job['created_at'].replace('T', ' ')})")
+            
+            if job['status'] == STATUS_QUEUED:
+                st.info("In coda: verrà avviato al termine dei lotti precedenti.")
+                if st.button("Annulla", key=f"annulla_job_{job['id']}"):
+                    runner.cancel(job['id'])
+                    st.rerun()
+                continue
+            
+            if job['status'] == STATUS_RUNNING:
+                if job['status_message']:
+                    st.info(job['status_message'])
+                if job['total']:
+                    st.progress(job['progress'], text=f"{job['done']} di {job['total']} righe elaborate")
+                else:
+                    st.progress(0.0, text=f"{job['done']} righe elaborate")
+                continue
+            
+            if job['status'] == STATUS_CANCELLED:
+                st.warning("Lotto annullato prima dell'avvio.")
+            elif job['status'] == STATUS_FAILED:
+                st.error(f"Il lotto si è interrotto per un errore: {job['error']}")
+            # Senza invio email il risultato è il percorso dell'eventuale PDF unico
+            documento = job['result'] if isinstance(job['result'], str) else None
+            show_results(job['success_messages'], job['error_messages'], None if documento else job['result'],
+                         job['skipped'], job['unchanged'])
+            if documento and os.path.exists(documento):
+                with open(documento, "rb") as file:
+                    st.download_button(
+                        label="Scarica il PDF con tutti gli attestati",
+                        data=file,
+                        file_name=os.path.basename(documento),
+                        mime="application/pdf",
+                        key=f"scarica_job_{job['id']}"
+                    )
+            if job['status_message']:
+                st.caption(job['status_message'])
+            if st.button("Rimuovi dal riepilogo", key=f"rimuovi_job_{job['id']}"):
+                runner.remove(job['id'])
+                st.rerun()
 
 # Intestazione dell'applicazione
 custom_header(
@@ -233,6 +261,11 @@ with st.sidebar:
             if testo_presenza != config.ATTESTATO_PRESENZA_TEMP:
                 config.ATTESTATO_PRESENZA_TEMP = testo_presenza
             
+            # Segnala subito i segnaposto non validi
+            valido, errore_modello = check_template(testo_presenza, "presenza")
+            if not valido:
+                st.warning(f"Il modello contiene errori: {errore_modello}")
+            
             col1, col2 = st.columns(2)
             # Pulsante per salvare il modello
             if col1.button("Salva modello in presenza"):
@@ -264,6 +297,11 @@ with st.sidebar:
             if testo_telematico != config.ATTESTATO_TELEMATICO_TEMP:
                 config.ATTESTATO_TELEMATICO_TEMP = testo_telematico
             
+            # Segnala subito i segnaposto non validi
+            valido, errore_modello = check_template(testo_telematico, "telematico")
+            if not valido:
+                st.warning(f"Il modello contiene errori: {errore_modello}")
+            
             col1, col2 = st.columns(2)
             # Pulsante per salvare il modello
             if col1.button("Salva modello telematico"):
@@ -295,6 +333,11 @@ with st.sidebar:
             if testo_personalizzato != config.ATTESTATO_PERSONALIZZATO_TEMP:
                 config.ATTESTATO_PERSONALIZZATO_TEMP = testo_personalizzato
             
+            # Segnala subito i segnaposto non validi
+            valido, errore_modello = check_template(testo_personalizzato, "personalizzato")
+            if not valido:
+                st.warning(f"Il modello contiene errori: {errore_modello}")
+            
             col1, col2, col3 = st.columns(3)
             # Pulsante per salvare il modello personalizzato
             if col1.button("Salva modello personalizzato"):
@@ -521,51 +564,85 @@ with tab1:
     Scarica un template dalla sezione "Download Template" per vedere la struttura richiesta.
     """)
     
-    uploaded_file = st.file_uploader("Seleziona un file Excel", type=["xlsx", "xls"])
+    # Lotti eseguiti in background: continuano anche dopo altre interazioni o la chiusura della scheda
+    show_jobs()
+    
+    # Lotti di invio interrotti (riavvio del server) che possono essere ripresi;
+    # quelli ancora in lavorazione in background non vengono proposti
+    lotti_in_corso = get_job_runner().busy_resources()
+    for lotto in get_outbox().incomplete_batches():
+        if lotto['id'] in lotti_in_corso:
+            continue
+        with st.container(border=True):
+            st.warning(
+                f"L'invio del lotto \"{lotto['name'] or 'senza nome'}\" del {lotto['created_at'].replace('T', ' ')} "
+                f"è stato interrotto: {lotto['da_inviare']} email ancora da inviare."
+            )
+            col_riprendi, col_archivia = st.columns(2)
+            riprendi = col_riprendi.button("Riprendi invio", key=f"riprendi_{lotto['id']}", use_container_width=True)
+            if col_archivia.button("Archivia", key=f"archivia_{lotto['id']}", use_container_width=True):
+                get_outbox().close_batch(lotto['id'])
+                st.rerun()
+            
+            if riprendi:
+                if not config.SMTP_USERNAME or not config.SMTP_PASSWORD:
+                    st.error("Per inviare email, configura prima le credenziali SMTP nella sidebar")
+                else:
+                    get_job_runner().submit(
+                        f"Ripresa del lotto \"{lotto['name'] or 'senza nome'}\"", run_resume_job, get_outbox(), lotto,
+                        resource=lotto['id']
+                    )
+                    st.rerun()
+    
+    uploaded_file = st.file_uploader(
+        "Seleziona un file Excel, CSV o Parquet", type=["xlsx", "xls", "csv", "parquet"],
+        help="Il formato viene riconosciuto dal contenuto del file; CSV e Parquet devono avere le stesse colonne del file Excel"
+    )
 
     if uploaded_file:
         # Salva il nome del file
-        st.session_state.file_name = uploaded_file.name            # Leggi il file Excel
-        with st.spinner("Caricamento e validazione del file in corso..."):
-                # Salva temporaneamente il file
-                temp_dir = create_temp_dir()
-                temp_file = os.path.join(temp_dir, uploaded_file.name)
-                with open(temp_file, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                # Leggi il file Excel
-                df, error_message = read_excel_file(temp_file)
-                
-                if df is not None:
-                    # Esegui la validazione avanzata
-                    validation_errors = validate_excel_data(df)
-                    
-                    if not validation_errors:
-                        st.session_state.df = df
-                        st.success(f"File caricato con successo! {len(df)} record trovati.")
-                    else:
-                        # Mostra gli errori di validazione
-                        error_message = f"Errori di validazione nel file Excel ({len(validation_errors)} errori totali)"
-                        if error_logger:
-                            error_logger.log_error(error_message, error_code="APP-EXCEL-001")
-                            
-                        st.error(error_message)
-                        with st.expander("Dettagli degli errori (primi 5)", expanded=True):
-                            for i, error in enumerate(validation_errors[:5]):
-                                st.error(error)
-                            if len(validation_errors) > 5:
-                                st.warning(f"... e altri {len(validation_errors) - 5} errori. Correggi il file e ricaricalo.")
-                else:
-                    if error_logger:
-                        error_logger.log_error(f"Errore nel caricamento del file Excel: {error_message}", error_code="APP-EXCEL-002")
-                    st.error(f"Errore nel caricamento del file: {error_message}")
+        st.session_state.file_name = uploaded_file.name
+        
+        # Ogni interazione riesegue lo script: il file viene letto solo quando ne viene caricato uno nuovo,
+        # e un contenuto già letto (anche in un'altra sessione) viene preso dalla cache
+        if st.session_state.upload_id != uploaded_file.file_id:
+            # I file molto grandi non vengono caricati: ne viene verificata solo l'intestazione
+            # e vengono letti a blocchi durante la generazione
+            streaming = (uploaded_file.size > config.EXCEL_STREAMING_MB * 1024 * 1024
+                         and detect_file_format(uploaded_file) == 'xlsx')
+            if streaming:
+                df = None
+                error_message = check_excel_header(io.BytesIO(uploaded_file.getvalue()))
+            else:
+                with st.spinner("Caricamento e validazione del file in corso..."):
+                    df, error_message = read_excel_upload(uploaded_file.getvalue())
+            st.session_state.upload_id = uploaded_file.file_id
+            st.session_state.upload_result = (SessionDataset(df) if df is not None else None, error_message)
+            st.session_state.upload_streaming = streaming and error_message is None
+            if df is None and error_logger:
+                error_logger.log_error(f"Errore nel caricamento del file Excel: {error_message}", error_code="APP-EXCEL-002", show_ui=False)
+        
+        dataset, error_message = st.session_state.upload_result
+        if dataset is not None:
+            # read_excel_file ha già validato il file e la validità di ogni riga
+            st.session_state.dataset = dataset
+            st.success(f"File caricato con successo! {dataset.rows} record trovati.")
+        elif st.session_state.upload_streaming:
+            st.session_state.dataset = None
+            st.info(f"File di grandi dimensioni ({uploaded_file.size / (1024 * 1024):.0f} MB): verrà letto e validato "
+                    "a blocchi durante la generazione, senza anteprima. Le righe non valide verranno segnalate e saltate.")
+        else:
+            st.error(f"Errore nel caricamento del file: {error_message}")
+
+    # Modalità a blocchi: il file caricato viene letto durante la generazione
+    streaming = uploaded_file is not None and st.session_state.upload_streaming
 
     # Visualizza i dati se disponibili
-    if st.session_state.df is not None:
-        st.header("Dati caricati")
-        
-        df = st.session_state.df
-        show_data_preview(df)
+    if st.session_state.dataset is not None or streaming:
+        df = None if streaming else st.session_state.dataset.get()
+        if df is not None:
+            st.header("Dati caricati")
+            show_data_preview(df)
         
         # Sezione per generare i PDF e inviare le email
         st.header("Generazione Attestati e Invio Email")
@@ -575,126 +652,117 @@ with tab1:
         with col1:
             generate_all = st.checkbox("Genera tutti gli attestati", value=True)
             if not generate_all:
-                num_records = st.slider("Numero di attestati da generare", 1, min(10, len(df)), 1)
+                num_records = st.slider("Numero di attestati da generare", 1, 10 if df is None else min(10, len(df)), 1)
         with col2:
             send_email_option = st.checkbox("Invia email", value=True)
             if send_email_option and not st.session_state.smtp_configured:
                 st.warning("Per inviare email, configura prima le credenziali SMTP nella sidebar")
+            # Senza invio email gli attestati possono essere raccolti in un solo file
+            single_document = False
+            if not send_email_option:
+                single_document = st.checkbox(
+                    "Un unico PDF con tutti gli attestati",
+                    value=False,
+                    help="Genera un solo file con un attestato per pagina invece di un PDF per partecipante: logo, firma e testo fisso vengono inseriti una sola volta, quindi il file è più piccolo e più veloce da generare"
+                )
+        
+        # Un file già inviato (stesso nome e modello) viene confrontato con la versione precedente;
+        # senza invio email i PDF vengono sempre generati per tutte le righe
+        only_changed = True
+        versione_precedente = get_sheet_history().previous(
+            st.session_state.file_name, st.session_state.get('attestato_modello', 'presenza'), True
+        ) if send_email_option else None
+        if versione_precedente:
+            only_changed = st.checkbox(
+                "Invia solo le righe nuove o modificate",
+                value=True,
+                help="Le righe identiche a quelle già inviate dall'ultimo caricamento di questo file vengono saltate"
+            )
+            st.caption(
+                f"Questo file è già stato inviato il {versione_precedente['updated_at'].replace('T', ' ')} "
+                f"({versione_precedente['righe']} righe inviate)."
+            )
                 
         # Configurazione avanzata per l'invio delle email
         if send_email_option:
             with st.expander("Configurazione avanzata invio email", expanded=False):
-                # Dimensione del blocco (quante email mandare alla volta)
-                st.subheader("Configurazione blocchi e intervalli")
+                # Velocità di invio (token bucket) e sessioni SMTP parallele
+                st.subheader("Velocità di invio")
                 col_email1, col_email2 = st.columns(2)
                 with col_email1:
-                    BLOCK_SIZE = st.number_input(
-                        "Numero di email per blocco", 
+                    EMAILS_PER_MINUTE = st.number_input(
+                        "Email al minuto", 
                         min_value=1, 
-                        max_value=50, 
-                        value=10,
-                        help="Quante email inviare prima di fare una pausa"
+                        max_value=600, 
+                        value=config.EMAIL_RATE_PER_MINUTE,
+                        help="Velocità massima di invio; le email vengono distribuite in modo uniforme nel tempo"
                     )
                 with col_email2:
-                    PAUSE_SECONDS = st.number_input(
-                        "Intervallo tra i blocchi (secondi)", 
+                    SMTP_CONCURRENCY = st.number_input(
+                        "Connessioni SMTP parallele", 
                         min_value=1, 
-                        max_value=60, 
-                        value=5,
-                        help="Quanti secondi attendere tra un blocco di email e il successivo"
+                        max_value=8, 
+                        value=config.SMTP_CONCURRENCY,
+                        help="Numero di sessioni SMTP usate contemporaneamente per l'invio"
                     )
                 
-                st.info(f"Le email verranno inviate a gruppi di {BLOCK_SIZE} con una pausa di {PAUSE_SECONDS} secondi tra un gruppo e l'altro. Questa configurazione aiuta a evitare blocchi da parte dei provider email.")
+                st.info(f"Le email verranno inviate al ritmo di al massimo {EMAILS_PER_MINUTE} al minuto. Se il server segnala un sovraccarico (risposte 421, 451 o 4.7.x) la velocità viene ridotta automaticamente e poi ripristinata gradualmente.")
+                
+                # I PDF vengono allegati direttamente dalla memoria: il salvataggio su disco è facoltativo
+                KEEP_PDF = st.checkbox(
+                    "Salva una copia dei PDF inviati",
+                    value=False,
+                    help="Se disattivato gli attestati vengono generati in memoria e allegati alle email senza essere scritti su disco"
+                )
+                
+                # Il registro degli invii evita di inviare due volte lo stesso attestato
+                RESEND_DELIVERED = st.checkbox(
+                    "Reinvia anche gli attestati già inviati",
+                    value=False,
+                    help="Se disattivato le righe il cui attestato risulta già inviato (stesso destinatario, data, orario, tipo di lezione e modello) vengono saltate"
+                )
         
         # Bottone di generazione
         if st.button("Genera attestati", use_container_width=True, type="primary"):
+            # Verifica il modello prima di iniziare il lotto
+            modello_attivo = st.session_state.get('attestato_modello', 'presenza')
+            template_ok, template_error = check_template(get_testo_modello(modello_attivo), modello_attivo)
+            
             if not st.session_state.smtp_configured and send_email_option:
                 st.error("Per inviare email, configura prima le credenziali SMTP nella sidebar")
             elif not config.SMTP_USERNAME or not config.SMTP_PASSWORD:
                 st.error("Le credenziali SMTP non sono configurate correttamente. Ricontrolla la configurazione nella sidebar.")
+            elif not template_ok:
+                if error_logger:
+                    error_logger.log_error(f"Modello attestato non valido: {template_error}", error_code="PDF-002", show_ui=False)
+                st.error(f"Il modello dell'attestato contiene errori: {template_error}")
             else:
                 # Verifica se il logo e la firma sono stati caricati
                 logo_path = st.session_state.logo if st.session_state.logo else None
                 firma_path = st.session_state.firma if st.session_state.firma else None
                 
                 # Seleziona le righe da processare
-                if generate_all:
-                    rows_to_process = df
-                else:
-                    rows_to_process = df.iloc[:num_records]
+                limit = None if generate_all else num_records
+                file_data = uploaded_file.getvalue() if df is None else None
                 
-                # Crea una barra di progresso
-                progress_container, status_text, progress_bar = progress_bar_with_status(
-                    "Generazione attestati in corso. Attendere...",
-                    0
+                # Il lotto viene eseguito in background: i dati della sessione vengono passati al lavoro
+                runner = get_job_runner()
+                in_coda = any(job['status'] in (STATUS_QUEUED, STATUS_RUNNING) for job in runner.jobs())
+                runner.submit(
+                    f"{st.session_state.file_name} ({'generazione e invio degli attestati' if send_email_option else 'generazione del PDF unico' if single_document else 'generazione degli attestati'})",
+                    run_generation_job, get_outbox(), df, file_data, limit, send_email_option,
+                    st.session_state.get('attestato_modello', 'presenza'), logo_path, firma_path,
+                    file_name=st.session_state.file_name,
+                    emails_per_minute=EMAILS_PER_MINUTE if send_email_option else None,
+                    concurrency=SMTP_CONCURRENCY if send_email_option else None,
+                    keep_pdf=KEEP_PDF if send_email_option else False,
+                    skip_delivered=not RESEND_DELIVERED if send_email_option else False,
+                    history=get_sheet_history(), only_changed=only_changed, single_document=single_document
                 )
-                
-                # Contatori per i risultati
-                success_count = 0
-                error_count = 0
-                success_messages = []
-                error_messages = []
-                
-                # Dimensione del blocco e pausa tra i blocchi sono già definiti sopra
-                # BLOCK_SIZE e PAUSE_SECONDS sono già definiti nella configurazione avanzata
-                
-                # Processa ogni riga a blocchi
-                total_rows = len(rows_to_process)
-                for block_start in range(0, total_rows, BLOCK_SIZE):
-                    # Determina fine del blocco corrente
-                    block_end = min(block_start + BLOCK_SIZE, total_rows)
-                    
-                    # Visualizza informazioni sul blocco corrente
-                    status_text.info(f"Elaborazione blocco {block_start // BLOCK_SIZE + 1} ({block_start+1}-{block_end} di {total_rows})")
-                    
-                    # Elabora ogni riga nel blocco corrente
-                    for i in range(block_start, block_end):
-                        row_index = i
-                        row = rows_to_process.iloc[row_index]
-                        
-                        # Aggiorna la barra di progresso
-                        progress = (i + 1) / total_rows
-                        progress_bar.progress(progress)
-                        
-                        # Verifica che la riga sia valida
-                        is_valid, error = validate_row(row)
-                        if not is_valid:
-                            error_count += 1
-                            error_messages.append(f"Errore riga {i+1}: {error}")
-                            continue
-                        
-                        # Genera il PDF e invia l'email
-                        success, result = process_attestato(row, logo_path, firma_path, send_email_option)
-                        
-                        if success:
-                            success_count += 1
-                            success_messages.append(f"Attestato per {row['nome_cognome']} generato con successo")
-                            if send_email_option:
-                                success_messages[-1] += f" e inviato a {row['email']}"
-                        else:
-                            error_count += 1
-                            error_messages.append(f"Errore per {row['nome_cognome']}: {result}")
-                    
-                    # Pausa tra i blocchi (solo se ci sono altri blocchi da elaborare)
-                    if block_end < total_rows and send_email_option:
-                        with st.spinner(f"Pausa di {PAUSE_SECONDS} secondi tra i blocchi di email..."):
-                            time.sleep(PAUSE_SECONDS)
-                
-                # Resetta la barra di progresso
-                progress_bar.empty()
-                
-                # Mostra i risultati
-                if success_count > 0:
-                    st.success(f"{success_count} attestati generati con successo")
-                    with st.expander("Dettagli operazioni riuscite", expanded=False):
-                        for msg in success_messages:
-                            st.write(f"✅ {msg}")
-                
-                if error_count > 0:
-                    st.error(f"{error_count} errori durante la generazione")
-                    with st.expander("Dettagli errori", expanded=True):
-                        for msg in error_messages:
-                            st.write(f"❌ {msg}")
+                if in_coda:
+                    st.info("Il lotto è in coda e verrà avviato al termine di quelli in corso. L'avanzamento è mostrato in cima alla pagina.")
+                else:
+                    st.success("Lotto avviato. L'avanzamento è mostrato in cima alla pagina; l'elaborazione continua anche se usi altre funzioni o chiudi la scheda.")
         
         # Aggiungi una nota informativa sul formato del file Excel
         st.divider()
@@ -715,6 +783,9 @@ with tab1:
             | tipo_percorso | Tipo di percorso | Uno tra: "PeF60 CFU", "PeF30 CFU all.2", "PeF36 CFU", "PeF30 CFU (art. 13)" |
             | classe_concorso | Classe di concorso | A-01 |
             | email | Indirizzo email del richiedente | mario.rossi@esempio.com |
+            
+            Sono accettati anche file CSV (separati da virgola, punto e virgola o tabulazione, codifica UTF-8)
+            e Parquet con le stesse colonne. Le altre colonne eventualmente presenti vengono ignorate.
             """)
 
 with tab2:
@@ -767,7 +838,7 @@ Università degli Studi Roma Tre
         genera_pdf_test = st.checkbox("Genera attestato di esempio", value=True)
     with col2_opt:
         test_multiple = st.checkbox("Test invio multiplo", value=False, 
-                                    help="Simula l'invio di più email allo stesso indirizzo per testare l'invio a blocchi")
+                                    help="Simula l'invio di più email allo stesso indirizzo per testare la velocità di invio")
     
     if test_multiple:
         # Opzioni per il test multiplo
@@ -777,26 +848,15 @@ Università degli Studi Roma Tre
         
         # Configurazione avanzata per l'invio delle email di test
         with st.expander("Configurazione avanzata", expanded=False):
-            # Dimensione del blocco (quante email mandare alla volta)
-            col_conf1, col_conf2 = st.columns(2)
-            with col_conf1:
-                test_block_size = st.number_input(
-                    "Numero di email per blocco", 
-                    min_value=1, 
-                    max_value=20, 
-                    value=10,
-                    help="Quante email inviare prima di fare una pausa"
-                )
-            with col_conf2:
-                test_pause_seconds = st.number_input(
-                    "Intervallo tra i blocchi (secondi)", 
-                    min_value=1, 
-                    max_value=30, 
-                    value=5,
-                    help="Quanti secondi attendere tra un blocco di email e il successivo"
-                )
+            test_emails_per_minute = st.number_input(
+                "Email al minuto", 
+                min_value=1, 
+                max_value=600, 
+                value=config.EMAIL_RATE_PER_MINUTE,
+                help="Velocità massima di invio; le email vengono distribuite in modo uniforme nel tempo"
+            )
         
-        st.info(f"Verranno inviate {num_emails} email allo stesso indirizzo a blocchi di {test_block_size}, con una pausa di {test_pause_seconds} secondi tra i blocchi.")
+        st.info(f"Verranno inviate {num_emails} email allo stesso indirizzo, al massimo {test_emails_per_minute} al minuto.")
     
     # Bottone per inviare l'email di test
     if st.button("Invia email di test", use_container_width=True):
@@ -816,25 +876,16 @@ Università degli Studi Roma Tre
             
             results_area = st.empty()
             
-            # Dimensione del blocco e pausa tra i blocchi (in secondi)
-            # Usa i valori personalizzati se definiti nel test multiplo, altrimenti valori predefiniti
-            BLOCK_SIZE = test_block_size if test_multiple else 10
-            PAUSE_SECONDS = test_pause_seconds if test_multiple else 5
+            # Velocità di invio: usa il valore personalizzato se definito nel test multiplo
+            limiter = AdaptiveRateLimiter(test_emails_per_minute if test_multiple else config.EMAIL_RATE_PER_MINUTE)
             
             success_count = 0
             error_count = 0
             pdf_path = None
             
-            # Processa ogni email a blocchi
-            for block_start in range(0, num_to_send, BLOCK_SIZE):
-                # Determina fine del blocco corrente
-                block_end = min(block_start + BLOCK_SIZE, num_to_send)
-                
-                # Visualizza informazioni sul blocco corrente
-                status_text.info(f"Elaborazione blocco {block_start // BLOCK_SIZE + 1} ({block_start+1}-{block_end} di {num_to_send})")
-                
-                # Elabora ogni email nel blocco corrente
-                for i in range(block_start, block_end):
+            # Tutte le email di test usano la stessa sessione SMTP
+            with SmtpConnectionPool() as sender:
+                for i in range(num_to_send):
                     # Genera il PDF solo la prima volta o se è richiesto per ogni email
                     if i == 0 or (test_multiple and genera_pdf_test):
                         with st.spinner("Generazione PDF in corso..."):
@@ -869,29 +920,25 @@ Università degli Studi Roma Tre
                     progress = (i + 1) / num_to_send
                     progress_bar.progress(progress)
                     
-                    # Invia l'email
-                    status_text.info(f"Invio email {i+1} di {num_to_send}...")
+                    # Attendi il proprio turno secondo la velocità consentita, poi invia l'email
+                    status_text.info(f"Invio email {i+1} di {num_to_send} ({limiter.messages_per_minute:.0f} email al minuto)...")
+                    limiter.acquire()
                     subject = f"{test_email_subject} {i+1}" if test_multiple else test_email_subject
-                    success, message = send_email(
+                    success, message, exception = sender.deliver(
                         email_to_test, 
                         subject, 
                         test_email_body, 
                         pdf_path if genera_pdf_test else None
                     )
+                    limiter.report(throttled=exception is not None and is_throttling_error(exception))
                     
                     if success:
                         success_count += 1
+                        # Mostra il resoconto parziale
+                        results_area.info(f"Inviate {success_count} email su {i+1}, {error_count} errori")
                     else:
                         error_count += 1
                         results_area.error(f"Errore nell'invio dell'email {i+1}: {message}")
-                
-                # Mostra il resoconto parziale
-                results_area.info(f"Inviate {success_count} email su {i+1}, {error_count} errori")
-                
-                # Pausa tra i blocchi (solo se ci sono altri blocchi da elaborare)
-                if block_end < num_to_send:
-                    with st.spinner(f"Pausa di {PAUSE_SECONDS} secondi tra i blocchi di email..."):
-                        time.sleep(PAUSE_SECONDS)
             
             # Resoconto finale
             if success_count == num_to_send:
@@ -63,6 +63,42 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 SMTP_USE_TLS = True
 # Indirizzo email di risposta (Reply-To)
 SMTP_REPLY_TO = os.getenv("SMTP_REPLY_TO", "pef.presenze@uniroma3.it")
+# Riutilizzo delle connessioni SMTP durante l'invio di un lotto
+SMTP_TIMEOUT = int(os.getenv("SMTP_TIMEOUT", 30))  # Secondi
+SMTP_MESSAGES_PER_SESSION = int(os.getenv("SMTP_MESSAGES_PER_SESSION", 50))  # Poi la sessione viene riaperta
+SMTP_NOOP_AFTER_SECONDS = int(os.getenv("SMTP_NOOP_AFTER_SECONDS", 10))  # Inattività dopo cui verificare la sessione con NOOP
+# Velocità di invio delle email (token bucket) e sessioni SMTP parallele
+EMAIL_RATE_PER_MINUTE = int(os.getenv("EMAIL_RATE_PER_MINUTE", 30))
+SMTP_CONCURRENCY = int(os.getenv("SMTP_CONCURRENCY", 2))
+# Attestati generati in anticipo sull'invio (limita la memoria occupata dai PDF in attesa)
+PIPELINE_RENDER_AHEAD = int(os.getenv("PIPELINE_RENDER_AHEAD", 16))
+# Ripetizione degli invii non riusciti per errori temporanei (risposte 4xx, disconnessioni, timeout)
+SMTP_RETRY_ATTEMPTS = int(os.getenv("SMTP_RETRY_ATTEMPTS", 4))  # Tentativi per email, compreso il primo
+SMTP_RETRY_BASE_DELAY = int(os.getenv("SMTP_RETRY_BASE_DELAY", 5))  # Secondi prima del secondo tentativo, poi raddoppiati
+SMTP_RETRY_MAX_DELAY = int(os.getenv("SMTP_RETRY_MAX_DELAY", 120))  # Attesa massima tra due tentativi
+# Database (SQLite) con lo stato di ogni email dei lotti, usato per riprendere gli invii interrotti
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", os.path.join(os.path.dirname(__file__), "data", "outbox.sqlite3"))
+# Database (SQLite) con le impronte delle righe già elaborate di ogni file, per elaborare solo le righe nuove o modificate
+SHEET_HISTORY_PATH = os.getenv("SHEET_HISTORY_PATH", os.path.join(os.path.dirname(__file__), "data", "sheet_history.sqlite3"))
+
+# Memoria massima (MB) dei file Excel già letti e validati conservati tra un'interazione e l'altra
+UPLOAD_CACHE_MB = int(os.getenv("UPLOAD_CACHE_MB", 256))
+# Lettura a blocchi dei file Excel molto grandi: righe per blocco e dimensione (MB) oltre cui
+# il file non viene caricato per intero ma letto durante la generazione degli attestati
+EXCEL_CHUNK_ROWS = int(os.getenv("EXCEL_CHUNK_ROWS", 5000))
+EXCEL_STREAMING_MB = int(os.getenv("EXCEL_STREAMING_MB", 20))
+# Generazione parallela dei PDF senza invio email: righe affidate a ogni processo per volta e
+# secondi massimi per riga, oltre i quali il processo viene terminato (0 per nessun limite)
+PDF_CHUNK_ROWS = int(os.getenv("PDF_CHUNK_ROWS", 4))
+PDF_TIMEOUT_SECONDS = float(os.getenv("PDF_TIMEOUT_SECONDS", 60))
+# Dataset delle sessioni inattive scaricati su file Parquet (0 disattiva lo scaricamento)
+DATASET_SPILL_AFTER_SECONDS = int(os.getenv("DATASET_SPILL_AFTER_SECONDS", 600))
+DATASET_SPILL_DIR = os.getenv("DATASET_SPILL_DIR", os.path.join(os.path.dirname(__file__), "data", "spill"))
+# Lotti di generazione e invio eseguiti in background: lotti eseguiti contemporaneamente (gli altri restano in coda),
+# lotti conclusi mostrati nel riepilogo e intervallo (secondi) di aggiornamento dell'avanzamento nell'interfaccia
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", 20))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 2))
 
 # Configurazioni del Centro CAFIS
 DIRETTORE_CAFIS = os.getenv("DIRETTORE_CAFIS", "Prof. Mario Rossi")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Generazione e invio degli attestati da riga di comando, senza interfaccia web.
+
+Usa lo stesso motore dell'app Streamlit (utils/batch.py): lettura e validazione
+del file, generazione dei PDF e invio tramite l'outbox con la pipeline a stadi.
+L'avanzamento viene scritto su stdout come una riga JSON per evento ("inizio",
+"stato", "totale", "esito", "fine" oppure "errore"); i messaggi diagnostici
+vanno su stderr. Adatto all'esecuzione pianificata, ad esempio con cron:
+
+    python -m genera_attestati presenze.xlsx --modello presenza --logo logo.png --firma firma.png
+
+Codici di uscita:
+    0  tutti gli attestati generati (e inviati)
+    1  lotto completato con righe non valide o invii non riusciti
+    2  argomenti non validi
+    3  file, immagini, modello o credenziali SMTP non utilizzabili
+    4  lotto interrotto da un errore imprevisto
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+# I moduli dell'app stampano messaggi informativi all'importazione: vanno su stderr
+# per non mescolarsi con le righe JSON
+with contextlib.redirect_stdout(sys.stderr):
+    import config
+    from utils.excel_reader import read_excel_file, check_excel_header, detect_file_format
+    from utils.pdf_generator import get_testo_modello
+    from utils.attestato_template import check_template
+    from utils.outbox import EmailOutbox
+    from utils.sheet_history import SheetHistory
+    from utils.job_runner import Job
+    from utils.batch import run_generation_job
+
+ESITO_OK = 0
+ESITO_ERRORI_RIGHE = 1
+ESITO_ARGOMENTI = 2
+ESITO_CONFIGURAZIONE = 3
+ESITO_INTERROTTO = 4
+
+MODELLI = ('presenza', 'telematico', 'personalizzato')
+
+class JsonLinesJob(Job):
+    """
+    Lavoro eseguito in primo piano che scrive ogni aggiornamento come riga JSON
+    """
+
+    def __init__(self, name, stream):
+        """
+        Args:
+            name (str): Descrizione del lotto
+            stream (file): Flusso su cui scrivere le righe JSON
+        """
+        super().__init__(name)
+        self.stream = stream
+
+    def emit(self, evento, **campi):
+        """
+        Scrive un evento come riga JSON
+        """
+        self.stream.write(json.dumps({'evento': evento, **campi}, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def set_total(self, total):
+        changed = total != self.total
+        super().set_total(total)
+        if changed:
+            self.emit('totale', totale=total)
+
+    def set_status(self, message):
+        super().set_status(message)
+        if message:
+            self.emit('stato', messaggio=message)
+
+    def add_result(self, success, message):
+        super().add_result(success, message)
+        self.emit('esito', successo=success, messaggio=message, elaborati=self.done, totale=self.total)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m genera_attestati",
+        description="Genera gli attestati di presenza da un file Excel, CSV o Parquet e li invia per email"
+    )
+    parser.add_argument("file", help="File con i dati dei partecipanti (Excel, CSV o Parquet)")
+    parser.add_argument("--modello", choices=MODELLI, default="presenza", help="Modello dell'attestato")
+    parser.add_argument("--logo", help="Immagine del logo")
+    parser.add_argument("--firma", help="Immagine della firma")
+    parser.add_argument("--no-email", action="store_true", help="Genera solo i PDF, senza inviarli")
+    parser.add_argument("--output-dir", help="Directory dei PDF generati (default: directory temporanea)")
+    parser.add_argument("--pdf-unico", action="store_true",
+                        help="Con --no-email, genera un unico PDF con un attestato per pagina")
+    parser.add_argument("--salva-pdf", action="store_true", help="Salva una copia dei PDF inviati per email")
+    parser.add_argument("--reinvia", action="store_true",
+                        help="Invia anche gli attestati che risultano già inviati in un lotto precedente")
+    parser.add_argument("--tutte", action="store_true",
+                        help="Invia tutte le righe, anche quelle invariate rispetto all'invio precedente del file")
+    parser.add_argument("--limite", type=int, help="Numero massimo di righe del file da elaborare")
+    parser.add_argument("--email-al-minuto", type=int, default=config.EMAIL_RATE_PER_MINUTE,
+                        help="Velocità massima di invio")
+    parser.add_argument("--connessioni", type=int, default=config.SMTP_CONCURRENCY,
+                        help="Sessioni SMTP usate in parallelo")
+    args = parser.parse_args(argv)
+    for opzione in ('limite', 'email_al_minuto', 'connessioni'):
+        valore = getattr(args, opzione)
+        if valore is not None and valore < 1:
+            parser.error(f"--{opzione.replace('_', '-')} deve essere almeno 1")
+    if args.pdf_unico and not args.no_email:
+        parser.error("--pdf-unico richiede --no-email")
+    return args
+
+def check_configuration(args):
+    """
+    Verifica file, immagini, modello e credenziali prima di avviare il lotto
+
+    Returns:
+        str: Messaggio di errore, oppure None se il lotto può essere avviato
+    """
+    for descrizione, path in (("File", args.file), ("Logo", args.logo), ("Firma", args.firma)):
+        if path and not os.path.isfile(path):
+            return f"{descrizione} non trovato: {path}"
+    template_ok, template_error = check_template(get_testo_modello(args.modello), args.modello)
+    if not template_ok:
+        return f"Il modello dell'attestato contiene errori: {template_error}"
+    if not args.no_email and (not config.SMTP_USERNAME or not config.SMTP_PASSWORD):
+        return "Credenziali SMTP non configurate (SMTP_USERNAME, SMTP_PASSWORD)"
+    return None
+
+def load_rows(path):
+    """
+    Legge il file come nell'app: i file .xlsx più grandi di EXCEL_STREAMING_MB vengono letti a blocchi
+
+    Returns:
+        tuple: (DataFrame o None, contenuto del file se letto a blocchi o None, messaggio di errore o None)
+    """
+    if os.path.getsize(path) > config.EXCEL_STREAMING_MB * 1024 * 1024 and detect_file_format(path) == 'xlsx':
+        # Solo l'intestazione: le righe vengono lette a blocchi durante la generazione
+        error_message = check_excel_header(path)
+        if error_message:
+            return None, None, error_message
+        with open(path, 'rb') as f:
+            return None, f.read(), None
+    df, error_message = read_excel_file(path)
+    return df, None, error_message
+
+def main(argv=None):
+    stdout = sys.stdout
+    try:
+        args = parse_args(argv)
+    except SystemExit as e:
+        # argparse termina con ESITO_ARGOMENTI per gli argomenti non validi (0 per --help)
+        return e.code
+    job = JsonLinesJob(os.path.basename(args.file), stdout)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        error_message = check_configuration(args)
+        if error_message is None:
+            df, file_data, error_message = load_rows(args.file)
+        if error_message is not None:
+            job.emit('errore', messaggio=error_message)
+            return ESITO_CONFIGURAZIONE
+
+        send_mail = not args.no_email
+        job.emit('inizio', file=args.file, modello=args.modello, invio_email=send_mail,
+                 righe=None if df is None else len(df), lettura_a_blocchi=df is None)
+        start = time.perf_counter()
+        # Outbox e impronte dei file servono solo per l'invio email
+        outbox = EmailOutbox() if send_mail else None
+        history = SheetHistory() if send_mail else None
+        try:
+            result = run_generation_job(
+                job, outbox, df, file_data, args.limite, send_mail,
+                args.modello, args.logo, args.firma,
+                file_name=os.path.basename(args.file), emails_per_minute=args.email_al_minuto,
+                concurrency=args.connessioni, keep_pdf=args.salva_pdf, output_dir=args.output_dir,
+                skip_delivered=not args.reinvia, history=history, only_changed=not args.tutte,
+                single_document=args.pdf_unico
+            )
+        except Exception as e:
+            job.emit('errore', messaggio=f"Lotto interrotto: {str(e)}", elaborati=job.done, totale=job.total)
+            return ESITO_INTERROTTO
+        finally:
+            for database in (outbox, history):
+                if database is not None:
+                    database.close()
+
+        job.emit(
+            'fine', riusciti=len(job.success_messages), errori=len(job.error_messages), saltati=job.skipped,
+            invariate=job.unchanged,
+            durata=round(time.perf_counter() - start, 3),
+            ripetizioni=result.stats if send_mail else None,
+            documento=result if args.pdf_unico else None,
+            riepilogo=job.status_message
+        )
+    return ESITO_ERRORI_RIGHE if job.error_messages else ESITO_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
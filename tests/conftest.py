@@ -0,0 +1,93 @@
+"""
+Dati di prova condivisi dai test.
+"""
+import os
+import sys
+import asyncio
+import socket
+from datetime import datetime, time
+
+import pytest
+from openpyxl import Workbook
+
+# I moduli dell'app vengono importati dalla radice del repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Righe con i tipi che si trovano nei file reali: date e orari come celle Excel,
+# numeri nei campi di testo, '--' nei campi opzionali, email con il nome
+RIGHE_ESEMPIO = [
+    ["Mario Rossi", datetime(2025, 5, 12), time(14, 0), time(16, 0), "A1", "Scienze della Formazione",
+     "Via del Castro Pretorio 20", "Didattica generale", "PeF60 CFU", "A-01", "mario.rossi@esempio.com"],
+    ["Giulia Bianchi", "12/05/2025", "16.00", "1800", 101, "--",
+     "--", "Pedagogia", "PeF30 CFU all.2", "A-12", "Giulia Bianchi <giulia.bianchi@esempio.com>"],
+    ["Luca Verdi", datetime(2025, 5, 13), "09:00:00", "11:00", None, "Scienze della Formazione",
+     "Via del Castro Pretorio 20", "Psicologia", "PeF60 CFU", 12, "luca.verdi@stud.uniroma3.it"],
+    ["Anna Neri", "13/05/2025", "11:00", "13:00", "B2", "Scienze della Formazione",
+     "Via del Castro Pretorio 20", "Didattica generale", "PeF60 CFU", "A-22", "anna.neri@esempio.com"],
+]
+
+@pytest.fixture
+def excel_path(tmp_path):
+    """
+    File .xlsx con le righe di RIGHE_ESEMPIO
+    """
+    from utils.excel_reader import COLONNE_RICHIESTE
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(COLONNE_RICHIESTE)
+    for riga in RIGHE_ESEMPIO:
+        sheet.append(riga)
+    path = tmp_path / "presenze.xlsx"
+    workbook.save(path)
+    return str(path)
+
+class _SmtpSink:
+    """
+    Gestore aiosmtpd che conserva i destinatari dei messaggi ricevuti
+
+    I destinatari aggiunti a rifiuta_una_volta ricevono al primo invio un errore temporaneo;
+    latenza simula il tempo di risposta del server (secondi).
+    """
+
+    def __init__(self):
+        self.destinatari = []
+        self.rifiuta_una_volta = set()
+        self.latenza = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latenza:
+            await asyncio.sleep(self.latenza)
+        rifiutati = self.rifiuta_una_volta.intersection(envelope.rcpt_tos)
+        if rifiutati:
+            self.rifiuta_una_volta -= rifiutati
+            return '451 Riprovare più tardi'
+        self.destinatari.extend(envelope.rcpt_tos)
+        return '250 OK'
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """
+    Server SMTP locale (aiosmtpd) usato al posto di quello configurato
+    """
+    controller_mod = pytest.importorskip("aiosmtpd.controller")
+    from aiosmtpd.smtp import AuthResult
+
+    import config
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    handler = _SmtpSink()
+    controller = controller_mod.Controller(
+        handler, hostname='127.0.0.1', port=port,
+        authenticator=lambda *args: AuthResult(success=True), auth_require_tls=False
+    )
+    controller.start()
+    monkeypatch.setattr(config, 'SMTP_SERVER', '127.0.0.1')
+    monkeypatch.setattr(config, 'SMTP_PORT', port)
+    monkeypatch.setattr(config, 'SMTP_USERNAME', 'test')
+    monkeypatch.setattr(config, 'SMTP_PASSWORD', 'test')
+    monkeypatch.setattr(config, 'SMTP_USE_TLS', False)
+    yield handler
+    controller.stop()
@@ -0,0 +1,48 @@
+"""
+Test della verifica e della compilazione dei modelli di testo degli attestati.
+"""
+import pytest
+
+import config
+from utils.attestato_template import (
+    CompiledTemplate, TemplateError, check_template, compile_template, parse_placeholders
+)
+
+VALORI = {
+    'nome_cognome': 'Mario Rossi', 'data': '12/05/2025', 'ora_inizio': '09:00', 'ora_fine': '11:00',
+    'aula': 'A1', 'dipartimento': 'Scienze della Formazione', 'indirizzo': 'Via del Castro Pretorio 20',
+    'tipo_lezione': 'Didattica generale', 'tipo_percorso': 'PeF60 CFU', 'classe_concorso': 'A-01',
+    'data_rilascio': '13/05/2025', 'universita': 'Università', 'direttore_cafis': 'Direttore',
+}
+
+@pytest.mark.parametrize("testo", [config.ATTESTATO_PRESENZA, config.ATTESTATO_TELEMATICO])
+def test_modelli_predefiniti_validi(testo):
+    assert check_template(testo) == (True, None)
+
+def test_segnaposto_sconosciuto():
+    valido, errore = check_template("Titolo\nSottotitolo\nGentile {nome}")
+
+    assert not valido
+    assert "{nome}" in errore
+    assert "{nome_cognome}" in errore
+
+@pytest.mark.parametrize("testo", ["Solo titolo", "Titolo\nSottotitolo\n{}", "Titolo\nSottotitolo\n{aula"])
+def test_modelli_non_validi(testo):
+    with pytest.raises(TemplateError):
+        CompiledTemplate(testo)
+
+def test_parse_placeholders():
+    assert parse_placeholders("{aula} e {dipartimento} {{letterale}}") == {'aula', 'dipartimento'}
+
+def test_varianti_per_campi_opzionali_vuoti():
+    template = compile_template(
+        "Titolo\nSottotitolo\n{tipo_percorso} – {classe_concorso} presso l'aula {aula} del dipartimento di {dipartimento}"
+    )
+
+    assert template.format(VALORI) == (
+        "PeF60 CFU – A-01 presso l'aula A1 del dipartimento di Scienze della Formazione"
+    )
+    assert template.format(dict(VALORI, classe_concorso='', dipartimento='')) == "PeF60 CFU presso l'aula A1"
+
+def test_compile_template_riusa_i_modelli():
+    assert compile_template(config.ATTESTATO_PRESENZA) is compile_template(config.ATTESTATO_PRESENZA)
@@ -0,0 +1,77 @@
+"""
+Test del registro degli attestati consegnati (tabella deliveries dell'outbox).
+"""
+import pytest
+
+from utils.excel_reader import read_excel_file
+from utils.job_runner import Job
+from utils.outbox import EmailOutbox, delivery_fingerprint, LOOKUP_CHUNK, STATUS_SENT, STATUS_SKIPPED
+from utils.batch import run_generation_job, skip_delivered_rows
+
+RIGA = {'email': 'mario.rossi@esempio.com', 'data': '12/05/2025', 'ora_inizio': '09:00',
+        'ora_fine': '11:00', 'tipo_lezione': 'Didattica generale', 'nome_cognome': 'Mario Rossi'}
+
+@pytest.fixture
+def outbox():
+    with EmailOutbox(':memory:') as outbox:
+        yield outbox
+
+def test_impronta_indipendente_da_maiuscole_e_spazi():
+    variante = dict(RIGA, email=' Mario.Rossi@Esempio.com ', tipo_lezione='Didattica  generale',
+                    nome_cognome='Altro nome')
+
+    assert delivery_fingerprint(variante, 'presenza') == delivery_fingerprint(RIGA, 'presenza')
+    assert delivery_fingerprint(RIGA, None) == delivery_fingerprint(RIGA, 'presenza')
+    assert delivery_fingerprint(RIGA, 'telematico') != delivery_fingerprint(RIGA, 'presenza')
+    assert delivery_fingerprint(dict(RIGA, data='13/05/2025'), 'presenza') != delivery_fingerprint(RIGA, 'presenza')
+
+def test_invio_registrato_nel_registro(outbox):
+    batch_id = outbox.create_batch([(0, RIGA)], 'presenze.xlsx', 'presenza')
+    impronta = delivery_fingerprint(RIGA, 'presenza')
+    assert not outbox.is_delivered(impronta)
+
+    outbox.mark_sent(outbox.pending(batch_id)[0]['id'])
+
+    assert outbox.is_delivered(impronta)
+    assert outbox.delivered([impronta, 'sconosciuta']) == {impronta}
+
+def test_ricerca_a_blocchi(outbox):
+    righe = [(i, dict(RIGA, email=f'utente{i}@esempio.com')) for i in range(LOOKUP_CHUNK + 10)]
+    batch_id = outbox.create_batch(righe, 'presenze.xlsx', 'presenza')
+    for item in outbox.pending(batch_id)[::2]:
+        outbox.mark_sent(item['id'])
+
+    impronte = [delivery_fingerprint(riga, 'presenza') for _, riga in righe]
+
+    assert outbox.delivered(impronte) == set(impronte[::2])
+
+def test_righe_gia_consegnate_o_ripetute_saltate(outbox):
+    batch_id = outbox.create_batch([(0, RIGA)], 'presenze.xlsx', 'presenza')
+    outbox.mark_sent(outbox.pending(batch_id)[0]['id'])
+    nuova = dict(RIGA, email='giulia.bianchi@esempio.com')
+    saltate = []
+
+    righe = list(skip_delivered_rows(outbox, [(0, RIGA), (1, nuova), (2, dict(nuova))], 'presenza',
+                                     lambda i, record: saltate.append(i)))
+
+    assert [i for i, _ in righe] == [1]
+    assert saltate == [0, 2]
+
+def test_secondo_invio_dello_stesso_file_saltato(smtp_server, outbox, excel_path):
+    df, error_message = read_excel_file(excel_path)
+    assert error_message is None
+
+    for prova in range(2):
+        job = Job('Invio')
+        run_generation_job(job, outbox, df, None, None, True, 'presenza', None, None,
+                           file_name='presenze.xlsx', emails_per_minute=6000)
+        if prova == 0:
+            assert len(job.success_messages) == len(df)
+        else:
+            assert job.success_messages == []
+            assert job.skipped == len(df)
+
+    assert len(smtp_server.destinatari) == len(df)
+    assert outbox.counts(1)[STATUS_SENT] == len(df)
+    # Le righe già consegnate non vengono registrate nel secondo lotto
+    assert outbox.counts(2)[STATUS_SKIPPED] == 0
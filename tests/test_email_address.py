@@ -0,0 +1,66 @@
+"""
+Test del riconoscimento degli indirizzi email: parse_email deve dare lo stesso
+risultato della ricerca con EMAIL_PATTERN e STUDENT_EMAIL_PATTERN.
+"""
+import random
+import time
+
+import pytest
+
+from utils.email_address import (
+    parse_email, extract_email, is_valid_email, EMAIL_PATTERN, STUDENT_EMAIL_PATTERN
+)
+
+CELLE = [
+    "normale@example.com",
+    "email.con.punti@example.com",
+    "giù.costanzo5@stud.uniroma3.it",
+    "Giu.puggioni2@stud.uniroma3.it",
+    "EMMANUEL LOSIO (Emm Losio emm.losio@stud.uniroma3.it)",
+    "esempio@dominio.com.it",
+    "mio-nome.cognome@sito-web.org",
+    "nome_cognome+etichetta@provider.net",
+    "Nome Cognome <email@example.com>",
+    "altro@example.com e poi mro.rossi@stud.uniroma3.it",
+    "mario.rossi@stud.uniroma3.it",
+    "abcd.rossi@stud.uniroma3.it",
+    "a.rossi@stud.uniroma3.it",
+    "x@@y.it",
+    "@example.com",
+    "nome@dominio",
+    "non valida",
+    "--",
+    "",
+]
+
+def _riferimento(testo):
+    studente = STUDENT_EMAIL_PATTERN.search(testo)
+    standard = EMAIL_PATTERN.search(testo)
+    return (studente.group(1) if studente else None, standard.group(1) if standard else None)
+
+@pytest.mark.parametrize("testo", CELLE)
+def test_come_le_espressioni_regolari(testo):
+    assert parse_email(testo) == _riferimento(testo)
+
+def test_come_le_espressioni_regolari_su_testi_casuali():
+    rng = random.Random(0)
+    frammenti = ['a', 'Z', 'è', '1', '.', '-', '_', '+', '%', ' ', '<', '(', '@', '@',
+                 'stud.uniroma3.it', 'mro.', 'example.com', '.it', 'x.y']
+    for _ in range(5000):
+        testo = ''.join(rng.choice(frammenti) for _ in range(rng.randint(1, 12)))
+        assert parse_email(testo) == _riferimento(testo), testo
+
+def test_preferisce_l_indirizzo_degli_studenti():
+    assert extract_email(" altro@example.com mro.rossi@stud.uniroma3.it ") == "mro.rossi@stud.uniroma3.it"
+    assert extract_email("Nome <nome@example.com>") == "nome@example.com"
+    assert is_valid_email(12) is False
+
+@pytest.mark.parametrize("testo", [
+    'a' * 200_000,
+    'x@' + 'a.' * 100_000 + '1',
+    'a@' * 100_000,
+])
+def test_tempo_lineare_su_celle_lunghe(testo):
+    start = time.perf_counter()
+    parse_email(testo)
+    assert time.perf_counter() - start < 1
@@ -0,0 +1,56 @@
+"""
+Test dell'invio concorrente delle email (AsyncEmailDispatcher) su un server SMTP locale.
+"""
+import asyncio
+import time
+
+from utils.email_dispatcher import AsyncEmailDispatcher, dispatch_emails
+from utils.rate_limiter import AdaptiveRateLimiter
+
+def _messaggi(numero, pausa=0.0):
+    for i in range(numero):
+        if pausa:
+            time.sleep(pausa)
+        yield {'id': i, 'recipient_email': f'utente{i}@esempio.com', 'subject': 'Attestato', 'body': 'Testo'}
+
+def test_dispatch_invia_tutti_i_messaggi(smtp_server):
+    risultati = dispatch_emails(_messaggi(6), concurrency=2)
+
+    assert sorted(r[0] for r in risultati) == list(range(6))
+    assert all(success for _, success, _, _ in risultati)
+    assert sorted(smtp_server.destinatari) == sorted(f'utente{i}@esempio.com' for i in range(6))
+
+def test_iterabile_lento_non_blocca_il_ciclo(smtp_server):
+    async def scenario():
+        pause = []
+        stop = asyncio.Event()
+
+        async def battito():
+            ultimo = time.perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+                ora = time.perf_counter()
+                pause.append(ora - ultimo)
+                ultimo = ora
+
+        task = asyncio.create_task(battito())
+        await asyncio.sleep(0)
+        risultati = await AsyncEmailDispatcher(concurrency=2).send_all(_messaggi(3, pausa=0.3))
+        stop.set()
+        await task
+        return risultati, max(pause)
+
+    risultati, pausa_massima = asyncio.run(scenario())
+
+    assert len(risultati) == 3
+    assert pausa_massima < 0.2
+
+def test_token_preso_solo_per_messaggi_esistenti(smtp_server):
+    # Con l'orologio fermo i token non si ricaricano: ne resta uno solo se
+    # la fine dell'iterabile non ne ha consumato un altro
+    limiter = AdaptiveRateLimiter(60, burst=2, clock=lambda: 0.0)
+
+    risultati = dispatch_emails(_messaggi(1), concurrency=1, limiter=limiter)
+
+    assert [r[1] for r in risultati] == [True]
+    assert limiter.tokens == 1
@@ -0,0 +1,20 @@
+"""
+Test del pool di sessioni SMTP (SmtpConnectionPool) su un server SMTP locale.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.email_sender import SmtpConnectionPool
+
+def test_pool_usato_da_piu_thread(smtp_server):
+    with SmtpConnectionPool(size=3, max_messages=5) as pool:
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            esiti = list(executor.map(
+                lambda i: pool.send_email(f'utente{i}@esempio.com', 'Attestato', 'Testo'), range(30)
+            ))
+
+    assert all(success for success, _ in esiti)
+    assert len(smtp_server.destinatari) == 30
+    assert pool.stats['messaggi'] == 30
+    # Ogni sessione invia al più 5 messaggi prima di essere riaperta
+    assert pool.stats['connessioni'] >= 6
+    assert pool.stats['sessioni_riciclate'] <= pool.stats['connessioni']
@@ -0,0 +1,191 @@
+import io
+import csv
+import hashlib
+from datetime import datetime, time
+
+import pandas as pd
+import pytest
+
+from utils.excel_reader import (
+    read_excel_file, read_excel_chunks, file_sha256, normalize_excel_data, validate_excel_frame,
+    validate_excel_data, validate_row, row_validity, detect_file_format, READER_ENGINES, COLONNE_RICHIESTE
+)
+from utils.benchmark_excel import legacy_normalize
+from conftest import RIGHE_ESEMPIO
+
+# Righe con errori: email, ora e percorso non validi, ora di fine precedente all'inizio,
+# nome mancante, email e ora scritte in modo non riconosciuto
+RIGHE_NON_VALIDE = [
+    ["Paolo Gialli", "14/05/2025", "25:00", "11:00", "C3", "--", "--", "Didattica generale", "PeF99", "A-01", "non valida"],
+    ["Sara Blu", "14/05/2025", "11:00", "10.30", "C3", "Scienze della Formazione", "--", "Didattica generale",
+     "PeF36 CFU", "A-01", "sara.blu@esempio.com"],
+    [None, "14/05/2025", "09:00", "11:00", "--", "--", "--", "Pedagogia", "PeF60 CFU", "--", "anonimo@esempio.com"],
+    ["Marco Viola", "14/05/2025", "9", "10:00:00", "C3", "--", "--", "Pedagogia", "PeF 60", "--", "--"],
+]
+
+def _grezzo():
+    """
+    Righe di prova come arrivano dal file, prima della normalizzazione
+    """
+    return pd.DataFrame(RIGHE_ESEMPIO + RIGHE_NON_VALIDE, columns=COLONNE_RICHIESTE, dtype=object)
+
+# Messaggi della precedente validate_excel_data (un ciclo iterrows per riga) sulle stesse righe
+MESSAGGI_ATTESI = [
+    "Riga 6 [Paolo Gialli (non valida)]: Email non valida: non valida. Esempio formato: nome.cognome@uniroma3.it "
+    "o xxx.yyyyyyy@stud.uniroma3.it; Formato ora inizio non valido: 25:00 (deve essere HH:MM); "
+    "Tipo percorso non valido: PeF99",
+    "Riga 7 [Sara Blu (sara.blu@esempio.com)]: Ora fine (10:30) deve essere successiva a ora inizio (11:00)",
+    "Riga 9 [Marco Viola (--)]: Email non valida: --. Esempio formato: nome.cognome@uniroma3.it "
+    "o xxx.yyyyyyy@stud.uniroma3.it; Formato ora inizio non valido: 9 (deve essere HH:MM)",
+]
+
+def _valori(df):
+    # Confronta i valori indipendentemente dal dtype delle colonne e dalla forma dei valori mancanti
+    return df.astype(object).where(df.notna(), None)
+
+def _letto_a_blocchi(path, chunk_size):
+    blocchi, error_message = read_excel_chunks(path, chunk_size=chunk_size)
+    assert error_message is None
+    chunks = []
+    for chunk, errors in blocchi:
+        assert errors.empty
+        chunks.append(chunk)
+    return pd.concat(chunks)
+
+def _confrontabile(df):
+    # La lettura completa conserva alcune colonne come categorie: si confrontano i valori
+    return df[COLONNE_RICHIESTE + ['codice_percorso']].astype(object).reset_index(drop=True)
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_lettura_a_blocchi_uguale_alla_lettura_completa(excel_path, chunk_size):
+    df, error_message = read_excel_file(excel_path)
+    assert error_message is None
+
+    chunked = _letto_a_blocchi(excel_path, chunk_size)
+
+    assert list(chunked.index) == list(range(len(df)))
+    pd.testing.assert_frame_equal(_confrontabile(chunked), _confrontabile(df))
+
+def test_campi_di_testo_numerici_letti_come_stringhe(excel_path):
+    chunked = _letto_a_blocchi(excel_path, 2)
+
+    assert chunked.loc[2, 'classe_concorso'] == "12"
+    assert chunked.loc[1, 'aula'] == "101"
+    assert chunked.loc[1, 'dipartimento'] == ""
+
+def test_lettura_da_file_aperto(excel_path):
+    with open(excel_path, 'rb') as f:
+        data = f.read()
+
+    df, error_message = read_excel_file(io.BytesIO(data))
+
+    assert error_message is None
+    assert df.attrs['sha256'] == hashlib.sha256(data).hexdigest()
+
+def test_impronta_di_un_file_aperto_non_ne_sposta_la_posizione(excel_path):
+    with open(excel_path, 'rb') as f:
+        f.seek(10)
+        assert file_sha256(f, chunk_size=64) == file_sha256(excel_path)
+        assert f.tell() == 10
+
+def test_normalizzazione_uguale_alla_versione_cella_per_cella():
+    df = normalize_excel_data(_grezzo())
+
+    pd.testing.assert_frame_equal(_valori(df), _valori(legacy_normalize(_grezzo())))
+    assert df['ora_inizio'].tolist() == ['14:00', '16:00', '09:00', '11:00', '25:00', '11:00', '09:00', '9']
+    assert df['ora_fine'].tolist() == ['16:00', '18:00', '11:00', '13:00', '11:00', '10:30', '11:00', '10:00']
+    assert df.loc[1, 'email'] == 'giulia.bianchi@esempio.com'
+    assert df.loc[1, ['dipartimento', 'indirizzo']].tolist() == ['', '']
+    assert df.loc[7, 'email'] == '--'
+
+def test_validazione_stessi_messaggi_della_versione_per_riga():
+    df = normalize_excel_data(_grezzo())
+
+    assert validate_excel_data(df) == MESSAGGI_ATTESI
+    assert list(validate_excel_frame(df).itertuples(index=False, name=None)) == [
+        (4, 'email', 'email_non_valida', 'non valida'),
+        (4, 'ora_inizio', 'ora_non_valida', '25:00'),
+        (4, 'tipo_percorso', 'percorso_non_valido', 'PeF99'),
+        (5, 'ora_fine', 'ora_fine_precedente', '10:30'),
+        (7, 'email', 'email_non_valida', '--'),
+        (7, 'ora_inizio', 'ora_non_valida', '9'),
+    ]
+    assert validate_excel_frame(normalize_excel_data(pd.DataFrame(RIGHE_ESEMPIO, columns=COLONNE_RICHIESTE))).empty
+
+def test_validita_righe_come_validate_row():
+    df = normalize_excel_data(_grezzo())
+    attesi = [validate_row(riga)[1] for _, riga in df.iterrows()]
+
+    validita = row_validity(df)
+
+    assert validita.tolist() == attesi
+    assert validita.isna().tolist() == [True, True, True, True, False, True, False, False]
+    assert validita[4:].tolist() == [
+        "Formato email non valido: non valida", None,
+        "Campo essenziale 'nome_cognome' mancante o vuoto", "Campo essenziale 'email' mancante o vuoto",
+    ]
+    # Con l'impronta del file la validità viene riutilizzata anche per un sottoinsieme di righe
+    df.attrs['sha256'] = 'test_validita_righe_come_validate_row'
+    row_validity(df)
+    assert row_validity(df.iloc[4:]).tolist() == attesi[4:]
+
+def _righe_testo():
+    """
+    RIGHE_ESEMPIO come testo, come compaiono in un file CSV esportato dal foglio
+    """
+    def testo(valore):
+        if valore is None:
+            return ""
+        if isinstance(valore, datetime):
+            return valore.strftime("%d/%m/%Y")
+        if isinstance(valore, time):
+            return valore.strftime("%H:%M")
+        return str(valore)
+    return [[testo(valore) for valore in riga] for riga in RIGHE_ESEMPIO]
+
+def _scrivi_csv(path, separatore=","):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=separatore)
+        writer.writerow(COLONNE_RICHIESTE)
+        writer.writerows(_righe_testo())
+    return str(path)
+
+def test_formato_riconosciuto_dalla_firma(excel_path, tmp_path):
+    csv_path = _scrivi_csv(tmp_path / "presenze.csv")
+    # La firma conta più dell'estensione
+    parquet_path = tmp_path / "presenze.xlsx.bak"
+    parquet_path.write_bytes(b"PAR1" + bytes(16))
+
+    assert detect_file_format(excel_path) == 'xlsx'
+    assert detect_file_format(csv_path) == 'csv'
+    assert detect_file_format(str(parquet_path)) == 'parquet'
+    with open(excel_path, 'rb') as f:
+        f.seek(3)
+        assert detect_file_format(io.BytesIO(f.read())) == 'csv'
+        f.seek(0)
+        assert detect_file_format(f) == 'xlsx'
+        assert f.tell() == 0
+
+@pytest.mark.parametrize("engine", ['c', 'pyarrow'])
+@pytest.mark.parametrize("separatore", [',', ';'])
+def test_csv_letto_come_xlsx(excel_path, tmp_path, monkeypatch, engine, separatore):
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+    monkeypatch.setitem(READER_ENGINES, 'csv', [engine])
+    atteso, _ = read_excel_file(excel_path)
+
+    df, error_message = read_excel_file(_scrivi_csv(tmp_path / "presenze.csv", separatore))
+
+    assert error_message is None
+    pd.testing.assert_frame_equal(_confrontabile(df), _confrontabile(atteso))
+
+def test_parquet_letto_come_xlsx(excel_path, tmp_path):
+    pytest.importorskip('pyarrow')
+    atteso, _ = read_excel_file(excel_path)
+    parquet_path = str(tmp_path / "presenze.parquet")
+    pd.DataFrame(_righe_testo(), columns=COLONNE_RICHIESTE).to_parquet(parquet_path)
+
+    df, error_message = read_excel_file(parquet_path)
+
+    assert error_message is None
+    pd.testing.assert_frame_equal(_confrontabile(df), _confrontabile(atteso))
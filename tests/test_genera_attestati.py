@@ -0,0 +1,71 @@
+"""
+Test del comando genera_attestati: eventi JSON su stdout e codici di uscita.
+"""
+import os
+import json
+
+import pytest
+
+import config
+from genera_attestati import main, load_rows, ESITO_OK, ESITO_ARGOMENTI, ESITO_CONFIGURAZIONE
+
+ESEMPIO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "esempi", "dati_esempio.csv")
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    # Outbox e impronte dei file in una directory temporanea invece che in data/
+    monkeypatch.setattr(config, 'OUTBOX_PATH', str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(config, 'SHEET_HISTORY_PATH', str(tmp_path / "sheet_history.sqlite3"))
+
+def _eventi(capsys):
+    return [json.loads(riga) for riga in capsys.readouterr().out.splitlines()]
+
+def test_solo_pdf(tmp_path, capsys):
+    output_dir = tmp_path / "pdf"
+
+    assert main([ESEMPIO, '--no-email', '--output-dir', str(output_dir)]) == ESITO_OK
+
+    eventi = _eventi(capsys)
+    tipi = [evento['evento'] for evento in eventi]
+    assert tipi[0] == 'inizio' and tipi[-1] == 'fine'
+    assert 'totale' in tipi
+    esiti = [evento for evento in eventi if evento['evento'] == 'esito']
+    assert esiti and all(esito['successo'] for esito in esiti)
+    assert eventi[-1]['riusciti'] == len(esiti) == len(os.listdir(output_dir))
+    # Senza invio email non vengono aperti outbox e impronte dei file
+    assert not os.path.exists(config.OUTBOX_PATH)
+    assert not os.path.exists(config.SHEET_HISTORY_PATH)
+
+def test_pdf_unico(tmp_path, capsys):
+    output_dir = tmp_path / "pdf"
+
+    assert main([ESEMPIO, '--no-email', '--pdf-unico', '--output-dir', str(output_dir)]) == ESITO_OK
+
+    fine = _eventi(capsys)[-1]
+    assert fine['documento'] == str(output_dir / "attestati_dati_esempio.pdf")
+    assert os.listdir(output_dir) == ["attestati_dati_esempio.pdf"]
+
+def test_file_grande_letto_a_blocchi(excel_path, monkeypatch):
+    monkeypatch.setattr(config, 'EXCEL_STREAMING_MB', 0)
+
+    df, file_data, error_message = load_rows(excel_path)
+
+    assert df is None and error_message is None
+    with open(excel_path, 'rb') as f:
+        assert file_data == f.read()
+
+def test_file_mancante(tmp_path, capsys):
+    assert main([str(tmp_path / "assente.xlsx"), '--no-email']) == ESITO_CONFIGURAZIONE
+
+    eventi = _eventi(capsys)
+    assert [evento['evento'] for evento in eventi] == ['errore']
+
+@pytest.mark.parametrize("argomenti", [
+    ['--no-email', '--limite', '0'],
+    ['--no-email', '--limite', 'tre'],
+    # Il documento unico è previsto solo senza invio email
+    ['--pdf-unico'],
+])
+def test_argomenti_non_validi(argomenti, capsys):
+    assert main([ESEMPIO, *argomenti]) == ESITO_ARGOMENTI
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,89 @@
+"""
+Test dell'esecuzione dei lotti in background (JobRunner).
+"""
+import threading
+import time
+
+import pytest
+
+from utils.job_runner import (
+    JobRunner, STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED, STATUS_QUEUED, STATUS_RUNNING
+)
+
+def _attendi(runner, job_id, stati=(STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED), timeout=5):
+    scadenza = time.monotonic() + timeout
+    while time.monotonic() < scadenza:
+        stato = runner.get(job_id)
+        if stato['status'] in stati:
+            return stato
+        time.sleep(0.01)
+    pytest.fail(f"Il lavoro {job_id} non è terminato")
+
+def test_lavoro_completato():
+    def lotto(job, righe):
+        job.set_total(len(righe))
+        for riga in righe:
+            job.add_result(riga != 'errata', riga)
+        job.add_skipped()
+        return 'fatto'
+
+    runner = JobRunner(max_workers=1)
+    job_id = runner.submit("Lotto", lotto, ['a', 'errata', 'b'], resource=7)
+
+    stato = _attendi(runner, job_id)
+    assert stato['status'] == STATUS_DONE
+    assert stato['result'] == 'fatto'
+    assert stato['success_messages'] == ['a', 'b']
+    assert stato['error_messages'] == ['errata']
+    assert (stato['done'], stato['total'], stato['progress']) == (4, 3, 1.0)
+    assert runner.busy_resources() == set()
+
+def test_lavoro_fallito():
+    def lotto(job):
+        raise RuntimeError("SMTP non raggiungibile")
+
+    runner = JobRunner(max_workers=1)
+    stato = _attendi(runner, runner.submit("Lotto", lotto))
+
+    assert stato['status'] == STATUS_FAILED
+    assert stato['error'] == "SMTP non raggiungibile"
+
+def test_coda_e_annullamento():
+    avviato = threading.Event()
+    sblocca = threading.Event()
+
+    def bloccante(job):
+        avviato.set()
+        sblocca.wait(5)
+
+    runner = JobRunner(max_workers=1)
+    primo = runner.submit("Primo", bloccante, resource='lotto-1')
+    assert avviato.wait(5)
+    secondo = runner.submit("Secondo", lambda job: 'eseguito', resource='lotto-2')
+
+    assert runner.get(primo)['status'] == STATUS_RUNNING
+    assert runner.get(secondo)['status'] == STATUS_QUEUED
+    assert runner.busy_resources() == {'lotto-1', 'lotto-2'}
+    # I lavori avviati non vengono interrotti, quelli in coda sì
+    assert not runner.cancel(primo)
+    assert runner.cancel(secondo)
+    assert not runner.remove(primo)
+
+    sblocca.set()
+    assert _attendi(runner, primo)['status'] == STATUS_DONE
+    assert runner.get(secondo)['status'] == STATUS_CANCELLED
+    assert runner.get(secondo)['result'] is None
+    assert runner.remove(primo)
+    assert runner.get(primo) is None
+
+def test_riepilogo_limitato_ai_lavori_recenti():
+    runner = JobRunner(max_workers=1, history=2)
+    ids = []
+    for i in range(4):
+        ids.append(runner.submit(f"Lotto {i}", lambda job: None))
+        _attendi(runner, ids[-1])
+    ultimo = runner.submit("Ultimo", lambda job: None)
+    _attendi(runner, ultimo)
+
+    assert runner.get(ids[0]) is None
+    assert [job['id'] for job in runner.jobs()] == ids[2:] + [ultimo]
@@ -0,0 +1,127 @@
+"""
+Test dell'outbox SQLite degli invii email (EmailOutbox), su un database in memoria.
+"""
+import os
+import shutil
+
+import pytest
+
+import config
+import utils.batch
+from utils.job_runner import Job
+from utils.outbox import EmailOutbox, STATUS_QUEUED, STATUS_SENDING, STATUS_SENT, STATUS_FAILED
+from utils.pdf_generator import PdfRenderer
+
+LOGO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "logo.png")
+
+@pytest.fixture
+def outbox():
+    with EmailOutbox(':memory:') as outbox:
+        yield outbox
+
+def _righe(numero):
+    return [
+        (i, {'email': f'utente{i}@esempio.com', 'nome_cognome': f'Utente {i}', 'data': '12/05/2025',
+             'ora_inizio': '09:00', 'ora_fine': '11:00', 'tipo_lezione': 'Didattica generale'})
+        for i in range(numero)
+    ]
+
+def test_lotto_registrato_in_coda(outbox):
+    batch_id = outbox.create_batch(_righe(3), 'presenze.xlsx', 'presenza')
+
+    pending = outbox.pending(batch_id)
+    assert [m['row_index'] for m in pending] == [0, 1, 2]
+    assert pending[0]['recipient_email'] == 'utente0@esempio.com'
+    assert pending[0]['row']['nome_cognome'] == 'Utente 0'
+    assert outbox.counts(batch_id)[STATUS_QUEUED] == 3
+    assert outbox.get_batch(batch_id)['name'] == 'presenze.xlsx'
+
+def test_lotto_conserva_modello_e_immagini(outbox, tmp_path):
+    logo = tmp_path / "logo.png"
+    shutil.copy(LOGO, logo)
+    batch_id = outbox.create_batch(_righe(1), 'presenze.xlsx', 'presenza', str(logo), str(tmp_path / "assente.png"),
+                                   "Titolo\nSottotitolo\n{nome_cognome}")
+
+    lotto = outbox.get_batch(batch_id)
+    assert lotto['testo_modello'] == "Titolo\nSottotitolo\n{nome_cognome}"
+    assert lotto['logo'] == logo.read_bytes()
+    assert lotto['firma'] is None
+    # L'elenco dei lotti da riprendere non legge le immagini
+    assert 'logo' not in outbox.incomplete_batches()[0]
+
+def test_stati_dei_messaggi(outbox):
+    batch_id = outbox.create_batch(_righe(4), 'presenze.xlsx', 'presenza')
+    primo, secondo, terzo, quarto = (m['id'] for m in outbox.pending(batch_id))
+
+    outbox.mark_sending(primo)
+    outbox.mark_sent(primo, '250 OK')
+    outbox.mark_sending(secondo)
+    outbox.mark_failed(secondo, 'Destinatario inesistente', 550)
+    outbox.mark_sending(terzo)
+    outbox.mark_retry(terzo, 'Riprovare', 451)
+    # Invio interrotto prima della conferma del server
+    outbox.mark_sending(quarto)
+
+    counts = outbox.counts(batch_id)
+    assert (counts[STATUS_SENT], counts[STATUS_FAILED], counts[STATUS_QUEUED], counts[STATUS_SENDING]) == (1, 1, 1, 1)
+    assert [m['id'] for m in outbox.pending(batch_id)] == [terzo, quarto]
+    assert [m['id'] for m in outbox.pending(batch_id, include_failed=True)] == [secondo, terzo, quarto]
+    assert outbox.pending(batch_id)[0]['attempts'] == 1
+
+def test_lotti_da_riprendere(outbox):
+    completo = outbox.create_batch(_righe(1), 'completo.xlsx')
+    interrotto = outbox.create_batch(_righe(2), 'interrotto.xlsx')
+    archiviato = outbox.create_batch(_righe(1), 'archiviato.xlsx')
+    outbox.mark_sent(outbox.pending(completo)[0]['id'])
+    outbox.close_batch(archiviato)
+
+    lotti = outbox.incomplete_batches()
+
+    assert [(b['id'], b['da_inviare']) for b in lotti] == [(interrotto, 2)]
+
+def test_stato_conservato_su_disco(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+    with EmailOutbox(path) as outbox:
+        batch_id = outbox.create_batch(_righe(2), 'presenze.xlsx')
+        outbox.mark_sent(outbox.pending(batch_id)[0]['id'])
+
+    with EmailOutbox(path) as outbox:
+        assert [m['row_index'] for m in outbox.pending(batch_id)] == [1]
+
+def _righe_complete(numero):
+    return [
+        (i, dict(riga, aula='A1', dipartimento='Scienze della Formazione', indirizzo='Via del Castro Pretorio 20',
+                 tipo_percorso='PeF60 CFU', classe_concorso='A-01'))
+        for i, riga in _righe(numero)
+    ]
+
+def test_ripresa_con_modello_e_immagini_del_lotto(smtp_server, outbox, tmp_path, monkeypatch):
+    logo = tmp_path / "logo.png"
+    shutil.copy(LOGO, logo)
+    testo_lotto = config.ATTESTATO_PRESENZA
+    outbox.create_batch(_righe_complete(2), 'presenze.xlsx', 'presenza', str(logo), None, testo_lotto)
+    # Dopo l'interruzione vengono caricati un altro logo e un altro modello
+    logo.write_bytes(b"altro logo")
+    monkeypatch.setattr(config, 'ATTESTATO_PRESENZA', "Titolo\nSottotitolo\nAltro testo per {nome_cognome}")
+    usati = []
+
+    class RendererRegistrato(PdfRenderer):
+        def __init__(self, modello, logo_path, firma_path, testo_modello=None):
+            super().__init__(modello, logo_path, firma_path, testo_modello)
+            with open(logo_path, 'rb') as f:
+                usati.append((f.read(), firma_path, testo_modello))
+
+    monkeypatch.setattr(utils.batch, 'PdfRenderer', RendererRegistrato)
+    job = Job('Ripresa')
+    utils.batch.run_resume_job(job, outbox, outbox.incomplete_batches()[0])
+
+    with open(LOGO, 'rb') as f:
+        assert usati == [(f.read(), None, testo_lotto)]
+    assert len(job.success_messages) == 2
+    assert len(smtp_server.destinatari) == 2
+
+def test_ripresa_rifiutata_senza_modello(outbox):
+    outbox.create_batch(_righe_complete(1), 'presenze.xlsx', 'presenza')
+
+    with pytest.raises(ValueError):
+        utils.batch.run_resume_job(Job('Ripresa'), outbox, outbox.incomplete_batches()[0])
@@ -0,0 +1,76 @@
+"""
+Test della generazione dei PDF di un lotto in un pool di processi (generate_pdfs_batch).
+"""
+import os
+import re
+import time
+import multiprocessing
+
+import pytest
+
+import config
+from utils.pdf_generator import generate_pdf, generate_pdfs_batch, PdfRenderer
+
+RIGHE = [
+    {'nome_cognome': nome, 'data': '12/05/2025', 'ora_inizio': '14:00', 'ora_fine': '16:00',
+     'aula': 'A1', 'dipartimento': 'Scienze della Formazione', 'indirizzo': 'Via del Castro Pretorio 20',
+     'tipo_lezione': 'Pedagogia', 'tipo_percorso': 'PeF60 CFU', 'classe_concorso': 'A-01',
+     'email': 'prova@esempio.com'}
+    for nome in ("Mario Rossi", "Bloccato Sempre", "Giulia Bianchi", "Luca Verdi", "Anna Neri")
+]
+
+_render = PdfRenderer.render
+
+def _render_bloccato(self, data, output_dir="output"):
+    # Simula un attestato la cui generazione non termina
+    if data['nome_cognome'] == "Bloccato Sempre":
+        time.sleep(60)
+    return _render(self, data, output_dir)
+
+@pytest.fixture
+def renderer_bloccato(monkeypatch):
+    # Con fork i processi del pool ereditano la sostituzione
+    monkeypatch.setattr(PdfRenderer, "render", _render_bloccato)
+    return multiprocessing.get_context("fork")
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_timeout_termina_la_riga_bloccata(tmp_path, renderer_bloccato, max_workers):
+    start = time.monotonic()
+    risultati = dict(generate_pdfs_batch(
+        RIGHE, output_dir=str(tmp_path), max_workers=max_workers, chunk_size=1, timeout=1,
+        mp_context=renderer_bloccato
+    ))
+    durata = time.monotonic() - start
+
+    assert sorted(risultati) == list(range(len(RIGHE)))
+    assert risultati[1] is None
+    assert all(risultati[i] for i in (0, 2, 3, 4))
+    assert durata < 20
+    # Il processo bloccato è stato terminato
+    assert not multiprocessing.active_children()
+
+def test_risultati_in_ordine_senza_timeout(tmp_path):
+    righe = [riga for riga in RIGHE if riga['nome_cognome'] != "Bloccato Sempre"]
+    risultati = list(generate_pdfs_batch(righe, output_dir=str(tmp_path), max_workers=2, chunk_size=1))
+
+    assert [index for index, _ in risultati] == list(range(len(righe)))
+    assert all(path for _, path in risultati)
+
+def _senza_date(pdf_bytes):
+    # Data di creazione e identificativo del file cambiano a ogni generazione
+    pdf_bytes = re.sub(rb"/(CreationDate|ModDate) \(D:[^)]*\)", b"", pdf_bytes)
+    return re.sub(rb"/ID\s*\[[^\]]*\]", b"", pdf_bytes)
+
+def test_pool_stesso_pdf_di_generate_pdf(tmp_path, monkeypatch):
+    # Valore modificato dall'interfaccia: deve arrivare anche ai processi del pool
+    monkeypatch.setattr(config, "DIRETTORE_CAFIS", "Prof. Direttore di Prova")
+    righe = [riga for riga in RIGHE if riga['nome_cognome'] != "Bloccato Sempre"]
+
+    attesi = [generate_pdf(riga, output_dir=str(tmp_path / "sequenziale")) for riga in righe]
+    risultati = list(generate_pdfs_batch(righe, output_dir=str(tmp_path / "pool"), max_workers=2, chunk_size=1))
+
+    assert len(risultati) == len(attesi)
+    for (_, path), atteso in zip(risultati, attesi):
+        assert os.path.basename(path) == os.path.basename(atteso)
+        with open(path, 'rb') as pool_pdf, open(atteso, 'rb') as sequenziale_pdf:
+            assert _senza_date(pool_pdf.read()) == _senza_date(sequenziale_pdf.read())
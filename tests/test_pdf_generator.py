@@ -0,0 +1,91 @@
+import os
+import re
+import zlib
+import base64
+
+import pytest
+
+from utils.pdf_generator import PdfRenderer, StaticLayerPdfRenderer
+from utils.records import AttestatoRecord
+from utils.excel_reader import read_excel_file
+from utils.job_runner import Job
+from utils.batch import run_generation_job
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+LOGO = os.path.join(ASSETS, "logo.png")
+FIRMA = os.path.join(ASSETS, "firma.png")
+
+RIGA = AttestatoRecord(
+    nome_cognome="Mario Rossi", data="12/05/2025", ora_inizio="14:00", ora_fine="16:00", aula="A1",
+    dipartimento="Scienze della Formazione", indirizzo="Via del Castro Pretorio 20",
+    tipo_lezione="Didattica generale", tipo_percorso="PeF60 CFU", classe_concorso="A-01",
+    email="mario.rossi@esempio.com", codice_percorso="PEF60"
+)
+
+def _streams(pdf_bytes):
+    """
+    Contenuto decompresso di tutti gli stream del PDF (pagine, form e immagini)
+    """
+    contenuti = []
+    for stream in re.findall(rb"stream\r?\n(.*?)endstream", pdf_bytes, re.S):
+        # reportlab codifica gli stream con /ASCII85Decode /FlateDecode
+        try:
+            contenuti.append(zlib.decompress(base64.a85decode(stream.strip().removesuffix(b"~>"))))
+        except (ValueError, zlib.error):
+            contenuti.append(stream)
+    return contenuti
+
+def _testi(pdf_bytes):
+    """
+    Stringhe disegnate nel PDF, in qualsiasi stream
+    """
+    testi = []
+    for stream in _streams(pdf_bytes):
+        for blocco in re.findall(rb"BT(.*?)ET", stream, re.S):
+            testi.extend(re.findall(rb"\((?:\\.|[^\\)])*\)", blocco))
+    return sorted(testi)
+
+def _immagini(pdf_bytes):
+    return len(re.findall(rb"/Subtype\s*/Image", pdf_bytes))
+
+def _pagine(pdf_bytes):
+    return len(re.findall(rb"/Type\s*/Page\b", pdf_bytes))
+
+@pytest.mark.parametrize("modello", ["presenza", "telematico"])
+def test_livelli_statici_stesso_contenuto_di_pdf_renderer(modello):
+    base = PdfRenderer(modello, LOGO, FIRMA).render_bytes(RIGA)
+    livelli = StaticLayerPdfRenderer(modello, LOGO, FIRMA).render_bytes(RIGA)
+
+    assert base is not None and livelli is not None
+    assert any(b"Mario Rossi" in testo for testo in _testi(base))
+    assert _testi(livelli) == _testi(base)
+    assert _immagini(livelli) == _immagini(base)
+    assert _pagine(livelli) == _pagine(base) == 1
+
+def test_documento_unico_una_pagina_per_riga(tmp_path):
+    renderer = StaticLayerPdfRenderer("presenza", LOGO, FIRMA)
+    path = renderer.render_document([RIGA] * 3, str(tmp_path / "attestati.pdf"))
+
+    with open(path, "rb") as f:
+        documento = f.read()
+    singolo = PdfRenderer("presenza", LOGO, FIRMA).render_bytes(RIGA)
+
+    assert _pagine(documento) == 3
+    # Logo e firma compaiono una sola volta nel file
+    assert _immagini(documento) == _immagini(singolo)
+    # La parte fissa è disegnata una sola volta come form: stessi testi, meno ripetizioni
+    assert set(_testi(documento)) == set(_testi(singolo))
+    assert len(_testi(documento)) < 3 * len(_testi(singolo))
+
+def test_lotto_in_un_unico_pdf(excel_path, tmp_path):
+    df, _ = read_excel_file(excel_path)
+    job = Job('Generazione')
+
+    path = run_generation_job(job, None, df, None, None, False, 'presenza', LOGO, FIRMA,
+                              file_name='presenze.xlsx', output_dir=str(tmp_path / "pdf"), single_document=True)
+
+    assert os.path.basename(path) == "attestati_presenze.pdf"
+    assert os.listdir(tmp_path / "pdf") == ["attestati_presenze.pdf"]
+    with open(path, "rb") as f:
+        assert _pagine(f.read()) == len(df)
+    assert len(job.success_messages) == len(df) and not job.error_messages
@@ -0,0 +1,77 @@
+"""
+Test della pipeline di generazione e invio (AttestatoPipeline) su un server SMTP locale.
+"""
+import threading
+
+import pytest
+
+from utils.pipeline import AttestatoPipeline, STAGES
+
+def _elementi(numero):
+    return [{'id': i, 'email': f'utente{i}@esempio.com'} for i in range(numero)]
+
+def _messaggio(item):
+    return True, {'id': item['id'], 'recipient_email': item['email'], 'subject': 'Attestato',
+                  'body': 'Testo', 'attachment_data': b'%PDF-1.4', 'attachment_name': 'attestato.pdf'}
+
+def test_elementi_inviati_o_scartati(smtp_server):
+    scartati = {}
+    risultati = {}
+    inviati = []
+
+    def genera(item):
+        if item['id'] == 3:
+            return False, "Errore nella generazione del PDF"
+        return _messaggio(item)
+
+    pipeline = AttestatoPipeline(
+        genera, validate=lambda item: "Email non valida" if item['id'] == 2 else None,
+        on_error=lambda i, errore: scartati.update({i: errore}),
+        on_send=lambda message: inviati.append(message['id']),
+        on_result=lambda i, success, error, code: risultati.update({i: success}),
+        render_ahead=2, concurrency=2
+    )
+    stats = pipeline.run(_elementi(6))
+
+    assert scartati == {2: "Email non valida", 3: "Errore nella generazione del PDF"}
+    assert risultati == {0: True, 1: True, 4: True, 5: True}
+    assert sorted(inviati) == [0, 1, 4, 5]
+    assert len(smtp_server.destinatari) == 4
+    assert list(stats) == list(STAGES)
+    assert stats['validazione']['elementi'] == 6
+    assert stats['generazione']['elementi'] == 5
+    assert stats['invio']['elementi'] == 4
+    assert all(0 <= stage['utilizzo'] <= 1 for stage in stats.values())
+
+def test_generazione_limitata_dall_invio(smtp_server):
+    smtp_server.latenza = 0.02
+    lock = threading.Lock()
+    conteggi = {'generati': 0, 'conclusi': 0, 'anticipo': 0}
+
+    def genera(item):
+        with lock:
+            conteggi['generati'] += 1
+            conteggi['anticipo'] = max(conteggi['anticipo'], conteggi['generati'] - conteggi['conclusi'])
+        return _messaggio(item)
+
+    def esito(*args):
+        with lock:
+            conteggi['conclusi'] += 1
+
+    render_ahead, concurrency = 2, 1
+    AttestatoPipeline(genera, on_result=esito, render_ahead=render_ahead, concurrency=concurrency).run(_elementi(30))
+
+    assert conteggi['conclusi'] == 30
+    # Coda dei PDF generati, coda dei messaggi pronti, un elemento in mano a ciascuno
+    # stadio, finestra di invio del dispatcher e messaggio letto in anticipo
+    assert conteggi['anticipo'] <= render_ahead + 1 + 2 + 2 * concurrency + 1
+
+def test_errore_di_uno_stadio_propagato(smtp_server):
+    def genera(item):
+        if item['id'] == 1:
+            raise RuntimeError("reportlab non disponibile")
+        return _messaggio(item)
+
+    with pytest.raises(RuntimeError, match="reportlab non disponibile"):
+        AttestatoPipeline(genera, render_ahead=1, concurrency=1).run(_elementi(5))
+    assert not [t for t in threading.enumerate() if t.name.startswith("pipeline-")]
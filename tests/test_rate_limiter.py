@@ -0,0 +1,58 @@
+"""
+Test del limitatore di velocità adattivo (AdaptiveRateLimiter) con un orologio simulato.
+"""
+import pytest
+
+from utils.rate_limiter import AdaptiveRateLimiter
+
+class Orologio:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def orologio():
+    return Orologio()
+
+def test_burst_poi_attesa(orologio):
+    limiter = AdaptiveRateLimiter(60, burst=2, clock=orologio)
+
+    assert limiter.try_acquire() == 0
+    assert limiter.try_acquire() == 0
+    assert limiter.try_acquire() == pytest.approx(1.0)
+
+    orologio.now = 1.0
+    assert limiter.try_acquire() == 0
+
+def test_rallentamento_e_recupero(orologio):
+    limiter = AdaptiveRateLimiter(60, min_messages_per_minute=10, recovery_after=3, recovery_step=6,
+                                  clock=orologio)
+
+    limiter.report(throttled=True)
+    assert limiter.messages_per_minute == pytest.approx(30)
+    # Il bucket viene svuotato: il prossimo invio attende un intero intervallo
+    assert limiter.try_acquire() == pytest.approx(2.0)
+
+    for _ in range(3):
+        limiter.report(throttled=True)
+    assert limiter.messages_per_minute == pytest.approx(10)
+
+    for _ in range(3):
+        limiter.report()
+    assert limiter.messages_per_minute == pytest.approx(16)
+    assert limiter.stats['rallentamenti'] == 4
+    assert limiter.stats['recuperi'] == 1
+
+def test_recupero_non_supera_la_velocita_massima(orologio):
+    limiter = AdaptiveRateLimiter(60, recovery_after=1, recovery_step=100, clock=orologio)
+
+    limiter.report(throttled=True)
+    limiter.report()
+
+    assert limiter.messages_per_minute == pytest.approx(60)
+
+def test_velocita_non_valida():
+    with pytest.raises(ValueError):
+        AdaptiveRateLimiter(0)
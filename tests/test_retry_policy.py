@@ -0,0 +1,75 @@
+"""
+Test della classificazione degli errori SMTP e della politica di ripetizione (RetryPolicy).
+"""
+import smtplib
+import socket
+
+import pytest
+
+from utils.email_dispatcher import dispatch_emails
+from utils.retry_policy import RetryPolicy, classify_smtp_error, TRANSIENT, PERMANENT
+
+@pytest.mark.parametrize("errore, esito", [
+    (smtplib.SMTPResponseException(421, b"Servizio non disponibile"), TRANSIENT),
+    (smtplib.SMTPDataError(451, b"Riprovare"), TRANSIENT),
+    (smtplib.SMTPAuthenticationError(535, b"Credenziali errate"), PERMANENT),
+    (smtplib.SMTPRecipientsRefused({'a@esempio.com': (450, b"Casella occupata")}), TRANSIENT),
+    (smtplib.SMTPRecipientsRefused({'a@esempio.com': (550, b"Utente sconosciuto")}), PERMANENT),
+    (smtplib.SMTPServerDisconnected("Connessione chiusa"), TRANSIENT),
+    (smtplib.SMTPNotSupportedError("AUTH non supportato"), PERMANENT),
+    (socket.timeout("timeout"), TRANSIENT),
+    (ConnectionRefusedError(), TRANSIENT),
+    (ValueError("altro"), PERMANENT),
+    (None, PERMANENT),
+])
+def test_classificazione(errore, esito):
+    assert classify_smtp_error(errore) == esito
+
+@pytest.mark.parametrize("casuale", [0.0, 0.5, 0.999])
+def test_attesa_esponenziale_con_limite(casuale):
+    policy = RetryPolicy(base_delay=5, max_delay=30, rng=lambda: casuale)
+
+    for tentativo, limite in [(1, 5), (2, 10), (3, 20), (4, 30), (10, 30)]:
+        attesa = policy.backoff(tentativo)
+        assert limite / 2 <= attesa <= limite
+
+def test_tentativi_esauriti():
+    policy = RetryPolicy(max_attempts=3, base_delay=1, rng=lambda: 0.0)
+    errore = smtplib.SMTPServerDisconnected()
+
+    assert policy.next_delay(errore, 1) == pytest.approx(0.5)
+    assert policy.next_delay(errore, 2) == pytest.approx(1.0)
+    assert policy.next_delay(errore, 3) is None
+    policy.record_success(2)
+
+    assert policy.stats['ritentativi'] == 2
+    assert policy.stats['secondi_attesa'] == pytest.approx(1.5)
+    assert policy.stats['tentativi_esauriti'] == 1
+    assert policy.stats['recuperati'] == 1
+
+def test_errori_definitivi_non_ripetuti():
+    policy = RetryPolicy()
+
+    assert policy.next_delay(smtplib.SMTPRecipientsRefused({'a@esempio.com': (550, b"No")}), 1) is None
+    policy.record_success(1)
+
+    assert policy.stats['errori_definitivi'] == 1
+    assert policy.stats['ritentativi'] == 0
+    assert policy.stats['recuperati'] == 0
+
+def test_invio_ripetuto_dopo_errore_temporaneo(smtp_server):
+    smtp_server.rifiuta_una_volta.add('utente1@esempio.com')
+    policy = RetryPolicy(base_delay=0.05, rng=lambda: 0.0)
+    ripetuti = []
+    messaggi = [
+        {'id': i, 'recipient_email': f'utente{i}@esempio.com', 'subject': 'Attestato', 'body': 'Testo'}
+        for i in range(3)
+    ]
+
+    risultati = dispatch_emails(messaggi, concurrency=2, retry_policy=policy,
+                                on_retry=lambda *args: ripetuti.append(args))
+
+    assert sorted(risultati) == [(i, True, None, None) for i in range(3)]
+    assert [(r[0], r[2]) for r in ripetuti] == [(1, 451)]
+    assert policy.stats['recuperati'] == 1
+    assert sorted(smtp_server.destinatari) == [f'utente{i}@esempio.com' for i in range(3)]
@@ -0,0 +1,34 @@
+"""
+Test dello scaricamento su disco dei dataset delle sessioni e della cache dei file caricati.
+"""
+import pytest
+
+from utils.excel_reader import ParsedUploadCache, read_excel_upload
+from utils.session_dataset import SessionDataset
+
+@pytest.fixture
+def upload(excel_path):
+    with open(excel_path, 'rb') as f:
+        return f.read()
+
+def test_discard_rimuove_solo_il_dataframe_indicato(upload):
+    cache = ParsedUploadCache(64 * 1024 * 1024)
+    df, _ = read_excel_upload(upload, cache=cache)
+    key = df.attrs['sha256']
+
+    assert not cache.discard(key, df.copy())
+    assert cache.get(key)[0] is df
+    assert cache.discard(key, df)
+    assert cache.get(key) is None
+    assert cache.size == 0
+
+def test_spill_toglie_il_dataframe_dalla_cache(upload, tmp_path):
+    pytest.importorskip("pyarrow")
+    cache = ParsedUploadCache(64 * 1024 * 1024)
+    df, _ = read_excel_upload(upload, cache=cache)
+    dataset = SessionDataset(df, str(tmp_path), cache=cache)
+
+    assert dataset.spill()
+    assert dataset.spilled
+    assert cache.get(df.attrs['sha256']) is None
+    assert len(dataset.get()) == len(df)
@@ -0,0 +1,85 @@
+"""
+Test del confronto con le versioni già inviate dei file ricaricati (SheetDiff, SheetHistory).
+"""
+import numpy as np
+import pytest
+
+from utils.excel_reader import read_excel_file
+from utils.job_runner import Job
+from utils.batch import run_generation_job
+from utils.sheet_history import SheetDiff, SheetHistory, row_fingerprints
+
+@pytest.fixture
+def df(excel_path):
+    df, error_message = read_excel_file(excel_path)
+    assert error_message is None
+    return df
+
+@pytest.fixture
+def history():
+    with SheetHistory(':memory:') as history:
+        yield history
+
+def test_impronte_uguali_per_righe_uguali(df):
+    impronte = row_fingerprints(df)
+
+    assert impronte.dtype == np.uint64
+    assert len(set(impronte.tolist())) == len(df)
+    np.testing.assert_array_equal(row_fingerprints(df.copy()), impronte)
+
+def test_solo_righe_nuove_o_modificate(df, history):
+    diff = SheetDiff(history.previous('presenze.xlsx', 'presenza', True))
+    assert diff.compare(df).all()
+    history.save('presenze.xlsx', 'presenza', True, diff.fingerprints())
+
+    modificato = df.copy()
+    modificato.loc[1, 'aula'] = 'B3'
+    diff = SheetDiff(history.previous('presenze.xlsx', 'presenza', True))
+
+    assert diff.compare(modificato).tolist() == [False, True, False, False]
+    assert diff.unchanged == 3
+
+def test_righe_scartate_riproposte(df, history):
+    diff = SheetDiff()
+    diff.compare(df)
+    diff.discard(2)
+    history.save('presenze.xlsx', 'presenza', True, diff.fingerprints())
+
+    diff = SheetDiff(history.previous('presenze.xlsx', 'presenza', True))
+
+    assert diff.compare(df).tolist() == [False, False, True, False]
+
+def test_tutte_le_righe_conservano_le_impronte_precedenti(df, history):
+    diff = SheetDiff()
+    diff.compare(df.iloc[:2])
+    history.save('presenze.xlsx', 'presenza', True, diff.fingerprints())
+
+    # Con only_changed=False tutte le righe vengono elaborate, ma le impronte
+    # dell'invio precedente non vanno perse
+    diff = SheetDiff(history.previous('presenze.xlsx', 'presenza', True), only_changed=False)
+    assert diff.compare(df.iloc[2:]).all()
+    assert diff.unchanged == 0
+    history.save('presenze.xlsx', 'presenza', True, diff.fingerprints())
+
+    previous = history.previous('presenze.xlsx', 'presenza', True)
+    assert previous['righe'] == 4
+    assert not SheetDiff(previous).compare(df).any()
+
+def test_versioni_separate_per_modello_e_invio(df, history):
+    diff = SheetDiff()
+    diff.compare(df)
+    history.save('presenze.xlsx', 'presenza', True, diff.fingerprints())
+
+    assert history.previous('presenze.xlsx', 'telematico', True) is None
+    assert history.previous('presenze.xlsx', 'presenza', False) is None
+    assert history.previous('altro.xlsx', 'presenza', True) is None
+
+def test_generazione_senza_invio_non_salta_righe(df, history, tmp_path):
+    for prova in range(2):
+        job = Job('Generazione')
+        run_generation_job(job, None, df, None, None, False, 'presenza', None, None,
+                           file_name='presenze.xlsx', output_dir=str(tmp_path / str(prova)), history=history)
+
+        assert len(job.success_messages) == len(df)
+        assert job.unchanged == 0
+    assert history.previous('presenze.xlsx', 'presenza', False) is None
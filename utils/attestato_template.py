@@ -0,0 +1,173 @@
+"""
+Modelli di testo degli attestati compilati una sola volta per lotto.
+
+Il testo di un modello (config.ATTESTATO_PRESENZA, ATTESTATO_TELEMATICO o il
+modello personalizzato) viene analizzato da compile_template: i segnaposto sono
+verificati prima della generazione, con un messaggio che elenca quelli
+disponibili, e le varianti per classe di concorso e dipartimento vuoti sono
+precalcolate, così per ogni riga resta una sola sostituzione.
+"""
+from functools import lru_cache
+from string import Formatter
+
+# Segnaposto che cambiano da una riga all'altra dello stesso lotto
+ROW_PLACEHOLDERS = frozenset({
+    'nome_cognome', 'data', 'ora_inizio', 'ora_fine', 'aula', 'dipartimento',
+    'indirizzo', 'tipo_lezione', 'tipo_percorso', 'classe_concorso'
+})
+
+# Segnaposto con lo stesso valore per tutto il lotto
+BATCH_PLACEHOLDERS = frozenset({'data_rilascio', 'universita', 'direttore_cafis'})
+
+# Tutti i segnaposto utilizzabili nel testo degli attestati
+ALLOWED_PLACEHOLDERS = ROW_PLACEHOLDERS | BATCH_PLACEHOLDERS
+
+# Porzioni del modello rimosse quando i campi opzionali sono vuoti
+CLASSE_CONCORSO_SEGMENT = " – {classe_concorso}"
+DIPARTIMENTO_SEGMENT = "l'aula {aula} del dipartimento di {dipartimento}"
+DIPARTIMENTO_REPLACEMENT = "l'aula {aula}"
+
+class TemplateError(ValueError):
+    """
+    Errore nel testo di un modello di attestato
+    """
+
+def parse_placeholders(testo):
+    """
+    Restituisce i nomi dei segnaposto presenti in un testo
+
+    Args:
+        testo (str): Testo da analizzare
+
+    Returns:
+        set: Nomi dei segnaposto
+
+    Raises:
+        TemplateError: Se le parentesi graffe non sono bilanciate
+    """
+    try:
+        return {
+            field.split('.')[0].split('[')[0]
+            for _, field, _, _ in Formatter().parse(testo) if field is not None
+        }
+    except ValueError as e:
+        raise TemplateError(f"Parentesi graffe non valide nel modello: {str(e)}")
+
+def _variants(testo, modello):
+    """
+    Precalcola il testo per ogni combinazione di campi opzionali vuoti
+
+    Returns:
+        dict: {(classe_concorso vuota, dipartimento vuoto): testo}
+    """
+    variants = {}
+    for senza_classe in (False, True):
+        for senza_dipartimento in (False, True):
+            variant = testo
+            # Rimuovi classe_concorso se vuoto
+            if senza_classe:
+                variant = variant.replace(CLASSE_CONCORSO_SEGMENT, "")
+            # Per le lezioni in presenza senza dipartimento indica solo l'aula
+            if modello == "presenza" and senza_dipartimento:
+                variant = variant.replace(DIPARTIMENTO_SEGMENT, DIPARTIMENTO_REPLACEMENT)
+            variants[(senza_classe, senza_dipartimento)] = variant
+    return variants
+
+class CompiledTemplate:
+    """
+    Modello di attestato analizzato una sola volta.
+
+    Il testo viene suddiviso in titolo, sottotitolo e corpo; i segnaposto sono
+    verificati in anticipo e le varianti per i campi opzionali vuoti sono
+    precalcolate, così ogni riga richiede una sola sostituzione.
+    """
+
+    def __init__(self, testo_modello, modello="presenza"):
+        self.modello = modello
+
+        linee = testo_modello.strip().split('\n')
+        if len(linee) < 2:
+            raise TemplateError("Il modello deve contenere almeno il titolo e il sottotitolo su due righe distinte")
+
+        self.placeholders = parse_placeholders(testo_modello)
+        if '' in self.placeholders:
+            raise TemplateError("Il modello contiene segnaposto senza nome: usare {nome_segnaposto}")
+        sconosciuti = self.placeholders - ALLOWED_PLACEHOLDERS
+        if sconosciuti:
+            raise TemplateError(
+                f"Segnaposto non riconosciuti nel modello: {', '.join('{' + p + '}' for p in sorted(sconosciuti))}. "
+                f"Segnaposto disponibili: {', '.join('{' + p + '}' for p in sorted(ALLOWED_PLACEHOLDERS))}"
+            )
+
+        self.titolo = linee[0]
+        self.sottotitolo = linee[1]
+        self.corpo = '\n'.join(linee[2:])
+        self.variants = _variants(self.corpo, modello)
+
+        # Righe del corpo senza dati della riga prima e dopo il blocco variabile
+        righe = self.corpo.split('\n')
+        variabili = [i for i, riga in enumerate(righe) if parse_placeholders(riga) & ROW_PLACEHOLDERS]
+        prima = variabili[0] if variabili else len(righe)
+        ultima = variabili[-1] if variabili else len(righe) - 1
+        self.ha_righe_variabili = bool(variabili)
+        self.righe_iniziali = righe[:prima]
+        self.righe_finali = righe[ultima + 1:]
+        self.middle_variants = _variants('\n'.join(righe[prima:ultima + 1]), modello)
+
+    @staticmethod
+    def variant_key(values):
+        """
+        Restituisce la chiave della variante da usare per i valori di una riga
+
+        Args:
+            values (dict): Valori dei segnaposto già normalizzati
+        """
+        return (not values['classe_concorso'], not values['dipartimento'])
+
+    def format(self, values, middle=False):
+        """
+        Sostituisce i valori nel corpo del modello
+
+        Args:
+            values (dict): Valori di tutti i segnaposto
+            middle (bool, optional): Se True formatta solo il blocco con i dati della riga. Default a False.
+
+        Returns:
+            str: Testo formattato
+        """
+        variants = self.middle_variants if middle else self.variants
+        return variants[self.variant_key(values)].format_map(values)
+
+@lru_cache(maxsize=32)
+def compile_template(testo_modello, modello="presenza"):
+    """
+    Compila un modello di attestato, riutilizzando i modelli già compilati
+
+    Args:
+        testo_modello (str): Testo del modello
+        modello (str, optional): Tipo di modello ('presenza', 'telematico', 'personalizzato'). Default a "presenza".
+
+    Returns:
+        CompiledTemplate: Modello compilato
+
+    Raises:
+        TemplateError: Se il modello contiene errori
+    """
+    return CompiledTemplate(testo_modello, modello)
+
+def check_template(testo_modello, modello="presenza"):
+    """
+    Verifica che un modello di attestato sia utilizzabile
+
+    Args:
+        testo_modello (str): Testo del modello
+        modello (str, optional): Tipo di modello. Default a "presenza".
+
+    Returns:
+        bool, str: (True, None) se il modello è valido, (False, error_message) altrimenti
+    """
+    try:
+        compile_template(testo_modello, modello)
+        return True, None
+    except TemplateError as e:
+        return False, str(e)
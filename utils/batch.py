@@ -0,0 +1,574 @@
+"""
+Motore dei lotti di attestati condiviso dall'app Streamlit e dalla riga di comando.
+
+Contiene la preparazione di ogni attestato (PDF ed email), la selezione delle righe
+valide di un file caricato e l'esecuzione di un lotto completo, con generazione
+parallela dei PDF o invio tramite l'outbox. Le funzioni non dipendono da Streamlit:
+i dati della sessione vengono passati come argomenti e l'avanzamento viene
+registrato in un Job (utils/job_runner.py).
+"""
+import io
+import os
+import tempfile
+import itertools
+
+import numpy as np
+
+import config
+from utils.excel_reader import read_excel_chunks, row_validity, format_validation_errors
+from utils.pdf_generator import (generate_pdf, generate_pdfs_batch, get_testo_modello, PdfRenderer,
+                                 StaticLayerPdfRenderer, pdf_file_name, save_pdf)
+from utils.email_sender import send_email
+from utils.email_address import is_valid_email
+from utils.pipeline import AttestatoPipeline, format_stage_report
+from utils.rate_limiter import AdaptiveRateLimiter
+from utils.retry_policy import RetryPolicy
+from utils.records import AttestatoRecord, dataframe_records
+from utils.outbox import delivery_fingerprint, LOOKUP_CHUNK
+from utils.sheet_history import SheetDiff
+
+# Importa error_logger se disponibile
+try:
+    from utils.error_logger import error_logger
+except ImportError:
+    error_logger = None
+
+# Funzione per creare una directory temporanea per i PDF
+def create_temp_dir():
+    temp_dir = os.path.join(tempfile.gettempdir(), "attestati_temp")
+    os.makedirs(temp_dir, exist_ok=True)
+    return temp_dir
+
+# Funzione per generare il PDF e preparare l'email di una riga
+def prepare_attestato(row, logo_path, firma_path, send_mail=True, renderer=None, keep_pdf=True,
+                      modello="presenza", output_dir=None):
+    """
+    Genera il PDF di un attestato e prepara l'email con cui inviarlo.
+    
+    Il PDF viene generato in memoria e allegato all'email senza passare dal disco;
+    viene salvato nella directory temporanea solo se keep_pdf è True o se l'email non viene inviata.
+    
+    Args:
+        row (AttestatoRecord | dict): Dati dell'attestato (un record o un dizionario con gli stessi campi)
+        logo_path (str): Percorso del logo
+        firma_path (str): Percorso della firma
+        send_mail (bool): Se True, prepara anche l'email con l'attestato
+        renderer (PdfRenderer, optional): Renderer condiviso dal lotto. Default a None.
+        keep_pdf (bool, optional): Se True salva anche una copia del PDF su disco. Default a True.
+        modello (str, optional): Modello dell'attestato, usato solo senza renderer. Default a "presenza".
+        output_dir (str, optional): Directory in cui salvare il PDF. Default alla directory temporanea.
+        
+    Returns:
+        bool, dict: (True, messaggio con i campi di send_email e 'pdf_path') se l'operazione ha successo, (False, error_message) altrimenti
+    """
+    try:
+        # I record del lotto vengono passati così come sono al generatore di PDF
+        pdf_data = row if isinstance(row, AttestatoRecord) else AttestatoRecord.from_mapping(row)
+        
+        # Genera il PDF in memoria con il modello selezionato
+        if renderer is not None:
+            pdf_bytes = renderer.render_bytes(pdf_data)
+        else:
+            pdf_bytes = generate_pdf(pdf_data, logo_path, firma_path, None, modello)
+        
+        if pdf_bytes is None:
+            error_msg = "Errore nella generazione del PDF"
+            if error_logger:
+                error_logger.log_error(error_msg, error_code="PDF-001")
+            return False, error_msg
+        
+        # Salva il PDF su disco solo se richiesto o se non viene inviato per email
+        file_name = pdf_file_name(pdf_data)
+        pdf_path = None
+        if keep_pdf or not send_mail:
+            pdf_path = save_pdf(pdf_bytes, file_name, output_dir or create_temp_dir())
+            if pdf_path is None:
+                error_msg = "Errore nel salvataggio del PDF"
+                if error_logger:
+                    error_logger.log_error(error_msg, error_code="PDF-003")
+                return False, error_msg
+        
+        message = {'pdf_path': pdf_path, 'attachment_name': file_name}
+        
+        # Prepara l'email se richiesto
+        if send_mail:
+            try:
+                # Determina il firmatario dell'email
+                if config.DOCENTE_CORSO:
+                    firmatario = f"Centro CAFIS\n{config.DIRETTORE_CAFIS}\nProf. {config.DOCENTE_CORSO}"
+                else:
+                    firmatario = f"Centro CAFIS\n{config.DIRETTORE_CAFIS}"
+                
+                # Formatta il corpo dell'email con tutti i segnaposto disponibili
+                email_body = config.EMAIL_BODY.format(
+                    nome_cognome=row['nome_cognome'],
+                    data=row['data'],
+                    firmatario=firmatario,
+                    universita=config.UNIVERSITA
+                )
+            except Exception as e:
+                error_msg = f"Errore nella formattazione dell'email: {str(e)}"
+                if error_logger:
+                    error_logger.log_error(error_msg, exception=e, error_code="EMAIL-002")
+                return False, error_msg
+            
+            message.update({
+                'recipient_email': row['email'],
+                'subject': config.EMAIL_SUBJECT,
+                'body': email_body,
+                'attachment_data': pdf_bytes
+            })
+        
+        return True, message
+    
+    except Exception as e:
+        error_msg = f"Errore nell'elaborazione dell'attestato: {str(e)}"
+        if error_logger:
+            error_logger.log_error(error_msg, exception=e, error_code="PROC-001")
+        return False, error_msg
+
+# Funzione per generare PDF e inviare email
+def process_attestato(row, logo_path, firma_path, send_mail=True, renderer=None, keep_pdf=True, sender=None):
+    """
+    Elabora un singolo attestato: genera il PDF e invia l'email se richiesto.
+    
+    Args:
+        row (AttestatoRecord | dict): Dati dell'attestato (un record o un dizionario con gli stessi campi)
+        logo_path (str): Percorso del logo
+        firma_path (str): Percorso della firma
+        send_mail (bool): Se True, invia l'email con l'attestato
+        renderer (PdfRenderer, optional): Renderer condiviso dal lotto. Default a None.
+        keep_pdf (bool, optional): Se True salva anche una copia del PDF su disco. Default a True.
+        sender (SmtpConnectionPool, optional): Pool di sessioni SMTP condiviso dal lotto. Default a None.
+        
+    Returns:
+        bool, str: (True, pdf_path o nome del file) se l'operazione ha successo, (False, error_message) altrimenti
+    """
+    success, message = prepare_attestato(row, logo_path, firma_path, send_mail, renderer, keep_pdf)
+    if not success:
+        return False, message
+    
+    # Invia l'email se richiesto, riutilizzando la sessione SMTP del lotto se disponibile
+    if send_mail:
+        send = sender.send_email if sender is not None else send_email
+        success, error = send(
+            message['recipient_email'],
+            message['subject'],
+            message['body'],
+            attachment_data=message['attachment_data'],
+            attachment_name=message['attachment_name']
+        )
+        if not success:
+            if error_logger:
+                error_logger.log_error(f"Errore invio email: {error}", error_code="EMAIL-001")
+            return False, error
+    
+    return True, message['pdf_path'] or message['attachment_name']
+
+def send_outbox_batch(outbox, batch_id, renderer, limiter, concurrency, keep_pdf=False, on_result=None, retry_policy=None,
+                      render_ahead=None, output_dir=None, on_skip=None, skip_delivered=True):
+    """
+    Invia i messaggi ancora da inviare di un lotto registrato nell'outbox.
+    
+    Validazione, generazione dei PDF, costruzione dei messaggi e invio procedono in parallelo
+    (AttestatoPipeline): i PDF vengono generati in anticipo sull'invio di al più render_ahead
+    messaggi. Lo stato di ogni messaggio viene aggiornato nell'outbox quando entra nella
+    finestra di invio e dopo l'invio, così un lotto interrotto può essere ripreso chiamando
+    di nuovo questa funzione. I messaggi il cui attestato risulta già consegnato nel registro
+    degli invii vengono saltati prima della generazione del PDF. Gli invii non riusciti per errori temporanei tornano in coda e
+    vengono ripetuti secondo la politica di ripetizione, senza fermare gli altri invii.
+    
+    Args:
+        outbox (EmailOutbox): Outbox degli invii
+        batch_id (int): Identificativo del lotto
+        renderer (PdfRenderer): Renderer degli attestati del lotto
+        limiter (AdaptiveRateLimiter): Limitatore della velocità di invio
+        concurrency (int): Numero di sessioni SMTP usate in parallelo
+        keep_pdf (bool, optional): Se True salva anche una copia dei PDF su disco. Default a False.
+        on_result (callable, optional): Funzione chiamata con (dati della riga, successo, errore) per ogni messaggio. Default a None.
+        retry_policy (RetryPolicy, optional): Politica di ripetizione degli errori temporanei. Default a una RetryPolicy con i valori di config.
+        render_ahead (int, optional): Messaggi generati in anticipo sull'invio. Default a config.PIPELINE_RENDER_AHEAD.
+        output_dir (str, optional): Directory delle copie dei PDF se keep_pdf è True. Default alla directory temporanea.
+        on_skip (callable, optional): Funzione chiamata con i dati della riga per ogni messaggio saltato. Default a None.
+        skip_delivered (bool, optional): Se False invia anche gli attestati già consegnati. Default a True.
+        
+    Returns:
+        dict: Utilizzo e tempi di ogni stadio della pipeline (vedi AttestatoPipeline.run)
+    """
+    if retry_policy is None:
+        retry_policy = RetryPolicy(config.SMTP_RETRY_ATTEMPTS, config.SMTP_RETRY_BASE_DELAY, config.SMTP_RETRY_MAX_DELAY)
+    righe = {}
+    
+    def esito(message_id, success, error, smtp_code=None):
+        if success:
+            outbox.mark_sent(message_id)
+        else:
+            if error_logger:
+                error_logger.log_error(f"Errore invio email: {error}", error_code="EMAIL-001", show_ui=False)
+            outbox.mark_failed(message_id, error, smtp_code)
+        if on_result:
+            on_result(righe.pop(message_id), success, error)
+    
+    def da_inviare():
+        for item in outbox.pending(batch_id):
+            # Attestato consegnato nel frattempo da un altro lotto (es. lotto avviato due volte)
+            if skip_delivered and item['fingerprint'] and outbox.is_delivered(item['fingerprint']):
+                outbox.mark_skipped(item['id'])
+                if on_skip:
+                    on_skip(item['row'])
+                continue
+            righe[item['id']] = item['row']
+            yield item
+    
+    def valida(item):
+        # Le righe dell'outbox sono già state validate al caricamento; l'indirizzo viene
+        # ricontrollato perché i lotti ripresi possono provenire da versioni precedenti
+        if not is_valid_email(item['row']['email']):
+            return f"Formato email non valido: {item['row']['email']}"
+        return None
+    
+    def genera(item):
+        success, message = prepare_attestato(item['row'], None, None, True, renderer, keep_pdf, output_dir=output_dir)
+        if success:
+            message['id'] = item['id']
+        return success, message
+    
+    def ripetizione(message_id, error, smtp_code, delay):
+        if error_logger:
+            error_logger.log_info(f"Errore temporaneo, nuovo tentativo tra {delay:.0f} secondi: {error}")
+        outbox.mark_retry(message_id, error, smtp_code)
+    
+    # Le sessioni SMTP autenticate vengono riutilizzate per tutto il lotto
+    pipeline = AttestatoPipeline(
+        genera, validate=valida, on_error=esito, on_send=lambda message: outbox.mark_sending(message['id']),
+        on_result=esito, on_retry=ripetizione, render_ahead=render_ahead, concurrency=concurrency,
+        limiter=limiter, retry_policy=retry_policy
+    )
+    stats = pipeline.run(da_inviare())
+    if error_logger:
+        error_logger.log_info(f"Lotto {batch_id} inviato in {pipeline.elapsed:.1f} s, utilizzo degli stadi: {format_stage_report(stats)}")
+    return stats
+
+def valid_rows(df, file_data, error_messages, limit=None, diff=None):
+    """
+    Restituisce le righe valide da elaborare, segnalando in error_messages quelle non valide
+    
+    Con un DataFrame già caricato la validità delle righe è già nota; senza DataFrame
+    il file viene letto a blocchi con read_excel_chunks e ogni riga viene restituita
+    appena il suo blocco è stato letto e validato.
+    
+    Args:
+        df (pd.DataFrame): DataFrame caricato, oppure None per leggere il file a blocchi
+        file_data (bytes): Contenuto del file Excel, usato solo se df è None
+        error_messages (list): Lista a cui aggiungere i messaggi delle righe non valide
+        limit (int, optional): Numero massimo di righe del file da elaborare. Default a None (tutte).
+        diff (SheetDiff, optional): Confronto con la versione già elaborata del file: le righe
+            invariate vengono scartate prima della validazione. Default a None (tutte le righe).
+        
+    Yields:
+        tuple: (indice della riga, AttestatoRecord)
+    """
+    if df is not None:
+        rows = df if limit is None else df.iloc[:limit]
+        validita = row_validity(rows)
+        indici = range(len(rows))
+        if diff is not None:
+            # Solo le righe nuove o modificate vengono convertite in record
+            nuove = diff.compare(rows)
+            indici = np.flatnonzero(nuove).tolist()
+            rows, validita = rows[nuove], validita[nuove]
+        # Le righe vengono convertite in record una sola volta, senza creare una pd.Series per riga
+        records = dataframe_records(rows)
+        for posizione, (i, error) in enumerate(zip(indici, validita)):
+            # Le righe non valide sono già note: nessun controllo da ripetere
+            if error is not None:
+                error_messages.append(f"Errore riga {i+1}: {error}")
+                if diff is not None:
+                    diff.discard(i)
+                continue
+            yield i, records[posizione]
+        return
+    
+    blocchi, error_message = read_excel_chunks(io.BytesIO(file_data))
+    if blocchi is None:
+        error_messages.append(error_message)
+        return
+    for chunk, errors in blocchi:
+        # Oltre a validate_row, scarta le righe con errori di validate_excel_frame (es. percorso non valido)
+        messaggi = dict(zip(errors['riga'].unique(), format_validation_errors(chunk, errors)))
+        validita = row_validity(chunk)
+        ultimo = limit is not None and len(chunk) > 0 and chunk.index[-1] >= limit - 1
+        if diff is not None:
+            # Solo le righe nuove o modificate (entro il limite) vengono convertite in record
+            if limit is not None:
+                chunk, validita = chunk[chunk.index < limit], validita[validita.index < limit]
+            nuove = diff.compare(chunk, chunk.index)
+            chunk, validita = chunk[nuove], validita[nuove]
+        records = dataframe_records(chunk)
+        for posizione, (i, error) in enumerate(validita.items()):
+            if limit is not None and i >= limit:
+                blocchi.close()
+                return
+            if error is not None:
+                error_messages.append(f"Errore riga {i+1}: {error}")
+            elif i in messaggi:
+                error_messages.append(messaggi[i])
+            else:
+                yield i, records[posizione]
+                continue
+            if diff is not None:
+                diff.discard(i)
+        if ultimo:
+            blocchi.close()
+            return
+
+def skip_delivered_rows(outbox, rows, modello, on_skip=None):
+    """
+    Scarta le righe il cui attestato risulta già consegnato o è ripetuto nello stesso lotto
+    
+    Le impronte vengono cercate nel registro degli invii a blocchi, con una sola
+    query per blocco; le righe ripetute vengono riconosciute con un insieme in memoria.
+    
+    Args:
+        outbox (EmailOutbox): Outbox con il registro degli invii
+        rows (iterable): Coppie (indice della riga, AttestatoRecord), come restituite da valid_rows
+        modello (str): Modello dell'attestato
+        on_skip (callable, optional): Funzione chiamata con (indice della riga, record) per ogni riga scartata. Default a None.
+        
+    Yields:
+        tuple: (indice della riga, AttestatoRecord) delle righe da inviare
+    """
+    rows = iter(rows)
+    visti = set()
+    for blocco in iter(lambda: list(itertools.islice(rows, LOOKUP_CHUNK)), []):
+        impronte = [delivery_fingerprint(record, modello) for _, record in blocco]
+        consegnati = outbox.delivered(impronte)
+        for (i, record), impronta in zip(blocco, impronte):
+            if impronta in consegnati or impronta in visti:
+                if on_skip:
+                    on_skip(i, record)
+                continue
+            visti.add(impronta)
+            yield i, record
+
+def righe_invariate(diff):
+    """
+    Descrive le righe non elaborate perché invariate, da aggiungere al messaggio di stato
+    """
+    if diff is None or not diff.unchanged:
+        return ""
+    return f", {diff.unchanged} righe invariate rispetto all'invio precedente del file"
+
+class JobErrors:
+    """
+    Lista degli errori di un lavoro, da passare a valid_rows: ogni riga non valida
+    viene registrata subito come esito non riuscito del lavoro
+    """
+
+    def __init__(self, job):
+        self.job = job
+
+    def append(self, message):
+        self.job.add_result(False, message)
+
+def registra_invio(job, limiter=None):
+    """
+    Restituisce la funzione on_result di send_outbox_batch che registra gli esiti nel lavoro
+
+    Args:
+        job (Job): Lavoro del lotto
+        limiter (AdaptiveRateLimiter, optional): Limitatore del lotto, per segnalare i rallentamenti. Default a None.
+    """
+    def esito(row, success, error):
+        if success:
+            job.add_result(True, f"Attestato per {row['nome_cognome']} generato con successo e inviato a {row['email']}")
+        else:
+            job.add_result(False, f"Errore per {row['nome_cognome']}: {error}")
+        if limiter is not None and limiter.rate < limiter.max_rate:
+            job.set_status(f"Il server ha segnalato un sovraccarico: velocità ridotta a {limiter.messages_per_minute:.0f} email al minuto")
+    return esito
+
+def run_generation_job(job, outbox, df, file_data, limit, send_mail, modello, logo_path, firma_path,
+                       file_name=None, emails_per_minute=None, concurrency=None, keep_pdf=False, output_dir=None,
+                       skip_delivered=True, history=None, only_changed=True, single_document=False):
+    """
+    Genera gli attestati di un file caricato e li invia per email, registrando l'avanzamento in un lavoro.
+    
+    Viene eseguita dal JobRunner fuori dallo script Streamlit, o direttamente dalla riga di comando:
+    tutti i dati della sessione (file, modello, immagini, opzioni di invio) vengono passati come argomenti.
+    
+    Args:
+        job (Job): Lavoro in cui registrare avanzamento ed esiti
+        outbox (EmailOutbox): Outbox degli invii
+        df (pd.DataFrame): DataFrame caricato, oppure None per leggere il file a blocchi
+        file_data (bytes): Contenuto del file Excel, usato solo se df è None
+        limit (int): Numero massimo di righe da elaborare, oppure None per tutte
+        send_mail (bool): Se True, invia gli attestati per email
+        modello (str): Modello dell'attestato
+        logo_path (str): Percorso del logo, oppure None
+        firma_path (str): Percorso della firma, oppure None
+        file_name (str, optional): Nome del file, usato come nome del lotto nell'outbox. Default a None.
+        emails_per_minute (int, optional): Velocità massima di invio. Default a config.EMAIL_RATE_PER_MINUTE.
+        concurrency (int, optional): Sessioni SMTP parallele. Default a config.SMTP_CONCURRENCY.
+        keep_pdf (bool, optional): Se True salva anche una copia dei PDF inviati. Default a False.
+        output_dir (str, optional): Directory dei PDF generati. Default alla directory temporanea.
+        skip_delivered (bool, optional): Se True salta le righe il cui attestato risulta già consegnato
+            o che ripetono una riga precedente dello stesso lotto. Default a True.
+        history (SheetHistory, optional): Impronte delle righe già inviate dei file; se indicato (insieme
+            a file_name) al termine dell'invio vengono conservate quelle delle righe inviate. Non viene
+            usato senza invio email, perché i PDF vengono comunque generati di nuovo. Default a None.
+        only_changed (bool, optional): Con history, invia solo le righe nuove o modificate rispetto
+            all'invio precedente dello stesso file; se False le invia tutte, conservando comunque le
+            impronte dell'invio precedente. Default a True.
+        single_document (bool, optional): Senza invio email, genera un unico PDF con un attestato
+            per pagina (StaticLayerPdfRenderer.render_document) invece di un file per riga. Default a False.
+        
+    Returns:
+        RetryPolicy | str: Politica di ripetizione con le statistiche dei tentativi; senza invio email
+            il percorso del PDF unico con single_document, altrimenti None
+    """
+    # Le righe non valide vengono registrate come esiti non riusciti appena lette
+    errori = JobErrors(job)
+    if not send_mail and single_document:
+        # Parte fissa e immagini compaiono una sola volta nel file e sono richiamate da ogni pagina
+        righe_pdf = [record for _, record in valid_rows(df, file_data, errori, limit)]
+        job.set_total(len(righe_pdf) + len(job.error_messages))
+        job.set_status(f"Generazione del PDF unico con {len(righe_pdf)} attestati...")
+        document_path = None
+        if righe_pdf:
+            document_name = f"attestati_{os.path.splitext(os.path.basename(file_name or 'lotto'))[0]}.pdf"
+            renderer = StaticLayerPdfRenderer(modello, logo_path, firma_path)
+            document_path = renderer.render_document(righe_pdf, os.path.join(output_dir or create_temp_dir(), document_name))
+        for record in righe_pdf:
+            if document_path:
+                job.add_result(True, f"Attestato per {record.nome_cognome} aggiunto al PDF unico")
+            else:
+                job.add_result(False, f"Errore per {record.nome_cognome}: Errore nella generazione del PDF")
+        job.set_status(None)
+        return document_path
+    
+    if not send_mail:
+        # Senza invio email i PDF vengono generati in parallelo su più processi
+        righe_pdf = []
+        
+        def dati_pdf():
+            # I record vengono passati direttamente ai processi di generazione
+            for _, record in valid_rows(df, file_data, errori, limit):
+                righe_pdf.append(record)
+                yield record
+        
+        if df is not None:
+            righe_da_generare = list(dati_pdf())
+            job.set_total(len(righe_pdf) + len(job.error_messages))
+            job.set_status(f"Generazione parallela di {len(righe_pdf)} attestati...")
+        else:
+            # Le righe vengono lette dal file mentre i primi attestati sono già in generazione
+            righe_da_generare = dati_pdf()
+            job.set_status("Generazione parallela degli attestati durante la lettura del file...")
+        
+        results = generate_pdfs_batch(
+            righe_da_generare, logo_path, firma_path, output_dir or create_temp_dir(), modello,
+            chunk_size=config.PDF_CHUNK_ROWS, timeout=config.PDF_TIMEOUT_SECONDS or None, ordered=False
+        )
+        errori_pdf = 0
+        for index, pdf_path in results:
+            nome_cognome = righe_pdf[index].nome_cognome
+            if pdf_path:
+                job.add_result(True, f"Attestato per {nome_cognome} generato con successo")
+            else:
+                errori_pdf += 1
+                job.add_result(False, f"Errore per {nome_cognome}: Errore nella generazione del PDF")
+            if df is None:
+                # In modalità a blocchi il totale cresce man mano che il file viene letto
+                job.set_total(len(righe_pdf) + len(job.error_messages) - errori_pdf)
+        job.set_total(job.done)
+        job.set_status(None)
+        return None
+    
+    # Stili, immagini e modello dell'attestato vengono preparati una sola volta per il lotto
+    testo_modello = get_testo_modello(modello)
+    renderer = PdfRenderer(modello, logo_path, firma_path, testo_modello)
+    emails_per_minute = emails_per_minute or config.EMAIL_RATE_PER_MINUTE
+    limiter = AdaptiveRateLimiter(emails_per_minute)
+    # Confronto con la versione del file inviata in precedenza. Senza invio email
+    # non viene usato: rigenerare i PDF di un file invariato non produrrebbe nulla
+    diff = None
+    if history is not None and file_name:
+        diff = SheetDiff(history.previous(file_name, modello, send_mail), only_changed)
+    
+    # Le righe non valide vengono segnalate subito, le altre registrate nell'outbox
+    # (in modalità a blocchi man mano che vengono lette dal file); quelle già consegnate
+    # in un lotto precedente non vengono registrate
+    righe = valid_rows(df, file_data, errori, limit, diff)
+    if skip_delivered:
+        righe = skip_delivered_rows(outbox, righe, modello, lambda i, record: job.add_skipped())
+    batch_id = outbox.create_batch(
+        ((i, record.to_dict()) for i, record in righe),
+        file_name, modello, logo_path, firma_path, testo_modello
+    )
+    # Il lotto è in lavorazione: non va proposto come interrotto
+    job.set_resource(batch_id)
+    da_inviare = outbox.counts(batch_id)['queued']
+    job.set_total(da_inviare + len(job.error_messages) + job.skipped)
+    if diff is not None:
+        job.set_unchanged(diff.unchanged)
+    if job.skipped:
+        job.set_status(f"Invio di {da_inviare} attestati (massimo {emails_per_minute} email al minuto), "
+                       f"{job.skipped} righe saltate perché già inviate{righe_invariate(diff)}...")
+    else:
+        job.set_status(f"Invio di {da_inviare} attestati (massimo {emails_per_minute} email al minuto)"
+                       f"{righe_invariate(diff)}...")
+    
+    retry_policy = RetryPolicy(config.SMTP_RETRY_ATTEMPTS, config.SMTP_RETRY_BASE_DELAY, config.SMTP_RETRY_MAX_DELAY)
+    stats = send_outbox_batch(outbox, batch_id, renderer, limiter, concurrency or config.SMTP_CONCURRENCY,
+                              keep_pdf, registra_invio(job, limiter), retry_policy, output_dir=output_dir,
+                              on_skip=lambda row: job.add_skipped(), skip_delivered=skip_delivered)
+    if diff is not None:
+        # Le righe non inviate verranno proposte di nuovo al prossimo caricamento del file
+        for item in outbox.pending(batch_id, include_failed=True):
+            diff.discard(item['row_index'])
+        history.save(file_name, modello, send_mail, diff.fingerprints())
+    job.set_status(f"Utilizzo degli stadi: {format_stage_report(stats)}")
+    return retry_policy
+
+def run_resume_job(job, outbox, lotto):
+    """
+    Riprende in background l'invio di un lotto interrotto registrato nell'outbox
+    
+    Args:
+        job (Job): Lavoro in cui registrare avanzamento ed esiti
+        outbox (EmailOutbox): Outbox degli invii
+        lotto (dict): Lotto restituito da EmailOutbox.incomplete_batches
+        
+    Returns:
+        RetryPolicy: Politica di ripetizione con le statistiche dei tentativi
+        
+    Raises:
+        ValueError: Se il lotto non ha conservato il testo del modello
+    """
+    # Gli attestati ancora da inviare usano il modello, il logo e la firma dell'avvio del lotto,
+    # non quelli configurati o caricati nel frattempo
+    batch = outbox.get_batch(lotto['id'])
+    if batch is None or batch['testo_modello'] is None:
+        raise ValueError("Il modello dell'attestato usato dal lotto non è disponibile: il lotto non può essere ripreso")
+    limiter = AdaptiveRateLimiter(config.EMAIL_RATE_PER_MINUTE)
+    job.set_total(lotto['da_inviare'])
+    job.set_status(f"Ripresa dell'invio di {lotto['da_inviare']} attestati...")
+    
+    with tempfile.TemporaryDirectory() as images_dir:
+        image_paths = {}
+        for nome in ('logo', 'firma'):
+            if batch[nome] is not None:
+                image_paths[nome] = os.path.join(images_dir, f"{nome}.png")
+                with open(image_paths[nome], 'wb') as f:
+                    f.write(batch[nome])
+        renderer = PdfRenderer(batch['modello'] or 'presenza', image_paths.get('logo'), image_paths.get('firma'),
+                               batch['testo_modello'])
+        
+        retry_policy = RetryPolicy(config.SMTP_RETRY_ATTEMPTS, config.SMTP_RETRY_BASE_DELAY, config.SMTP_RETRY_MAX_DELAY)
+        stats = send_outbox_batch(outbox, lotto['id'], renderer, limiter, config.SMTP_CONCURRENCY,
+                                  on_result=registra_invio(job, limiter), retry_policy=retry_policy,
+                                  on_skip=lambda row: job.add_skipped())
+    job.set_status(f"Utilizzo degli stadi: {format_stage_report(stats)}")
+    return retry_policy
+
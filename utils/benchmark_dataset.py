@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Script per misurare la memoria occupata dal dataset caricato in ogni sessione dell'app
+
+Simula più sessioni che caricano e tengono ciascuna il proprio dataset e misura
+l'aumento della memoria residente del processo (RSS) per 10.000 righe e per
+sessione con colonne object (come prima di pandas 3), con stringhe Arrow,
+con i campi ripetuti convertiti in categorie (compact_dataframe) e con i
+dataset scaricati su Parquet (SessionDataset.spill). Ogni modalità viene misurata
+in un processo separato.
+"""
+import os
+import io
+import gc
+import sys
+import ctypes
+import ctypes.util
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# Aggiungi la directory principale al path per permettere l'importazione dei moduli
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.excel_reader import normalize_excel_data, compact_dataframe, read_table
+from utils.session_dataset import SessionDataset
+from utils.benchmark_excel import build_dataframe
+from utils.benchmark_reader import _rss_mb
+
+MODALITA = ['object', 'arrow', 'categorie', 'parquet']
+
+def build_export(num_rows):
+    """
+    Crea il file CSV di un dataset normalizzato con orari e date validi, come dopo read_excel_file
+    """
+    df = build_dataframe(num_rows)
+    df['ora_inizio'] = '09:00'
+    df['ora_fine'] = '11:00'
+    return normalize_excel_data(df).to_csv(index=False).encode('utf-8')
+
+def _load(data, mode):
+    """
+    Legge il dataset come farebbe una sessione che carica il file
+    """
+    if mode == 'object':
+        # Colonne di oggetti Python, come le leggeva pandas prima della versione 3
+        return pd.read_csv(io.BytesIO(data), dtype=object)
+    df = read_table(io.BytesIO(data))
+    return df if mode == 'arrow' else compact_dataframe(df)
+
+def _release_memory():
+    """
+    Restituisce al sistema la memoria libera trattenuta da pyarrow e da malloc, così l'RSS
+    misura solo i dati ancora in uso
+    """
+    gc.collect()
+    try:
+        import pyarrow as pa
+        pa.default_memory_pool().release_unused()
+    except ImportError:
+        pass
+    try:
+        ctypes.CDLL(ctypes.util.find_library('c')).malloc_trim(0)
+    except (OSError, AttributeError, TypeError):
+        # malloc_trim esiste solo con la libreria C di GNU
+        pass
+
+def _measure(mode, num_rows, sessions, spill_dir):
+    """
+    Carica il dataset una volta per sessione nel processo di misura
+
+    Returns:
+        tuple: (aumento dell'RSS in MB, memoria di un dataset secondo pandas in MB)
+    """
+    data = build_export(num_rows)
+    frame_mb = _load(data, mode).memory_usage(deep=True).sum() / (1024 * 1024)
+
+    _release_memory()
+    baseline = _rss_mb()
+    datasets = []
+    for _ in range(sessions):
+        df = _load(data, mode)
+        if mode == 'parquet':
+            df = SessionDataset(df, spill_dir)
+            df.spill()
+        datasets.append(df)
+    _release_memory()
+    return _rss_mb() - baseline, frame_mb
+
+def measure(mode, num_rows, sessions, spill_dir):
+    """
+    Misura una modalità in un processo nuovo
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_measure, mode, num_rows, sessions, spill_dir).result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark della memoria del dataset di sessione")
+    parser.add_argument("--righe", type=int, default=50_000, help="Numero di righe del dataset")
+    parser.add_argument("--sessioni", type=int, default=10, help="Numero di sessioni simulate")
+    args = parser.parse_args()
+
+    scala = 10_000 / (args.righe * args.sessioni)
+    print(f"Dataset di {args.righe} righe in {args.sessioni} sessioni")
+    print(f"{'Modalità':<12} {'RSS totale':>11} {'RSS / 10k righe':>16} {'Risparmio':>10} {'DataFrame':>10}")
+    riferimento = None
+    with tempfile.TemporaryDirectory() as spill_dir:
+        for mode in MODALITA:
+            rss_mb, frame_mb = measure(mode, args.righe, args.sessioni, spill_dir)
+            per_10k = rss_mb * scala
+            riferimento = per_10k if riferimento is None else riferimento
+            print(f"{mode:<12} {rss_mb:9.1f}MB {per_10k:14.2f}MB {riferimento - per_10k:8.2f}MB {frame_mb:8.1f}MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Script per misurare le prestazioni dell'invio delle email su un server SMTP locale
+
+Richiede il pacchetto aiosmtpd (pip install aiosmtpd), usato solo per avviare
+un server SMTP di prova che accetta e scarta i messaggi. Con --attestati
+confronta anche la generazione seguita dall'invio di ogni attestato con la
+pipeline a stadi (AttestatoPipeline) e ne riporta l'utilizzo di ogni stadio.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+# Aggiungi la directory principale al path per permettere l'importazione dei moduli
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from utils.email_sender import send_email, SmtpConnectionPool
+from utils.email_dispatcher import dispatch_emails
+from utils.pipeline import AttestatoPipeline, format_stage_report
+from utils.pdf_generator import PdfRenderer
+from utils.benchmark_pdf import build_rows
+
+class SinkHandler:
+    """
+    Gestore aiosmtpd che accetta i messaggi simulando la latenza di rete
+    """
+
+    def __init__(self, latenza):
+        self.latenza = latenza
+        self.messaggi = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latenza)
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(self.latenza)
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latenza)
+        self.messaggi += 1
+        return '250 OK'
+
+def start_sink(port, latenza):
+    """
+    Avvia il server SMTP di prova e configura l'applicazione per usarlo
+
+    Returns:
+        tuple: (controller aiosmtpd, gestore)
+    """
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import AuthResult
+    except ImportError:
+        print("Per questo benchmark è necessario il pacchetto aiosmtpd: pip install aiosmtpd")
+        sys.exit(1)
+
+    handler = SinkHandler(latenza)
+    controller = Controller(
+        handler, hostname='127.0.0.1', port=port,
+        authenticator=lambda *args: AuthResult(success=True), auth_require_tls=False
+    )
+    controller.start()
+
+    config.SMTP_SERVER = '127.0.0.1'
+    config.SMTP_PORT = port
+    config.SMTP_USERNAME = 'benchmark'
+    config.SMTP_PASSWORD = 'benchmark'
+    config.SMTP_USE_TLS = False
+    return controller, handler
+
+def build_messages(num_messages):
+    """
+    Crea messaggi fittizi con un allegato di dimensione simile a un attestato
+    """
+    allegato = b'%PDF-1.4\n' + b'0' * 4000
+    return [
+        {
+            'id': i,
+            'recipient_email': f'partecipante{i}@example.com',
+            'subject': config.EMAIL_SUBJECT,
+            'body': f'Messaggio di prova {i}',
+            'attachment_data': allegato,
+            'attachment_name': f'attestato_{i}.pdf'
+        }
+        for i in range(num_messages)
+    ]
+
+def measure(label, func, num_messages):
+    """
+    Esegue una funzione e stampa il tempo totale e per messaggio
+    """
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<30} {elapsed:8.3f} s  ({elapsed / num_messages * 1000:.2f} ms/email)")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dell'invio delle email")
+    parser.add_argument("--email", type=int, default=100, help="Numero di email da inviare")
+    parser.add_argument("--latenza", type=float, default=20, help="Latenza simulata per comando SMTP in millisecondi")
+    parser.add_argument("--concorrenza", type=int, default=4, help="Sessioni SMTP parallele per l'invio asincrono")
+    parser.add_argument("--porta", type=int, default=8025, help="Porta del server SMTP di prova")
+    parser.add_argument("--attestati", action="store_true", help="Genera anche i PDF degli attestati da allegare")
+    parser.add_argument("--anticipo", type=int, default=config.PIPELINE_RENDER_AHEAD, help="Attestati generati in anticipo sull'invio")
+    args = parser.parse_args()
+
+    controller, handler = start_sink(args.porta, args.latenza / 1000)
+    messages = build_messages(args.email)
+    campi = ('recipient_email', 'subject', 'body')
+
+    def serial_send_email():
+        for message in messages:
+            send_email(*(message[c] for c in campi), attachment_data=message['attachment_data'],
+                       attachment_name=message['attachment_name'])
+
+    def serial_pool():
+        with SmtpConnectionPool() as pool:
+            for message in messages:
+                pool.send_email(*(message[c] for c in campi), attachment_data=message['attachment_data'],
+                                attachment_name=message['attachment_name'])
+
+    def async_dispatch():
+        results = dispatch_emails(messages, concurrency=args.concorrenza)
+        falliti = [r for r in results if not r[1]]
+        if falliti:
+            print(f"  {len(falliti)} invii falliti, es.: {falliti[0][2]}")
+
+    righe = [dict(row, email=f'partecipante{i}@example.com', id=i) for i, row in enumerate(build_rows(args.email))]
+
+    def messaggio_attestato(row):
+        return {
+            'id': row['id'],
+            'recipient_email': row['email'],
+            'subject': config.EMAIL_SUBJECT,
+            'body': f"Attestato di {row['nome_cognome']}",
+            'attachment_data': renderer.render_bytes(row),
+            'attachment_name': f"attestato_{row['id']}.pdf"
+        }
+
+    def genera_e_invia():
+        # Come prima della pipeline: ogni PDF viene generato quando il dispatcher chiede il messaggio
+        dispatch_emails((messaggio_attestato(row) for row in righe), concurrency=args.concorrenza)
+
+    def pipeline():
+        pipeline = AttestatoPipeline(lambda row: (True, messaggio_attestato(row)),
+                                     render_ahead=args.anticipo, concurrency=args.concorrenza)
+        stats = pipeline.run(righe)
+        print(f"  Utilizzo degli stadi: {format_stage_report(stats)}")
+
+    try:
+        if args.attestati:
+            renderer = PdfRenderer('presenza')
+            print(f"Generazione e invio di {args.email} attestati (latenza simulata {args.latenza:.0f} ms per comando)")
+            base = measure("Generazione poi invio", genera_e_invia, args.email)
+            pipeline_time = measure(f"Pipeline (anticipo {args.anticipo})", pipeline, args.email)
+            print(f"Speedup pipeline: {base / pipeline_time:.2f}x")
+            print(f"Messaggi ricevuti dal server di prova: {handler.messaggi}")
+            return
+
+        print(f"Invio di {args.email} email (latenza simulata {args.latenza:.0f} ms per comando)")
+        base = measure("send_email per messaggio", serial_send_email, args.email)
+        pool_time = measure("SmtpConnectionPool", serial_pool, args.email)
+        async_time = measure(f"Invio asincrono ({args.concorrenza} sessioni)", async_dispatch, args.email)
+        print(f"Speedup pool: {base / pool_time:.2f}x")
+        print(f"Speedup invio asincrono: {base / async_time:.2f}x")
+        print(f"Messaggi ricevuti dal server di prova: {handler.messaggi}")
+    finally:
+        controller.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Script per misurare il riconoscimento degli indirizzi email nelle celle dei file Excel
+
+Confronta extract_email/is_valid_email con le espressioni regolari usate in
+precedenza (riportate qui come riferimento) su celle reali e su celle lunghe
+costruite per far ripartire la ricerca da ogni posizione, e verifica che i
+risultati coincidano. La cache degli indirizzi già visti viene svuotata prima
+di ogni misura.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+# Aggiungi la directory principale al path per permettere l'importazione dei moduli
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.email_address import extract_email, is_valid_email, parse_email, EMAIL_PATTERN, STUDENT_EMAIL_PATTERN
+
+# Pattern usato in precedenza da validate_row
+VALIDAZIONE_PRECEDENTE = re.compile(EMAIL_PATTERN.pattern.join(['.*?', '.*']))
+
+def legacy_extract(testo):
+    """
+    Estrazione usata in precedenza dalla normalizzazione
+    """
+    testo = str(testo).strip()
+    match = STUDENT_EMAIL_PATTERN.search(testo) or EMAIL_PATTERN.search(testo)
+    return match.group(1) if match else None
+
+def legacy_is_valid(testo, pattern):
+    """
+    Validazione usata in precedenza da validate_row
+    """
+    testo = str(testo).strip()
+    return bool(('@' in testo and pattern.search(testo)) or STUDENT_EMAIL_PATTERN.search(testo))
+
+def celle_reali(num_celle):
+    """
+    Celle come quelle dei file reali, con molti indirizzi ripetuti
+    """
+    formati = [
+        'mario.rossi{i}@example.com', 'Mario Rossi <mario.rossi{i}@example.com>',
+        'mro.rossi{i}@stud.uniroma3.it', 'EMMANUEL LOSIO (Emm Losio emm.losio{i}@stud.uniroma3.it)',
+        ' Giulia Bianchi giu.bianchi{i}@stud.uniroma3.it ', 'non valida', '--'
+    ]
+    return [formati[i % len(formati)].format(i=i % (num_celle // 4 + 1)) for i in range(num_celle)]
+
+def celle_avverse(lunghezza):
+    """
+    Celle lunghe senza un indirizzo valido, o con l'indirizzo solo alla fine
+    """
+    return {
+        'Lettere senza @': 'a' * lunghezza,
+        'Parole e punti senza @': 'nome.cognome ' * (lunghezza // 13),
+        'Dominio senza estensione': 'x@' + 'a.' * (lunghezza // 2) + '1',
+        'Molte @': 'a@' * (lunghezza // 2),
+        'Indirizzo in fondo': 'Nome Cognome ' * (lunghezza // 13) + 'giu.rossi@stud.uniroma3.it',
+    }
+
+def measure(func, celle):
+    parse_email.cache_clear()
+    start = time.perf_counter()
+    result = [func(cella) for cella in celle]
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del riconoscimento degli indirizzi email")
+    parser.add_argument("--celle", type=int, default=100_000, help="Numero di celle reali")
+    parser.add_argument("--lunghezza", type=int, default=20_000, help="Lunghezza delle celle avverse")
+    args = parser.parse_args()
+
+    casi = {'Celle reali': celle_reali(args.celle)}
+    casi.update({nome: [cella] for nome, cella in celle_avverse(args.lunghezza).items()})
+
+    print(f"{'Caso':<26} {'Estrazione prec.':>16} {'Validazione prec.':>17} {'extract_email':>14} {'is_valid_email':>15}")
+    for nome, celle in casi.items():
+        t_legacy, attesi = measure(legacy_extract, celle)
+        t_validazione, validi_attesi = measure(lambda cella: legacy_is_valid(cella, VALIDAZIONE_PRECEDENTE), celle)
+        t_nuovo, estratti = measure(extract_email, celle)
+        t_validi, validi = measure(is_valid_email, celle)
+        assert estratti == attesi, nome
+        assert validi == validi_attesi, nome
+        print(f"{nome:<26} {t_legacy:15.4f}s {t_validazione:16.4f}s {t_nuovo:13.4f}s {t_validi:14.4f}s")
+    print("Risultati identici")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Script per misurare le prestazioni della normalizzazione dei dati letti dai file Excel
+
+Confronta normalize_excel_data con la precedente normalizzazione cella per cella
+(riportata qui come riferimento) e verifica che i risultati coincidano.
+"""
+import os
+import sys
+import time
+import argparse
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+# Aggiungi la directory principale al path per permettere l'importazione dei moduli
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import excel_reader
+from utils.excel_reader import normalize_excel_data, ORA_CON_SECONDI, ORA_CON_PUNTO, ORA_COMPATTA
+from utils.email_address import STUDENT_EMAIL_PATTERN, EMAIL_PATTERN
+
+def preprocess_value(val, campo):
+    """
+    Normalizzazione cella per cella usata in precedenza da read_excel_file
+    """
+    if pd.isna(val) or str(val).strip() == '--':
+        if campo in ['aula', 'dipartimento', 'indirizzo']:
+            return ""
+        return val
+
+    if campo == 'email':
+        val_str = str(val).strip()
+        student_email_match = STUDENT_EMAIL_PATTERN.search(val_str)
+        if student_email_match:
+            return student_email_match.group(1).strip()
+        email_match = EMAIL_PATTERN.search(val_str)
+        if email_match:
+            return email_match.group(1).strip()
+
+    if campo in ['ora_inizio', 'ora_fine']:
+        val_str = str(val).strip()
+        if ORA_CON_SECONDI.match(val_str):
+            return val_str[:5]
+        if ORA_CON_PUNTO.match(val_str):
+            return val_str.replace('.', ':')
+        if ORA_COMPATTA.match(val_str) and len(val_str) >= 3:
+            if len(val_str) == 3:
+                return f"0{val_str[0]}:{val_str[1:]}"
+            return f"{val_str[:2]}:{val_str[2:]}"
+
+    return val
+
+def legacy_normalize(df):
+    for col in df.columns:
+        df[col] = df[col].apply(lambda x: preprocess_value(x, col))
+    return df
+
+def build_dataframe(num_rows, seed=0):
+    """
+    Crea un DataFrame fittizio con i formati che si trovano nei file reali
+    """
+    rng = np.random.default_rng(seed)
+    orari = ['09:00', '9:00:00', '14.30', '945', '0945', '1100', dt.time(16, 0), '--', np.nan, '25:00']
+    email = [
+        'mario.rossi@example.com', 'Mario Rossi <mario.rossi@example.com>', 'mro.rossi@stud.uniroma3.it',
+        ' Giulia Bianchi giu.bianchi@stud.uniroma3.it ', 'non valida', '--', np.nan
+    ]
+    facoltativi = ['A1', 'Aula Magna', '--', ' -- ', np.nan]
+    n_studenti = max(1, num_rows // 4)
+
+    def scegli(valori):
+        return pd.Series(valori, dtype=object).iloc[rng.integers(0, len(valori), num_rows)].to_numpy()
+
+    return pd.DataFrame({
+        'nome_cognome': [f'Partecipante {i}' for i in range(num_rows)],
+        'data': scegli(['12/05/2025', '13/05/2025', '--']),
+        'ora_inizio': scegli(orari),
+        'ora_fine': scegli(orari),
+        'aula': scegli(facoltativi),
+        'dipartimento': scegli(['Scienze della Formazione', '--', np.nan]),
+        'indirizzo': scegli(['Via del Castro Pretorio 20', np.nan]),
+        'tipo_lezione': 'Didattica generale',
+        'tipo_percorso': scegli(['PeF60 CFU', 'PeF36 CFU']),
+        'classe_concorso': scegli(['A-01', '--']),
+        # Molti indirizzi distinti, come in un file reale
+        'email': [
+            f'stu{i % n_studenti}.rossi@stud.uniroma3.it' if i % 3 else email[i % len(email)]
+            for i in range(num_rows)
+        ]
+    })
+
+def measure(label, func, num_rows):
+    """
+    Esegue una funzione e stampa il tempo totale e per riga
+    """
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<30} {elapsed:8.3f} s  ({elapsed / num_rows * 1e6:.2f} µs/riga)")
+    return elapsed, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark della normalizzazione dei file Excel")
+    parser.add_argument("--righe", type=int, default=100_000, help="Numero di righe del DataFrame")
+    args = parser.parse_args()
+
+    # Il log delle conversioni scriverebbe una riga per cella nella versione cella per cella
+    excel_reader.error_logger = None
+    df = build_dataframe(args.righe)
+
+    print(f"Normalizzazione di {args.righe} righe")
+    legacy_time, expected = measure("Cella per cella (apply)", lambda: legacy_normalize(df.copy()), args.righe)
+    new_time, result = measure("normalize_excel_data", lambda: normalize_excel_data(df.copy()), args.righe)
+    pd.testing.assert_frame_equal(result, expected)
+    print("Risultati identici")
+    print(f"Speedup: {legacy_time / new_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
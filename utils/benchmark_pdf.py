@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Script per misurare le prestazioni della generazione dei PDF degli attestati
+
+Confronta PdfRenderer, StaticLayerPdfRenderer e il documento unico con la
+precedente implementazione di generate_pdf (riportata qui come riferimento).
+Ogni variante viene eseguita una volta a vuoto e poi misurata più volte; il
+rapporto con la versione precedente è calcolato sulla mediana delle ripetizioni.
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+import statistics
+from datetime import datetime
+
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from PIL import Image as PILImage
+
+# Aggiungi la directory principale al path per permettere l'importazione dei moduli
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from utils.pdf_generator import generate_pdf, PdfRenderer, StaticLayerPdfRenderer
+
+PERCORSI_COMPLETI = {
+    "PeF60 CFU": "PeF60 CFU (allegato 1 al DPCM 4 agosto 2023)",
+    "PeF30 CFU all.2": "PeF30 CFU all.2 (allegato 2 al DPCM 4 agosto 2023)",
+    "PeF36 CFU": "PeF36 CFU (allegato 5 al DPCM 4 agosto 2023)",
+    "PeF30 CFU (art. 13)": "PeF30 CFU all.2 (art. 13 del DPCM 4 agosto 2023)",
+    "PeF30 CFU all.2 art. 13": "PeF30 CFU all.2 (art. 13 del DPCM 4 agosto 2023)",
+    "PeF36 CFU all.5": "PeF36 CFU (allegato 5 al DPCM 4 agosto 2023)",
+    "PeF36 CFU (all.5)": "PeF36 CFU (allegato 5 al DPCM 4 agosto 2023)"
+}
+
+def _normalize_percorso(p):
+    p = str(p).strip()
+    p = p.replace("(", "").replace(")", "")
+    p = p.replace("all.", "allegato")
+    p = p.replace("art.", "articolo")
+    return p
+
+def legacy_generate_pdf(data, logo_path=None, firma_path=None, output_dir="output", modello="presenza"):
+    """
+    Generazione di un attestato usata in precedenza da generate_pdf: documento,
+    stili e immagini vengono preparati di nuovo per ogni riga
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    file_name = f"attestato_{data['nome_cognome'].replace(' ', '_')}_{data['data'].replace('/', '-')}.pdf"
+    file_path = os.path.join(output_dir, file_name)
+    doc = SimpleDocTemplate(file_path, pagesize=A4,
+                            rightMargin=2*cm, leftMargin=2*cm,
+                            topMargin=2*cm, bottomMargin=2*cm)
+    styles = getSampleStyleSheet()
+    title_style = styles['Title']
+    normal_style = styles['Normal']
+    content = []
+
+    if logo_path and os.path.exists(logo_path):
+        img_width, img_height = PILImage.open(logo_path).size
+        aspect_ratio = img_width / img_height
+        logo = Image(logo_path)
+        logo.drawHeight = 1.5*cm
+        logo.drawWidth = logo.drawHeight * aspect_ratio
+        if logo.drawWidth > 7*cm:
+            logo.drawWidth = 7*cm
+            logo.drawHeight = logo.drawWidth / aspect_ratio
+        content.append(logo)
+        content.append(Spacer(1, 0.5*cm))
+
+    if modello == "telematico":
+        testo_modello = config.ATTESTATO_TELEMATICO
+    elif modello == "personalizzato":
+        testo_modello = config.ATTESTATO_PERSONALIZZATO
+    else:
+        testo_modello = config.ATTESTATO_PRESENZA
+
+    percorso_selezionato = None
+    percorso_normalizzato = _normalize_percorso(data['tipo_percorso'])
+    for key, percorso in PERCORSI_COMPLETI.items():
+        if (key == data['tipo_percorso'] or
+                key in data['tipo_percorso'] or
+                _normalize_percorso(key) == percorso_normalizzato):
+            percorso_selezionato = percorso
+            break
+    if not percorso_selezionato:
+        percorso_selezionato = data['tipo_percorso']
+
+    linee_testo = testo_modello.strip().split('\n')
+    content.append(Paragraph(linee_testo[0], title_style))
+    content.append(Paragraph(linee_testo[1], normal_style))
+    content.append(Spacer(1, 0.5*cm))
+
+    data_rilascio = datetime.now().strftime("%d/%m/%Y")
+    classe_concorso = data.get('classe_concorso', '')
+    if classe_concorso == '--' or not classe_concorso.strip():
+        classe_concorso = ""
+    aula = data.get('aula', '')
+    dipartimento = data.get('dipartimento', '')
+    indirizzo = data.get('indirizzo', '')
+    if aula == '--' or not aula.strip():
+        aula = ""
+    if dipartimento == '--' or not dipartimento.strip():
+        dipartimento = ""
+    if indirizzo == '--' or not indirizzo.strip():
+        indirizzo = ""
+
+    template_text = '\n'.join(linee_testo[2:])
+    if not classe_concorso:
+        template_text = template_text.replace(" – {classe_concorso}", "")
+    if modello == "presenza" and not dipartimento:
+        template_text = template_text.replace("l'aula {aula} del dipartimento di {dipartimento}", "l'aula {aula}")
+
+    testo_formattato = template_text.format(
+        nome_cognome=data['nome_cognome'],
+        data=data['data'],
+        data_rilascio=data_rilascio,
+        ora_inizio=data['ora_inizio'],
+        ora_fine=data['ora_fine'],
+        aula=aula,
+        dipartimento=dipartimento,
+        indirizzo=indirizzo,
+        tipo_lezione=data['tipo_lezione'],
+        tipo_percorso=percorso_selezionato,
+        classe_concorso=classe_concorso,
+        universita=config.UNIVERSITA,
+        direttore_cafis=config.DIRETTORE_CAFIS
+    )
+    for paragrafo in testo_formattato.split('\n'):
+        if paragrafo.strip():
+            content.append(Paragraph(paragrafo, normal_style))
+        else:
+            content.append(Spacer(1, 0.5*cm))
+
+    if firma_path and os.path.exists(firma_path):
+        content.append(Spacer(1, 1*cm))
+        img_width, img_height = PILImage.open(firma_path).size
+        aspect_ratio = img_width / img_height
+        firma = Image(firma_path)
+        firma.drawHeight = min(2*cm, firma.drawHeight)
+        firma.drawWidth = firma.drawHeight * aspect_ratio
+        if firma.drawWidth > 5*cm:
+            firma.drawWidth = 5*cm
+            firma.drawHeight = firma.drawWidth / aspect_ratio
+        content.append(firma)
+
+    doc.build(content)
+    return file_path
+
+def build_rows(num_rows):
+    """
+    Crea righe fittizie per il benchmark
+    """
+    return [
+        {
+            'nome_cognome': f'Mario Rossi {i}',
+            'data': '12/05/2025',
+            'ora_inizio': '09:00',
+            'ora_fine': '11:00',
+            'aula': 'A1',
+            'dipartimento': 'Scienze della Formazione' if i % 2 else '--',
+            'indirizzo': 'Via del Castro Pretorio 20',
+            'tipo_lezione': 'Didattica generale',
+            'tipo_percorso': 'PeF60 CFU',
+            'classe_concorso': 'A-01' if i % 3 else '--'
+        }
+        for i in range(num_rows)
+    ]
+
+def measure(label, func, num_rows, ripetizioni):
+    """
+    Esegue una funzione una volta a vuoto e poi più volte, stampando il tempo
+    minimo e mediano per riga
+
+    Returns:
+        float: Tempo mediano in secondi
+    """
+    func()
+    tempi = []
+    for _ in range(ripetizioni):
+        start = time.perf_counter()
+        func()
+        tempi.append(time.perf_counter() - start)
+    mediana = statistics.median(tempi)
+    print(f"{label:<30} mediana {mediana / num_rows * 1000:6.2f} ms/riga  "
+          f"min {min(tempi) / num_rows * 1000:6.2f} ms/riga")
+    return mediana
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark della generazione PDF")
+    parser.add_argument("--righe", type=int, default=200, help="Numero di attestati da generare")
+    parser.add_argument("--ripetizioni", type=int, default=5, help="Numero di misurazioni per ogni variante")
+    parser.add_argument("--logo", help="Logo da usare al posto di assets/logo.png")
+    parser.add_argument("--firma", help="Firma da usare al posto di assets/firma.png")
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    logo_path = args.logo or os.path.join(base_dir, 'assets', 'logo.png')
+    firma_path = args.firma or os.path.join(base_dir, 'assets', 'firma.png')
+    rows = build_rows(args.righe)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        legacy_dir = os.path.join(output_dir, "precedente")
+        wrapper_dir = os.path.join(output_dir, "generate_pdf")
+        renderer_dir = os.path.join(output_dir, "renderer")
+        static_dir = os.path.join(output_dir, "static")
+        document_path = os.path.join(output_dir, "documento", "attestati.pdf")
+
+        def serial_legacy():
+            for data in rows:
+                legacy_generate_pdf(data, logo_path, firma_path, legacy_dir)
+
+        def serial_generate_pdf():
+            for data in rows:
+                generate_pdf(data, logo_path, firma_path, wrapper_dir)
+
+        def serial_renderer():
+            renderer = PdfRenderer("presenza", logo_path, firma_path)
+            for data in rows:
+                renderer.render(data, renderer_dir)
+
+        def serial_static_layer():
+            renderer = StaticLayerPdfRenderer("presenza", logo_path, firma_path)
+            for data in rows:
+                renderer.render(data, static_dir)
+
+        def static_layer_document():
+            renderer = StaticLayerPdfRenderer("presenza", logo_path, firma_path)
+            renderer.render_document(rows, document_path)
+
+        print(f"Generazione di {args.righe} attestati, {args.ripetizioni} ripetizioni dopo un'esecuzione a vuoto")
+        base = measure("generate_pdf precedente", serial_legacy, args.righe, args.ripetizioni)
+        risultati = [
+            ("generate_pdf attuale", measure("generate_pdf attuale", serial_generate_pdf, args.righe, args.ripetizioni)),
+            ("PdfRenderer riutilizzato", measure("PdfRenderer riutilizzato", serial_renderer, args.righe, args.ripetizioni)),
+            ("StaticLayerPdfRenderer", measure("StaticLayerPdfRenderer", serial_static_layer, args.righe, args.ripetizioni)),
+            ("Documento unico a livelli", measure("Documento unico a livelli", static_layer_document, args.righe, args.ripetizioni)),
+        ]
+
+        # Rapporto fra le mediane: sotto 1 la variante è più lenta della versione precedente
+        print("Rapporto con generate_pdf precedente (mediane):")
+        for label, tempo in risultati:
+            print(f"  {label:<28} {base / tempo:.2f}x")
+
+        # Dimensione media dei PDF prodotti
+        def average_size(directory):
+            sizes = [os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory) if f.endswith('.pdf')]
+            return sum(sizes) / max(len(sizes), 1)
+
+        print(f"Dimensione media PDF (precedente): {average_size(legacy_dir) / 1024:.1f} KB")
+        print(f"Dimensione media PDF (PdfRenderer): {average_size(renderer_dir) / 1024:.1f} KB")
+        print(f"Dimensione media PDF (StaticLayerPdfRenderer): {average_size(static_dir) / 1024:.1f} KB")
+        print(f"Dimensione per pagina (documento unico): {os.path.getsize(document_path) / args.righe / 1024:.1f} KB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Script per confrontare i motori di lettura dei file di presenze (Excel, CSV, Parquet)
+
+Per ogni formato misura il tempo di lettura e la memoria usata dal processo con
+la lettura predefinita di pandas (tutte le colonne, tipi dedotti) e con ogni
+motore di read_table (solo le colonne richieste, tipi espliciti). Ogni misura
+viene eseguita in un processo separato, così il picco di memoria di una lettura
+non influenza le altre.
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# Aggiungi la directory principale al path per permettere l'importazione dei moduli
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.excel_reader import READER_ENGINES, engine_available, read_table
+from utils.benchmark_excel import build_dataframe
+
+# Lettura predefinita di pandas per ogni formato, usata come riferimento
+LETTURA_PANDAS = {
+    'xlsx': pd.read_excel,
+    'csv': pd.read_csv,
+    'parquet': pd.read_parquet,
+}
+
+def build_export(num_rows):
+    """
+    Crea un'esportazione fittizia della segreteria: le colonne richieste più alcune colonne in più
+    """
+    df = build_dataframe(num_rows)
+    df['matricola'] = [f'{500000 + i}' for i in range(num_rows)]
+    df['codice_fiscale'] = 'RSSMRA80A01H501U'
+    df['anno_accademico'] = '2024/2025'
+    df['note'] = ''
+    return df.astype(str)
+
+def _rss_mb():
+    """
+    Memoria residente attuale del processo (Linux), oppure il picco da getrusage sugli altri sistemi
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        # ru_maxrss è in KB su Linux e in byte su macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+def _measure(path, formato, engine):
+    """
+    Esegue una lettura nel processo di misura, campionando la memoria durante la lettura
+
+    Returns:
+        tuple: (secondi, aumento massimo della memoria in MB, memoria del DataFrame in MB, colonne lette)
+    """
+    baseline = _rss_mb()
+    picco = [baseline]
+    finito = threading.Event()
+
+    def campiona():
+        while not finito.wait(0.005):
+            picco[0] = max(picco[0], _rss_mb())
+
+    sampler = threading.Thread(target=campiona, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    if engine is None:
+        df = LETTURA_PANDAS[formato](path)
+    else:
+        df = read_table(path, engine=engine)
+    elapsed = time.perf_counter() - start
+    finito.set()
+    sampler.join()
+    picco[0] = max(picco[0], _rss_mb())
+    frame_mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+    return elapsed, picco[0] - baseline, frame_mb, len(df.columns)
+
+def measure(path, formato, engine):
+    """
+    Misura una lettura in un processo nuovo
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_measure, path, formato, engine).result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dei motori di lettura dei file di presenze")
+    parser.add_argument("--righe", type=int, default=50_000, help="Numero di righe del file")
+    parser.add_argument("--formati", nargs='+', default=list(LETTURA_PANDAS), choices=list(LETTURA_PANDAS),
+                        help="Formati da misurare")
+    args = parser.parse_args()
+
+    df = build_export(args.righe)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print(f"Lettura di {args.righe} righe ({len(df.columns)} colonne)")
+        print(f"{'Formato':<9} {'Motore':<28} {'Tempo':>9} {'Picco RSS':>11} {'DataFrame':>11} {'Colonne':>8}")
+        for formato in args.formati:
+            path = os.path.join(temp_dir, f"presenze.{formato}")
+            if formato == 'xlsx':
+                df.to_excel(path, index=False)
+            elif formato == 'csv':
+                df.to_csv(path, index=False)
+            else:
+                df.to_parquet(path, index=False)
+
+            for engine in [None] + READER_ENGINES[formato]:
+                label = "pandas (tutte le colonne)" if engine is None else f"read_table ({engine})"
+                if engine is not None and not engine_available(engine):
+                    print(f"{formato:<9} {label:<28} {'non installato':>9}")
+                    continue
+                elapsed, rss_mb, frame_mb, colonne = measure(path, formato, engine)
+                print(f"{formato:<9} {label:<28} {elapsed:8.3f}s {rss_mb:9.1f}MB {frame_mb:9.1f}MB {colonne:>8}")
+
+if __name__ == "__main__":
+    main()
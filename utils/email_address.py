@@ -0,0 +1,103 @@
+"""
+Riconoscimento degli indirizzi email nel testo delle celle dei file Excel.
+
+Le celle contengono spesso l'indirizzo insieme ad altro testo, ad esempio
+"EMMANUEL LOSIO (Emm Losio emm.losio@stud.uniroma3.it)" o "Nome <email@example.com>".
+La ricerca con espressioni regolari del tipo [...]+@[...]+ riparte da ogni
+posizione del testo e su celle lunghe senza un indirizzo valido richiede un
+tempo quadratico. Qui il testo viene invece diviso una sola volta sui caratteri
+'@' e per ogni '@' si esaminano solo i caratteri adiacenti, con espressioni
+ancorate: il tempo è lineare nella lunghezza del testo. Il risultato è lo
+stesso della ricerca con EMAIL_PATTERN e STUDENT_EMAIL_PATTERN, che restano
+qui come definizione di riferimento del formato.
+"""
+import re
+from functools import lru_cache
+
+# Pattern specifico per email degli studenti di Roma Tre (mmm.mmmmmmm@stud.uniroma3.it)
+STUDENT_EMAIL_PATTERN = re.compile(r'([a-zA-ZàèéìòóùÀÈÉÌÒÓÙ]{2,3}\.[a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9_\-]+@stud\.uniroma3\.it)')
+# Pattern standard per altre email
+EMAIL_PATTERN = re.compile(r'([a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9._%+\-]+@[a-zA-Z0-9.\-]+\.[a-zA-Z]{2,})')
+
+# Parti dell'indirizzo, applicate sempre dall'inizio della stringa (senza ricerca).
+# Le parti che precedono la '@' vengono lette sul testo rovesciato.
+_LOCALE_ROVESCIATO = re.compile(r'[a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9._%+\-]+')
+_DOMINIO = re.compile(r'[a-zA-Z0-9.\-]+\.[a-zA-Z]{2,}')
+_MATRICOLA_ROVESCIATA = re.compile(r'[a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9_\-]+')
+_INIZIALI_ROVESCIATE = re.compile(r'[a-zA-ZàèéìòóùÀÈÉÌÒÓÙ]{2,3}')
+DOMINIO_STUDENTI = 'stud.uniroma3.it'
+
+def _student_email(prima, rovesciato):
+    """
+    Indirizzo degli studenti che termina con la '@' seguita da DOMINIO_STUDENTI, oppure None
+
+    Args:
+        prima (str): Testo che precede la '@' (fino alla '@' precedente)
+        rovesciato (str): Lo stesso testo rovesciato
+    """
+    matricola = _MATRICOLA_ROVESCIATA.match(rovesciato)
+    if matricola is None:
+        return None
+    punto = matricola.end()
+    if rovesciato[punto:punto + 1] != '.':
+        return None
+    iniziali = _INIZIALI_ROVESCIATE.match(rovesciato, punto + 1)
+    if iniziali is None:
+        return None
+    return f"{prima[len(prima) - iniziali.end():]}@{DOMINIO_STUDENTI}"
+
+@lru_cache(maxsize=1 << 16)
+def parse_email(testo):
+    """
+    Cerca un indirizzo email nel testo di una cella
+
+    Args:
+        testo (str): Testo della cella, già privo di spazi iniziali e finali
+
+    Returns:
+        tuple: (indirizzo degli studenti di Roma Tre, primo indirizzo valido); ciascuno è None se assente
+    """
+    parti = testo.split('@')
+    studente = None
+    standard = None
+    for i in range(len(parti) - 1):
+        prima, dopo = parti[i], parti[i + 1]
+        dominio = _DOMINIO.match(dopo) if standard is None else None
+        studente_possibile = studente is None and dopo.startswith(DOMINIO_STUDENTI)
+        if dominio is None and not studente_possibile:
+            continue
+        rovesciato = prima[::-1]
+        if dominio is not None:
+            locale = _LOCALE_ROVESCIATO.match(rovesciato)
+            if locale is not None:
+                standard = f"{prima[len(prima) - locale.end():]}@{dominio.group()}"
+        if studente_possibile:
+            studente = _student_email(prima, rovesciato)
+        if studente is not None:
+            break
+    return studente, standard
+
+def extract_email(testo):
+    """
+    Estrae l'indirizzo email da una cella, preferendo il formato degli studenti di Roma Tre
+
+    Args:
+        testo (str): Testo della cella
+
+    Returns:
+        str: Indirizzo trovato oppure None
+    """
+    studente, standard = parse_email(str(testo).strip())
+    return studente or standard
+
+def is_valid_email(testo):
+    """
+    Verifica che il testo di una cella contenga un indirizzo email riconoscibile
+
+    Args:
+        testo (str): Testo della cella
+
+    Returns:
+        bool: True se il testo contiene un indirizzo email
+    """
+    return extract_email(testo) is not None
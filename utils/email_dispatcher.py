@@ -0,0 +1,230 @@
+"""
+Invio concorrente delle email di un lotto basato su asyncio.
+
+Ogni messaggio viene inviato su una delle sessioni di uno SmtpConnectionPool;
+le operazioni SMTP, bloccanti, vengono eseguite su un pool di thread con al più
+`concurrency` sessioni attive contemporaneamente, mentre il ciclo asyncio tiene
+al più `max_in_flight` messaggi in lavorazione e restituisce i risultati man
+mano che arrivano. Con un AdaptiveRateLimiter i messaggi vengono avviati alla
+velocità consentita, rallentando quando il server segnala un sovraccarico.
+Con una RetryPolicy i messaggi non riusciti per un errore temporaneo vengono
+rimessi in coda e ripetuti dopo l'attesa prevista, mentre gli altri messaggi
+continuano a essere inviati.
+"""
+import asyncio
+import heapq
+import itertools
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.email_sender import SmtpConnectionPool, is_throttling_error, smtp_replies
+
+# Campi di un messaggio passati a SmtpConnectionPool.send_email
+MESSAGE_FIELDS = ('recipient_email', 'subject', 'body', 'attachment_path', 'attachment_data', 'attachment_name')
+
+class AsyncEmailDispatcher:
+    """
+    Invia le email di un lotto su più sessioni SMTP in parallelo.
+
+    I messaggi sono dizionari con la chiave 'id' e i campi di MESSAGE_FIELDS,
+    oppure con la chiave 'mime' e un messaggio già costruito con build_message;
+    ogni risultato è una tupla (id, successo, messaggio di errore o None,
+    codice di risposta SMTP o None).
+
+    Utilizzo:
+        dispatcher = AsyncEmailDispatcher(concurrency=4)
+        async for message_id, success, error, smtp_code in dispatcher.dispatch(messaggi):
+            ...
+    """
+
+    def __init__(self, concurrency=4, max_in_flight=None, pool=None, on_result=None, limiter=None,
+                 retry_policy=None, on_retry=None):
+        """
+        Args:
+            concurrency (int, optional): Numero di sessioni SMTP usate in parallelo. Default a 4.
+            max_in_flight (int, optional): Numero massimo di messaggi in lavorazione. Default al doppio di concurrency.
+            pool (SmtpConnectionPool, optional): Pool di sessioni da usare; se None ne viene creato uno per ogni dispatch. Default a None.
+            on_result (callable, optional): Funzione chiamata con (id, successo, errore, codice SMTP) per ogni messaggio. Default a None.
+            limiter (AdaptiveRateLimiter, optional): Limitatore della velocità di invio. Default a None (nessun limite).
+            retry_policy (RetryPolicy, optional): Politica di ripetizione degli errori temporanei. Default a None (nessuna ripetizione).
+            on_retry (callable, optional): Funzione chiamata con (id, errore, codice SMTP, secondi di attesa) quando un invio viene rimesso in coda. Default a None.
+        """
+        self.concurrency = max(1, concurrency)
+        self.max_in_flight = max(self.concurrency, max_in_flight or 2 * self.concurrency)
+        self.pool = pool
+        self.on_result = on_result
+        self.limiter = limiter
+        self.retry_policy = retry_policy
+        self.on_retry = on_retry
+
+    def _send(self, pool, message, attempt):
+        """
+        Invia un messaggio in un thread del pool, senza propagare eccezioni
+        """
+        try:
+            if 'mime' in message:
+                success, error, exception = pool.deliver_message(message['mime'])
+            else:
+                success, error, exception = pool.deliver(**{campo: message[campo] for campo in MESSAGE_FIELDS if campo in message})
+        except Exception as e:
+            success, error, exception = False, f"Errore nell'invio dell'email: {str(e)}", e
+        if self.limiter is not None:
+            self.limiter.report(throttled=exception is not None and is_throttling_error(exception))
+        return message, attempt, success, error, exception
+
+    def _collect(self, done, retries, ready_at):
+        """
+        Restituisce i risultati definitivi dei messaggi completati e rimette in coda
+        quelli da ripetere
+        """
+        results = []
+        for task in done:
+            message, attempt, success, error, exception = task.result()
+            replies = smtp_replies(exception) if exception is not None else []
+            smtp_code = replies[0][0] if replies else None
+            if self.retry_policy is not None:
+                if success:
+                    self.retry_policy.record_success(attempt)
+                else:
+                    delay = self.retry_policy.next_delay(exception, attempt)
+                    if delay is not None:
+                        heapq.heappush(retries, (ready_at + delay, next(self._sequence), message, attempt + 1))
+                        if self.on_retry:
+                            self.on_retry(message.get('id'), error, smtp_code, delay)
+                        continue
+            result = (message.get('id'), success, error, smtp_code)
+            if self.on_result:
+                self.on_result(*result)
+            results.append(result)
+        return results
+
+    def _token_wait(self):
+        """
+        Prende un token dal limitatore, se presente
+
+        Returns:
+            float: 0 se si può inviare subito, altrimenti i secondi da attendere
+        """
+        if self.limiter is None:
+            return 0.0
+        return self.limiter.try_acquire()
+
+    async def dispatch(self, messages):
+        """
+        Invia i messaggi e restituisce i risultati nell'ordine di completamento
+
+        I messaggi vengono letti dall'iterabile solo quando c'è posto nella finestra
+        di invio, quindi possono essere prodotti in modo pigro (es. da un generatore
+        che genera il PDF di ogni riga); la lettura avviene in un thread separato,
+        così un iterabile lento non blocca il ciclo asyncio. I messaggi da ripetere
+        hanno la precedenza sui nuovi appena è trascorsa la loro attesa.
+
+        Args:
+            messages (iterable): Messaggi da inviare
+
+        Yields:
+            tuple: (id, successo, messaggio di errore o None, codice SMTP o None)
+        """
+        loop = asyncio.get_running_loop()
+        pool = self.pool if self.pool is not None else SmtpConnectionPool(size=self.concurrency)
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="smtp")
+        # L'iterabile può bloccare (es. in attesa del PDF della riga successiva):
+        # viene letto in un thread dedicato per non fermare il ciclo asyncio
+        reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp-messaggi")
+        messages = iter(messages)
+        fine = object()
+        fetch = None      # Lettura in corso del prossimo messaggio
+        prossimo = None   # Messaggio letto in attesa di un token
+        exhausted = False
+        pending = set()
+        retries = []  # Heap di (istante di ripresa, progressivo, messaggio, tentativo)
+        self._sequence = itertools.count()
+        try:
+            while pending or retries or fetch is not None or prossimo is not None or not exhausted:
+                posto = len(pending) < self.max_in_flight
+                if posto and prossimo is None and fetch is None and not exhausted:
+                    fetch = loop.run_in_executor(reader, next, messages, fine)
+
+                # Avvia un messaggio se c'è posto nella finestra e il limitatore lo consente;
+                # il token viene preso solo quando c'è davvero un messaggio da inviare
+                timeout = None
+                token_wait = False
+                retry_ready = bool(retries) and retries[0][0] <= loop.time()
+                if posto and (retry_ready or prossimo is not None):
+                    timeout = self._token_wait()
+                    token_wait = timeout > 0
+                    if not token_wait:
+                        if retry_ready:
+                            _, _, message, attempt = heapq.heappop(retries)
+                        else:
+                            message, attempt, prossimo = prossimo, 1, None
+                        pending.add(loop.run_in_executor(
+                            executor, functools.partial(self._send, pool, message, attempt)
+                        ))
+                        continue
+                elif retries and not retry_ready:
+                    # Attendi al più fino al primo messaggio da ripetere
+                    timeout = retries[0][0] - loop.time()
+
+                # Attendi il primo risultato, il prossimo messaggio, il prossimo token
+                # o il prossimo messaggio da ripetere
+                started = loop.time()
+                waiting = pending | {fetch} if fetch is not None else pending
+                if waiting:
+                    done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    done = set()
+                    await asyncio.sleep(timeout)
+                if token_wait:
+                    self.limiter.record_wait(loop.time() - started)
+                if fetch is not None and fetch in done:
+                    done.discard(fetch)
+                    message, fetch = fetch.result(), None
+                    if message is fine:
+                        exhausted = True
+                    else:
+                        prossimo = message
+                pending -= done
+                for result in self._collect(done, retries, loop.time()):
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            # Una lettura ancora in corso termina da sola quando la sorgente si chiude
+            reader.shutdown(wait=False, cancel_futures=True)
+            if self.pool is None:
+                pool.close()
+
+    async def send_all(self, messages):
+        """
+        Invia tutti i messaggi e restituisce la lista dei risultati
+
+        Args:
+            messages (iterable): Messaggi da inviare
+
+        Returns:
+            list: Tuple (id, successo, messaggio di errore o None, codice SMTP o None) nell'ordine di completamento
+        """
+        return [result async for result in self.dispatch(messages)]
+
+def dispatch_emails(messages, concurrency=4, max_in_flight=None, pool=None, on_result=None, limiter=None,
+                    retry_policy=None, on_retry=None):
+    """
+    Invia i messaggi in parallelo da codice sincrono (es. dall'app Streamlit)
+
+    Args:
+        messages (iterable): Messaggi da inviare
+        concurrency (int, optional): Numero di sessioni SMTP usate in parallelo. Default a 4.
+        max_in_flight (int, optional): Numero massimo di messaggi in lavorazione. Default al doppio di concurrency.
+        pool (SmtpConnectionPool, optional): Pool di sessioni da usare. Default a None.
+        on_result (callable, optional): Funzione chiamata con (id, successo, errore, codice SMTP) per ogni messaggio. Default a None.
+        limiter (AdaptiveRateLimiter, optional): Limitatore della velocità di invio. Default a None.
+        retry_policy (RetryPolicy, optional): Politica di ripetizione degli errori temporanei. Default a None.
+        on_retry (callable, optional): Funzione chiamata con (id, errore, codice SMTP, secondi di attesa) per ogni ripetizione. Default a None.
+
+    Returns:
+        list: Tuple (id, successo, messaggio di errore o None, codice SMTP o None) nell'ordine di completamento
+    """
+    dispatcher = AsyncEmailDispatcher(concurrency, max_in_flight, pool, on_result, limiter, retry_policy, on_retry)
+    return asyncio.run(dispatcher.send_all(messages))
@@ -5,6 +5,7 @@ Mostra come appariranno le email ai destinatari, compresi gli indirizzi email ut
 import streamlit as st
 import config
 from datetime import datetime
+from utils.email_address import is_valid_email
 
 def show_email_preview():
     """
@@ -127,7 +128,7 @@ def show_email_preview():
     send_test = st.button("Invia email di test")
     
     if send_test:
-        if not email_test:
+        if not email_test or not is_valid_email(email_test):
             st.error("Inserisci un indirizzo email valido per il test")
         else:
             with st.spinner("Invio email di test in corso..."):
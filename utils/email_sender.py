@@ -9,6 +9,8 @@ from datetime import datetime
 import logging
 import socket
 import time
+import threading
+from utils.retry_policy import RetryPolicy
 
 # Prova ad importare il logger degli errori se disponibile
 try:
@@ -47,17 +49,109 @@ def check_smtp_connection(server, port, use_tls=True, timeout=5):
     except Exception as e:
         return False, f"Errore nella verifica della connessione SMTP: {str(e)}"
 
-def send_email(recipient_email, subject, body, attachment_path=None, retry_count=2, retry_delay=3):
+AUTH_ERROR_MESSAGE = "Errore di autenticazione: {}. Verifica che le credenziali siano corrette. Per Microsoft Outlook, utilizza una password per app."
+
+def build_message(recipient_email, subject, body, attachment_path=None, attachment_data=None, attachment_name=None):
+    """
+    Crea il messaggio email con un allegato opzionale
+    
+    Args:
+        recipient_email (str): Indirizzo email del destinatario
+        subject (str): Oggetto dell'email
+        body (str): Corpo dell'email
+        attachment_path (str, optional): Percorso del file da allegare. Default a None.
+        attachment_data (bytes | memoryview, optional): Contenuto dell'allegato in memoria. Default a None.
+        attachment_name (str, optional): Nome del file allegato quando si usa attachment_data. Default a "attestato.pdf".
+        
+    Returns:
+        MIMEMultipart: Messaggio pronto per l'invio
+    """
+    message = MIMEMultipart()
+    
+    # Usa l'indirizzo visibile (Reply-To) come campo From per i destinatari
+    visible_email = config.SMTP_REPLY_TO if hasattr(config, 'SMTP_REPLY_TO') and config.SMTP_REPLY_TO else config.SMTP_USERNAME
+    message["From"] = visible_email
+    message["To"] = recipient_email
+    message["Subject"] = subject
+    message["Date"] = datetime.now().strftime("%a, %d %b %Y %H:%M:%S %z")
+    
+    # Aggiungi il Reply-To header se configurato (per sicurezza, ma dovrebbe essere uguale al From)
+    if hasattr(config, 'SMTP_REPLY_TO') and config.SMTP_REPLY_TO:
+        message["Reply-To"] = config.SMTP_REPLY_TO
+    
+    # Aggiungi il corpo del messaggio
+    message.attach(MIMEText(body, "plain"))
+    
+    # Aggiungi l'allegato se presente, dalla memoria o dal disco
+    if attachment_data is not None:
+        attachment_name = attachment_name or "attestato.pdf"
+        part = MIMEApplication(attachment_data, Name=attachment_name)
+        part['Content-Disposition'] = f'attachment; filename="{attachment_name}"'
+        message.attach(part)
+    elif attachment_path and os.path.exists(attachment_path):
+        with open(attachment_path, "rb") as attachment:
+            part = MIMEApplication(attachment.read(), Name=os.path.basename(attachment_path))
+            part['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment_path)}"'
+            message.attach(part)
+    
+    return message
+
+def open_smtp_connection(timeout=None):
+    """
+    Apre una sessione SMTP autenticata con le impostazioni correnti
+    
+    Args:
+        timeout (int, optional): Timeout delle operazioni di rete in secondi. Default a None (nessun timeout).
+        
+    Returns:
+        smtplib.SMTP: Sessione pronta per l'invio
+        
+    Raises:
+        smtplib.SMTPException: Se la connessione o l'autenticazione non riescono
+    """
+    kwargs = {} if timeout is None else {'timeout': timeout}
+    
+    # Seleziona il metodo di connessione in base alla porta
+    if config.SMTP_PORT == 465:
+        # Per SSL/TLS diretto (come Libero)
+        context = ssl.create_default_context()
+        server = smtplib.SMTP_SSL(config.SMTP_SERVER, config.SMTP_PORT, context=context, **kwargs)
+    else:
+        # Per STARTTLS (come Gmail e Outlook)
+        server = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT, **kwargs)
+    
+    try:
+        if config.SMTP_PORT != 465:
+            server.ehlo()
+            if config.SMTP_USE_TLS:
+                server.starttls()
+                server.ehlo()
+        server.login(config.SMTP_USERNAME, config.SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+def send_email(recipient_email, subject, body, attachment_path=None, retry_count=2, retry_delay=3,
+               attachment_data=None, attachment_name=None):
     """
     Invia un'email con un allegato opzionale
     
+    L'allegato può essere indicato come file su disco (attachment_path) oppure
+    direttamente come contenuto in memoria (attachment_data), senza passare dal disco.
+    Gli errori temporanei (risposte 4xx, disconnessioni, timeout) vengono ripetuti
+    con attesa esponenziale secondo RetryPolicy; gli errori definitivi no.
+    Per inviare molte email è preferibile usare SmtpConnectionPool, che riutilizza la sessione.
+    
     Args:
         recipient_email (str): Indirizzo email del destinatario
         subject (str): Oggetto dell'email
         body (str): Corpo dell'email
         attachment_path (str, optional): Percorso del file da allegare. Default a None.
-        retry_count (int, optional): Numero di tentativi in caso di errore. Default a 2.
-        retry_delay (int, optional): Secondi di attesa tra i tentativi. Default a 3.
+        retry_count (int, optional): Numero di nuovi tentativi in caso di errore temporaneo. Default a 2.
+        retry_delay (int, optional): Secondi di attesa prima del primo nuovo tentativo. Default a 3.
+        attachment_data (bytes | memoryview, optional): Contenuto dell'allegato in memoria. Default a None.
+        attachment_name (str, optional): Nome del file allegato quando si usa attachment_data. Default a "attestato.pdf".
         
     Returns:
         bool, str: (True, None) se l'email è stata inviata con successo, (False, error_message) altrimenti
@@ -69,87 +163,337 @@ def send_email(recipient_email, subject, body, attachment_path=None, retry_count
             error_logger.log_error(error_msg, error_code="SMTP-001")
         return False, error_msg
     
-    try:
-        # Crea il messaggio email
-        message = MIMEMultipart()
-        
-        # Usa l'indirizzo visibile (Reply-To) come campo From per i destinatari
-        visible_email = config.SMTP_REPLY_TO if hasattr(config, 'SMTP_REPLY_TO') and config.SMTP_REPLY_TO else config.SMTP_USERNAME
-        message["From"] = visible_email
-        message["To"] = recipient_email
-        message["Subject"] = subject
-        message["Date"] = datetime.now().strftime("%a, %d %b %Y %H:%M:%S %z")
-        
-        # Aggiungi il Reply-To header se configurato (per sicurezza, ma dovrebbe essere uguale al From)
-        if hasattr(config, 'SMTP_REPLY_TO') and config.SMTP_REPLY_TO:
-            message["Reply-To"] = config.SMTP_REPLY_TO
-        
-        # Aggiungi il corpo del messaggio
-        message.attach(MIMEText(body, "plain"))
-        
-        # Aggiungi l'allegato se presente
-        if attachment_path and os.path.exists(attachment_path):
-            with open(attachment_path, "rb") as attachment:
-                part = MIMEApplication(attachment.read(), Name=os.path.basename(attachment_path))
-                part['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment_path)}"'
-                message.attach(part)
-        
-        # Seleziona il metodo di connessione in base alla porta
-        if config.SMTP_PORT == 465:
-            # Per SSL/TLS diretto (come Libero)
-            context = ssl.create_default_context()
-            with smtplib.SMTP_SSL(config.SMTP_SERVER, config.SMTP_PORT, context=context) as server:
-                try:
-                    server.login(config.SMTP_USERNAME, config.SMTP_PASSWORD)
-                    server.send_message(message)
-                except smtplib.SMTPAuthenticationError as e:
-                    print(f"Errore di autenticazione: {e}")
-                    return False, f"Errore di autenticazione: {e}. Verifica che le credenziali siano corrette. Per Microsoft Outlook, utilizza una password per app."
-        else:
-            # Per STARTTLS (come Gmail e Outlook)
-            with smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT) as server:
-                try:
-                    server.ehlo()
-                    if config.SMTP_USE_TLS:
-                        server.starttls()
-                        server.ehlo()
-                    server.login(config.SMTP_USERNAME, config.SMTP_PASSWORD)
-                    server.send_message(message)
-                except smtplib.SMTPAuthenticationError as e:
-                    print(f"Errore di autenticazione: {e}")
-                    return False, f"Errore di autenticazione: {e}. Verifica che le credenziali siano corrette. Per Microsoft Outlook, utilizza una password per app."
+    policy = RetryPolicy(max_attempts=retry_count + 1, base_delay=retry_delay)
+    attempt = 1
+    while True:
+        try:
+            # Crea il messaggio email e invialo su una nuova sessione
+            message = build_message(recipient_email, subject, body, attachment_path, attachment_data, attachment_name)
+            with open_smtp_connection() as server:
+                server.send_message(message)
             
-        if error_logger:
-            error_logger.log_info(f"Email inviata con successo a {recipient_email}")
-        return True, None
-        
-    except smtplib.SMTPConnectError as e:
-        error_msg = f"Errore di connessione al server SMTP: {str(e)}"
-        if error_logger:
-            error_logger.log_error(error_msg, exception=e, error_code="SMTP-002")
+            if error_logger:
+                error_logger.log_info(f"Email inviata con successo a {recipient_email}")
+            return True, None
         
-        # Prova a riconnettersi
-        if retry_count > 0:
+        except Exception as e:
+            error_msg = describe_smtp_error(e)
+            delay = policy.next_delay(e, attempt)
+            if delay is None:
+                return False, error_msg
             if error_logger:
-                error_logger.log_info(f"Tentativo di riconnessione tra {retry_delay} secondi...")
-            time.sleep(retry_delay)
-            return send_email(recipient_email, subject, body, attachment_path, retry_count-1, retry_delay+2)
-        return False, error_msg
+                error_logger.log_info(f"Nuovo tentativo di invio a {recipient_email} tra {delay:.1f} secondi...")
+            time.sleep(delay)
+            attempt += 1
+
+def describe_smtp_error(error):
+    """
+    Registra un errore di invio e restituisce il messaggio da mostrare all'utente
+    
+    Args:
+        error (Exception): Eccezione sollevata durante l'invio
         
-    except smtplib.SMTPServerDisconnected as e:
-        error_msg = f"Disconnesso dal server SMTP: {str(e)}"
-        if error_logger:
-            error_logger.log_error(error_msg, exception=e, error_code="SMTP-003")
-        return False, error_msg
+    Returns:
+        str: Messaggio di errore
+    """
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        print(f"Errore di autenticazione: {error}")
+        return AUTH_ERROR_MESSAGE.format(error)
+    
+    if isinstance(error, (smtplib.SMTPConnectError, ConnectionError, socket.timeout)):
+        error_msg, error_code = f"Errore di connessione al server SMTP: {str(error)}", "SMTP-002"
+    elif isinstance(error, smtplib.SMTPServerDisconnected):
+        error_msg, error_code = f"Disconnesso dal server SMTP: {str(error)}", "SMTP-003"
+    elif isinstance(error, smtplib.SMTPException):
+        error_msg, error_code = f"Errore SMTP: {str(error)}", "SMTP-004"
+    else:
+        error_msg, error_code = f"Errore nell'invio dell'email: {str(error)}", "SMTP-999"
+    
+    if error_logger:
+        error_logger.log_error(error_msg, exception=error, error_code=error_code)
+    return error_msg
+
+# Risposte con cui i provider segnalano un sovraccarico o un limite di invio temporaneo
+THROTTLING_CODES = frozenset({421, 451})
+THROTTLING_ENHANCED_PREFIX = "4.7."
+
+def smtp_replies(error):
+    """
+    Estrae le risposte del server (codice, testo) contenute in un'eccezione SMTP
+    
+    Args:
+        error (Exception): Eccezione sollevata durante l'invio
         
-    except smtplib.SMTPException as e:
-        error_msg = f"Errore SMTP: {str(e)}"
-        if error_logger:
-            error_logger.log_error(error_msg, exception=e, error_code="SMTP-004")
-        return False, error_msg
+    Returns:
+        list: Coppie (codice, testo); vuota se l'eccezione non contiene risposte del server
+    """
+    def testo(message):
+        return message.decode('utf-8', 'replace') if isinstance(message, bytes) else str(message)
+    
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return [(code, testo(message)) for code, message in error.recipients.values()]
+    if isinstance(error, smtplib.SMTPResponseException):
+        return [(error.smtp_code, testo(error.smtp_error))]
+    return []
+
+def is_throttling_error(error):
+    """
+    Indica se un errore di invio è una segnalazione di sovraccarico del server (421, 451 o 4.7.x)
+    
+    Args:
+        error (Exception): Eccezione sollevata durante l'invio
         
-    except Exception as e:
-        error_msg = f"Errore nell'invio dell'email: {str(e)}"
-        if error_logger:
-            error_logger.log_error(error_msg, exception=e, error_code="SMTP-999")
-        return False, error_msg
+    Returns:
+        bool: True se conviene rallentare l'invio
+    """
+    for code, message in smtp_replies(error):
+        if code in THROTTLING_CODES or message.lstrip().startswith(THROTTLING_ENHANCED_PREFIX):
+            return True
+    return False
+
+def _session_broken(error):
+    """
+    Indica se dopo un errore la sessione SMTP non è più utilizzabile
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: il server sta chiudendo la connessione
+        return error.smtp_code == 421
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    # Errori di rete (timeout, connessione interrotta) o interruzioni
+    return True
+
+class _PooledSession:
+    """
+    Sessione SMTP aperta con i contatori usati dal pool
+    """
+    
+    def __init__(self, server):
+        self.server = server
+        self.messages = 0
+        self.last_used = time.monotonic()
+    
+    def close(self):
+        """
+        Chiude la sessione ignorando gli errori del server
+        """
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+
+class SmtpConnectionPool:
+    """
+    Pool di sessioni SMTP autenticate riutilizzate per un intero lotto di email.
+    
+    Connessione, STARTTLS, EHLO e login vengono eseguiti una sola volta per sessione
+    invece che per ogni messaggio. Una sessione inattiva da più di noop_after secondi
+    viene verificata con NOOP prima dell'uso; se il server ha chiuso la connessione
+    durante l'invio la sessione viene riaperta e il messaggio reinviato una volta.
+    Dopo max_messages messaggi la sessione viene chiusa e riaperta, perché molti
+    provider limitano il numero di messaggi per connessione.
+    
+    Utilizzo:
+        with SmtpConnectionPool() as pool:
+            success, error = pool.send_email(destinatario, oggetto, corpo, attachment_data=pdf_bytes)
+    """
+    
+    def __init__(self, size=1, max_messages=None, noop_after=None, timeout=None):
+        """
+        Args:
+            size (int, optional): Numero massimo di sessioni aperte contemporaneamente. Default a 1.
+            max_messages (int, optional): Messaggi per sessione prima di riaprirla (0 = nessun limite). Default a config.SMTP_MESSAGES_PER_SESSION.
+            noop_after (int, optional): Secondi di inattività dopo cui verificare la sessione con NOOP. Default a config.SMTP_NOOP_AFTER_SECONDS.
+            timeout (int, optional): Timeout delle operazioni di rete in secondi. Default a config.SMTP_TIMEOUT.
+        """
+        self.size = max(1, size)
+        self.max_messages = config.SMTP_MESSAGES_PER_SESSION if max_messages is None else max_messages
+        self.noop_after = config.SMTP_NOOP_AFTER_SECONDS if noop_after is None else noop_after
+        self.timeout = config.SMTP_TIMEOUT if timeout is None else timeout
+        
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        # Contatori aggiornati sotto _lock, perché le sessioni vengono usate da più thread
+        # tempo_invio: secondi trascorsi in send_message, compresa l'attesa di una sessione libera
+        self.stats = {'connessioni': 0, 'riconnessioni': 0, 'sessioni_riciclate': 0, 'noop': 0, 'messaggi': 0, 'tempo_invio': 0.0}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _connect(self):
+        session = _PooledSession(open_smtp_connection(self.timeout))
+        with self._lock:
+            self.stats['connessioni'] += 1
+        return session
+    
+    def _is_alive(self, session):
+        """
+        Verifica con NOOP una sessione rimasta inattiva troppo a lungo
+        """
+        if time.monotonic() - session.last_used < self.noop_after:
+            return True
+        with self._lock:
+            self.stats['noop'] += 1
+        try:
+            code, _ = session.server.noop()
+            return code == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+    
+    def acquire(self):
+        """
+        Restituisce una sessione pronta per l'invio, aprendone una nuova se necessario
+        
+        Returns:
+            _PooledSession: Sessione da restituire con release()
+        """
+        self._slots.acquire()
+        try:
+            session = None
+            while session is None:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    session = self._idle.pop()
+                if not self._is_alive(session):
+                    session.close()
+                    session = None
+            return session or self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+    
+    def release(self, session, discard=False):
+        """
+        Restituisce una sessione al pool
+        
+        Args:
+            session (_PooledSession): Sessione ottenuta con acquire()
+            discard (bool, optional): Se True la sessione viene chiusa. Default a False.
+        """
+        try:
+            if not discard and self.max_messages and session.messages >= self.max_messages:
+                with self._lock:
+                    self.stats['sessioni_riciclate'] += 1
+                discard = True
+            if discard:
+                session.close()
+            else:
+                session.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(session)
+        finally:
+            self._slots.release()
+    
+    def send_message(self, message):
+        """
+        Invia un messaggio già costruito su una sessione del pool
+        
+        Args:
+            message (email.message.Message): Messaggio da inviare
+            
+        Raises:
+            smtplib.SMTPException, OSError: Se l'invio non riesce
+        """
+        start = time.perf_counter()
+        try:
+            self._send_message(message)
+        finally:
+            with self._lock:
+                self.stats['tempo_invio'] += time.perf_counter() - start
+    
+    def _send_message(self, message):
+        session = self.acquire()
+        try:
+            try:
+                session.server.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                # Il server ha chiuso la sessione (es. timeout di inattività): riconnetti e reinvia
+                session.close()
+                session = None
+                session = self._connect()
+                with self._lock:
+                    self.stats['riconnessioni'] += 1
+                session.server.send_message(message)
+        except BaseException as e:
+            if session is None:
+                self._slots.release()
+            else:
+                # Gli errori di protocollo (es. destinatario rifiutato) lasciano la sessione valida
+                self.release(session, discard=_session_broken(e))
+            raise
+        session.messages += 1
+        with self._lock:
+            self.stats['messaggi'] += 1
+        self.release(session)
+    
+    def deliver(self, recipient_email, subject, body, attachment_path=None, attachment_data=None, attachment_name=None):
+        """
+        Come send_email, ma restituisce anche l'eccezione che ha causato l'errore
+        
+        Returns:
+            bool, str, Exception: (True, None, None) se l'email è stata inviata, (False, error_message, eccezione o None) altrimenti
+        """
+        try:
+            message = build_message(recipient_email, subject, body, attachment_path, attachment_data, attachment_name)
+        except Exception as e:
+            return False, describe_smtp_error(e), e
+        return self.deliver_message(message)
+    
+    def deliver_message(self, message):
+        """
+        Invia un messaggio già costruito con build_message, restituendo anche l'eccezione che ha causato l'errore
+        
+        Args:
+            message (email.message.Message): Messaggio da inviare
+            
+        Returns:
+            bool, str, Exception: (True, None, None) se l'email è stata inviata, (False, error_message, eccezione o None) altrimenti
+        """
+        # Verifica che le credenziali SMTP siano configurate
+        if not config.SMTP_USERNAME or not config.SMTP_PASSWORD:
+            error_msg = "Credenziali SMTP non configurate"
+            if error_logger:
+                error_logger.log_error(error_msg, error_code="SMTP-001")
+            return False, error_msg, None
+        
+        try:
+            self.send_message(message)
+            if error_logger:
+                error_logger.log_info(f"Email inviata con successo a {message['To']}")
+            return True, None, None
+        except Exception as e:
+            return False, describe_smtp_error(e), e
+    
+    def send_email(self, recipient_email, subject, body, attachment_path=None, attachment_data=None, attachment_name=None):
+        """
+        Invia un'email con un allegato opzionale riutilizzando una sessione del pool
+        
+        Args:
+            recipient_email (str): Indirizzo email del destinatario
+            subject (str): Oggetto dell'email
+            body (str): Corpo dell'email
+            attachment_path (str, optional): Percorso del file da allegare. Default a None.
+            attachment_data (bytes | memoryview, optional): Contenuto dell'allegato in memoria. Default a None.
+            attachment_name (str, optional): Nome del file allegato quando si usa attachment_data. Default a "attestato.pdf".
+            
+        Returns:
+            bool, str: (True, None) se l'email è stata inviata con successo, (False, error_message) altrimenti
+        """
+        success, error_msg, _ = self.deliver(recipient_email, subject, body, attachment_path, attachment_data, attachment_name)
+        return success, error_msg
+    
+    def close(self):
+        """
+        Chiude tutte le sessioni inattive del pool
+        """
+        with self._lock:
+            sessions, self._idle = self._idle, []
+        for session in sessions:
+            session.close()
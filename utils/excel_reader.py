@@ -1,7 +1,18 @@
 import pandas as pd
+import numpy as np
 import os
+import io
 import re
-from datetime import datetime
+import csv
+import hashlib
+import itertools
+import threading
+import importlib.util
+from collections import OrderedDict
+from utils.percorsi import codice_percorso, CODICI_PERCORSO
+from utils.email_address import extract_email, is_valid_email
+from openpyxl import load_workbook
+import config
 
 # Importa error_logger se disponibile
 try:
@@ -9,27 +20,422 @@ try:
 except ImportError:
     error_logger = None
 
-def read_excel_file(file_path):
+# Colonne che il file Excel deve contenere
+COLONNE_RICHIESTE = [
+    'nome_cognome', 'data', 'ora_inizio', 'ora_fine',
+    'aula', 'dipartimento', 'indirizzo', 'tipo_lezione',
+    'tipo_percorso', 'classe_concorso', 'email'
+]
+
+# Campi opzionali in cui '--' e le celle vuote diventano stringhe vuote
+CAMPI_OPZIONALI_VUOTI = ['aula', 'dipartimento', 'indirizzo']
+CAMPI_ORA = ['ora_inizio', 'ora_fine']
+
+# Formati ora convertiti in HH:MM
+ORA_CON_SECONDI = re.compile(r'^([01]?[0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])$')
+ORA_CON_PUNTO = re.compile(r'^([01]?[0-9]|2[0-3])\.([0-5][0-9])$')
+ORA_COMPATTA = re.compile(r'^([01]?[0-9]|2[0-3])([0-5][0-9])$')
+
+def _map_unique_values(series, normalize):
+    """
+    Applica una normalizzazione una sola volta per ogni valore distinto di una colonna
+
+    Args:
+        series (pd.Series): Colonna da normalizzare
+        normalize (callable): Funzione che riceve i valori distinti non vuoti (pd.Series di tipo object)
+            e restituisce i valori normalizzati nello stesso ordine
+
+    Returns:
+        pd.Series: Colonna normalizzata; le celle vuote restano invariate
+    """
+    codes, uniques = pd.factorize(series)
+    if len(uniques) == 0:
+        return series
+    normalized = normalize(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    values = series.to_numpy(dtype=object, copy=True)
+    valid = codes >= 0
+    values[valid] = normalized[codes[valid]]
+    return pd.Series(values, index=series.index, name=series.name).infer_objects()
+
+def _normalize_email_values(values):
+    """
+    Estrae l'indirizzo email da ogni valore, preferendo il formato degli studenti di Roma Tre
+    """
+    email = values.map(extract_email)
+    return values.where(email.isna(), email)
+
+def _normalize_ora_values(values):
+    """
+    Converte in HH:MM i formati HH:MM:SS, HH.MM, HMM e HHMM
+    """
+    testo = values.astype(str).str.strip()
+    result = values.copy()
+    
+    # Rimuovi i secondi dal formato HH:MM:SS
+    con_secondi = testo.str.match(ORA_CON_SECONDI)
+    if con_secondi.any():
+        result[con_secondi] = testo[con_secondi].str[:5]
+        if error_logger:
+            for val_str in testo[con_secondi]:
+                error_logger.log_info(f"Formato ora con secondi convertito: da {val_str} a {val_str[:5]}")
+    
+    # Converti formato HH.MM in HH:MM
+    con_punto = testo.str.match(ORA_CON_PUNTO)
+    result[con_punto] = testo[con_punto].str.replace('.', ':', regex=False)
+    
+    # Converti formato HMM (es: 945) e HHMM (es: 0945) in HH:MM
+    compatta = testo.str.match(ORA_COMPATTA)
+    tre_cifre = compatta & (testo.str.len() == 3)
+    quattro_cifre = compatta & ~tre_cifre
+    result[tre_cifre] = '0' + testo[tre_cifre].str[0] + ':' + testo[tre_cifre].str[1:]
+    result[quattro_cifre] = testo[quattro_cifre].str[:2] + ':' + testo[quattro_cifre].str[2:]
+    return result
+
+def normalize_excel_data(df):
+    """
+    Normalizza i valori del file Excel: '--' e celle vuote nei campi opzionali,
+    indirizzi email in formato 'Nome <email>' e orari nei formati HH:MM:SS, HH.MM e HHMM
+    
+    Solo le colonne interessate vengono elaborate e ogni valore distinto viene
+    normalizzato una sola volta con le operazioni .str di pandas, poi riportato
+    su tutte le righe in cui compare.
+    
+    Args:
+        df (pd.DataFrame): DataFrame letto dal file Excel
+        
+    Returns:
+        pd.DataFrame: DataFrame normalizzato
+    """
+    for col in CAMPI_OPZIONALI_VUOTI:
+        if col in df.columns:
+            codes, uniques = pd.factorize(df[col])
+            trattini = np.flatnonzero(pd.Series(uniques, dtype=object).astype(str).str.strip() == '--')
+            vuoti = (codes < 0) | np.isin(codes, trattini)
+            if vuoti.any():
+                df[col] = df[col].astype(object).where(~vuoti, "").infer_objects()
+    
+    if 'email' in df.columns:
+        df['email'] = _map_unique_values(df['email'], _normalize_email_values)
+    
+    for col in CAMPI_ORA:
+        if col in df.columns:
+            df[col] = _map_unique_values(df[col], _normalize_ora_values)
+    
+    return df
+
+def _formatta_date(df):
+    """
+    Converte la colonna 'data' nel formato italiano GG/MM/AAAA, sul posto
+    """
+    if 'data' in df.columns:
+        try:
+            # Prova prima con il parametro dayfirst=True per il formato italiano
+            df['data'] = pd.to_datetime(df['data'], dayfirst=True).dt.strftime('%d/%m/%Y')
+        except Exception as e:
+            # Se fallisce, prova ad usare il formato mixed che è più flessibile
+            try:
+                df['data'] = pd.to_datetime(df['data'], format='mixed').dt.strftime('%d/%m/%Y')
+            except Exception as e:
+                # Se anche questo fallisce, mantieni i dati originali come stringhe
+                error_msg = f"Attenzione: impossibile convertire le date. Verranno utilizzate come stringhe. Errore: {e}"
+                if error_logger:
+                    error_logger.log_error(error_msg, exception=e, error_code="EXCEL-002")
+                print(error_msg)
+                # Assicurati che la colonna data sia di tipo stringa
+                df['data'] = df['data'].astype(str)
+
+# Campi che in un file di presenze ripetono pochi valori su molte righe
+CAMPI_RIPETUTI = [
+    'data', 'ora_inizio', 'ora_fine', 'aula', 'dipartimento', 'indirizzo',
+    'tipo_lezione', 'tipo_percorso', 'classe_concorso'
+]
+
+def compact_dataframe(df, max_ratio=0.5):
+    """
+    Converte in categorie i campi che ripetono pochi valori, per ridurre la memoria occupata
+
+    Ogni valore distinto viene conservato una sola volta e le righe contengono solo
+    un codice intero; nome_cognome ed email, quasi sempre diversi per ogni riga,
+    restano stringhe (su Arrow con pandas 3 e pyarrow installato).
+
+    Args:
+        df (pd.DataFrame): DataFrame normalizzato
+        max_ratio (float, optional): Rapporto massimo tra valori distinti e righe per convertire
+            una colonna. Default a 0.5.
+
+    Returns:
+        pd.DataFrame: DataFrame con le stesse righe e gli stessi valori
+    """
+    categorie = {
+        col: 'category' for col in CAMPI_RIPETUTI
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype)
+        and df[col].nunique(dropna=False) <= max_ratio * len(df)
+    }
+    return df.astype(categorie) if categorie else df
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """
+    Calcola l'impronta SHA-256 del contenuto di un file
+
+    Un file già aperto viene letto dall'inizio e riportato poi alla posizione di partenza.
+
+    Args:
+        file_path (str | file-like): Percorso del file o file già aperto in modalità binaria
+        chunk_size (int, optional): Byte letti a ogni passo. Default a 1 MiB.
+
+    Returns:
+        str: Impronta esadecimale
+    """
+    digest = hashlib.sha256()
+    if hasattr(file_path, 'read'):
+        posizione = file_path.tell()
+        file_path.seek(0)
+        for chunk in iter(lambda: file_path.read(chunk_size), b''):
+            digest.update(chunk)
+        file_path.seek(posizione)
+        return digest.hexdigest()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Motori di lettura per formato, in ordine di preferenza: viene usato il primo installato
+READER_ENGINES = {
+    'xlsx': ['calamine', 'openpyxl'],
+    'xls': ['calamine', 'xlrd'],
+    'csv': ['pyarrow', 'c'],
+    'parquet': ['pyarrow'],
+}
+# Modulo richiesto da ogni motore (None se incluso in pandas)
+_ENGINE_MODULES = {'calamine': 'python_calamine', 'openpyxl': 'openpyxl', 'xlrd': 'xlrd', 'pyarrow': 'pyarrow', 'c': None}
+
+# Tipi delle colonne lette: data e orari dei file Excel restano come nelle celle
+# (date e orari veri oppure testo), gli altri campi sono sempre testo
+CAMPI_TESTO = [col for col in COLONNE_RICHIESTE if col not in ['data'] + CAMPI_ORA]
+DTYPE_EXCEL = {col: ('str' if col in CAMPI_TESTO else 'object') for col in COLONNE_RICHIESTE}
+
+def engine_available(engine):
+    """
+    Verifica se il modulo richiesto da un motore di lettura è installato
+    """
+    module = _ENGINE_MODULES[engine]
+    return module is None or importlib.util.find_spec(module) is not None
+
+def _peek(file_path, size):
+    """
+    Legge i primi byte di un file (percorso o file già aperto) senza spostarne la posizione
+    """
+    if hasattr(file_path, 'read'):
+        posizione = file_path.tell()
+        data = file_path.read(size)
+        file_path.seek(posizione)
+        return data
+    with open(file_path, 'rb') as f:
+        return f.read(size)
+
+def detect_file_format(file_path):
     """
-    Legge un file Excel e restituisce un DataFrame pandas
+    Riconosce il formato di un file dalla firma nei primi byte, indipendentemente dall'estensione
+
+    Args:
+        file_path (str | file-like): Percorso del file o file già aperto
+
+    Returns:
+        str: 'xlsx' (archivio ZIP), 'xls' (documento OLE2), 'parquet' oppure 'csv' per ogni altro file
+    """
+    firma = _peek(file_path, 8)
+    if firma.startswith(b'PK\x03\x04'):
+        return 'xlsx'
+    if firma.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'xls'
+    if firma.startswith(b'PAR1'):
+        return 'parquet'
+    return 'csv'
+
+def _csv_header(file_path):
+    """
+    Restituisce le colonne e il separatore (',', ';' o tabulazione) di un file CSV dalla prima riga
+    """
+    prima_riga = _peek(file_path, 64 * 1024).decode('utf-8-sig', errors='replace').splitlines()[:1]
+    prima_riga = prima_riga[0] if prima_riga else ''
+    separatore = max([',', ';', '\t'], key=prima_riga.count)
+    return next(csv.reader([prima_riga], delimiter=separatore), []), separatore
+
+def _read_csv(file_path, engine):
+    colonne, separatore = _csv_header(file_path)
+    usecols = [col for col in colonne if col in COLONNE_RICHIESTE]
+    if engine == 'pyarrow':
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        table = pa_csv.read_csv(
+            file_path,
+            parse_options=pa_csv.ParseOptions(delimiter=separatore),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=usecols,
+                column_types={col: pa.string() for col in usecols},
+                strings_can_be_null=True
+            )
+        )
+        return table.to_pandas()
+    return pd.read_csv(file_path, sep=separatore, usecols=usecols, dtype='str', encoding='utf-8-sig')
+
+def _read_parquet(file_path):
+    import pyarrow.parquet as pa_parquet
+    colonne = pa_parquet.read_schema(file_path).names
+    if hasattr(file_path, 'seek'):
+        file_path.seek(0)
+    df = pa_parquet.read_table(file_path, columns=[col for col in colonne if col in COLONNE_RICHIESTE]).to_pandas()
+    # I tipi salvati nel file vengono ricondotti a quelli delle altre sorgenti
+    return df.astype({col: 'str' for col in CAMPI_TESTO if col in df.columns})
+
+def read_table(file_path, engine=None):
+    """
+    Legge le colonne richieste di un file Excel, CSV o Parquet con il motore più veloce disponibile
+
+    Il formato viene riconosciuto dalla firma del file; vengono lette solo le colonne
+    di COLONNE_RICHIESTE presenti nel file, con i campi di testo come stringhe.
+
+    Args:
+        file_path (str | file-like): Percorso del file o file già aperto
+        engine (str, optional): Motore da usare tra quelli di READER_ENGINES per il formato del file.
+            Default a None (il primo disponibile).
+
+    Returns:
+        pd.DataFrame: Dati del file
+    """
+    formato = detect_file_format(file_path)
+    if engine is None:
+        engine = next((e for e in READER_ENGINES[formato] if engine_available(e)), None)
+        if engine is None:
+            raise ValueError(f"Nessun motore disponibile per i file {formato}: installare uno tra {', '.join(READER_ENGINES[formato])}")
+    elif engine not in READER_ENGINES[formato]:
+        raise ValueError(f"Motore '{engine}' non supportato per i file {formato}")
+
+    if formato == 'csv':
+        return _read_csv(file_path, engine)
+    if formato == 'parquet':
+        return _read_parquet(file_path)
+    return pd.read_excel(file_path, engine=engine, usecols=lambda col: col in COLONNE_RICHIESTE, dtype=DTYPE_EXCEL)
+
+class ParsedUploadCache:
+    """
+    Cache LRU dei file Excel già letti e validati, per impronta SHA-256 del contenuto.
+    
+    È condivisa da tutte le sessioni dell'app: lo stesso file caricato di nuovo,
+    anche da un altro utente, non viene riletto. I DataFrame restituiti sono
+    condivisi e vanno trattati in sola lettura. La cache è limitata sia nel numero
+    di file sia nella memoria occupata dai DataFrame.
+    """
+    
+    def __init__(self, max_bytes, max_entries=16):
+        """
+        Args:
+            max_bytes (int): Memoria massima occupata dai DataFrame in cache
+            max_entries (int, optional): Numero massimo di file in cache. Default a 16.
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self._entries = OrderedDict()  # impronta -> (df, messaggio di errore, byte occupati)
+        self._lock = threading.Lock()
+        self.stats = {'riutilizzi': 0, 'letture': 0, 'rimossi': 0}
+    
+    def get(self, key):
+        """
+        Restituisce il risultato della lettura di un file, se presente
+        
+        Returns:
+            tuple: (DataFrame o None, messaggio di errore o None), oppure None se il file non è in cache
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.stats['riutilizzi'] += 1
+            return entry[0], entry[1]
+    
+    def put(self, key, df, error_message):
+        """
+        Memorizza il risultato della lettura di un file, rimuovendo i meno usati di recente se necessario
+        """
+        size = int(df.memory_usage(deep=True).sum()) if df is not None else 0
+        with self._lock:
+            self.stats['letture'] += 1
+            if size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            self._entries[key] = (df, error_message, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, _, removed_size) = self._entries.popitem(last=False)
+                self.size -= removed_size
+                self.stats['rimossi'] += 1
+    
+    def discard(self, key, df=None):
+        """
+        Rimuove un file dalla cache (es. quando la sessione che lo usa lo scarica su disco)
+        
+        Args:
+            key (str): Impronta SHA-256 del file
+            df (pd.DataFrame, optional): Se indicato, il file viene rimosso solo se in cache c'è proprio questo DataFrame. Default a None.
+            
+        Returns:
+            bool: True se il file è stato rimosso
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (df is not None and entry[0] is not df):
+                return False
+            del self._entries[key]
+            self.size -= entry[2]
+            self.stats['rimossi'] += 1
+            return True
+
+# Cache dei file caricati, condivisa da tutte le sessioni
+upload_cache = ParsedUploadCache(config.UPLOAD_CACHE_MB * 1024 * 1024)
+
+def read_excel_upload(data, cache=None):
+    """
+    Legge un file Excel caricato dall'utente, riutilizzando il risultato se lo stesso contenuto è già stato letto
+    
+    Args:
+        data (bytes): Contenuto del file
+        cache (ParsedUploadCache, optional): Cache da usare. Default a upload_cache.
+        
+    Returns:
+        pd.DataFrame, str: Come read_excel_file
+    """
+    cache = upload_cache if cache is None else cache
+    key = hashlib.sha256(data).hexdigest()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    
+    df, error_message = read_excel_file(io.BytesIO(data), sha256=key)
+    cache.put(key, df, error_message)
+    return df, error_message
+
+def read_excel_file(file_path, sha256=None):
+    """
+    Legge un file Excel (o CSV/Parquet) e restituisce un DataFrame pandas
+    
+    Il formato e il motore di lettura vengono scelti con read_table.
     
     Args:
-        file_path (str): Percorso del file Excel
+        file_path (str | file-like): Percorso del file o file già aperto
+        sha256 (str, optional): Impronta SHA-256 del contenuto, se già nota. Default a None (calcolata dal file).
         
     Returns:
         pd.DataFrame: DataFrame contenente i dati del file Excel
     """
     try:
-        df = pd.read_excel(file_path)
+        df = read_table(file_path)
         
         # Verifica che le colonne necessarie siano presenti
-        required_columns = [
-            'nome_cognome', 'data', 'ora_inizio', 'ora_fine',
-            'aula', 'dipartimento', 'indirizzo', 'tipo_lezione',
-            'tipo_percorso', 'classe_concorso', 'email'
-        ]
-        
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in COLONNE_RICHIESTE if col not in df.columns]
         
         if missing_columns:
             error_msg = f"Colonne mancanti nel file Excel: {', '.join(missing_columns)}"
@@ -37,107 +443,16 @@ def read_excel_file(file_path):
                 error_logger.log_error(error_msg, error_code="EXCEL-001")
             return None, error_msg
             
-        # Pre-elaborazione: gestione dei valori speciali come '--'
-        # Sostituisci '--' con valori appropriati per i campi opzionali
-        def preprocess_value(val, campo):
-            if pd.isna(val) or str(val).strip() == '--':
-                if campo in ['aula', 'dipartimento', 'indirizzo']:
-                    return ""  # Campi opzionali possono essere vuoti
-                return val     # Per altri campi, mantieni il valore originale
-                
-            # Normalizzazione email
-            if campo == 'email':
-                val_str = str(val).strip()
-                
-                # Pattern specifico per email degli studenti di Roma Tre (mmm.mmmmmmm@stud.uniroma3.it)
-                student_email_match = re.search(r'([a-zA-ZàèéìòóùÀÈÉÌÒÓÙ]{2,3}\.[a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9_\-]+@stud\.uniroma3\.it)', val_str)
-                if student_email_match:
-                    return student_email_match.group(1).strip()
-                
-                # Pattern standard per altre email
-                email_match = re.search(r'([a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9._%+\-]+@[a-zA-Z0-9.\-]+\.[a-zA-Z]{2,})', val_str)
-                if email_match:
-                    return email_match.group(1).strip()  # Restituisce solo l'indirizzo email e rimuove eventuali spazi
-            
-            # Normalizzazione formato ora
-            if campo in ['ora_inizio', 'ora_fine']:
-                val_str = str(val).strip()
-                
-                # Rimuovi i secondi dal formato HH:MM:SS
-                if re.match(r'^([01]?[0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])$', val_str):
-                    # Print log message for conversion
-                    if error_logger:
-                        error_logger.log_info(f"Formato ora con secondi convertito: da {val_str} a {val_str[:5]}")
-                    return val_str[:5]  # Prendi solo HH:MM
-                
-                # Converti formato HH.MM in HH:MM
-                if re.match(r'^([01]?[0-9]|2[0-3])\.([0-5][0-9])$', val_str):
-                    return val_str.replace('.', ':')
-                
-                # Converti formato HHMM in HH:MM
-                if re.match(r'^([01]?[0-9]|2[0-3])([0-5][0-9])$', val_str) and len(val_str) >= 3:
-                    if len(val_str) == 3:  # Formato HMM (es: 945)
-                        return f"0{val_str[0]}:{val_str[1:]}"
-                    else:  # Formato HHMM (es: 0945)
-                        return f"{val_str[:2]}:{val_str[2:]}"
-            
-            return val
-            
-        # Applica il pre-processamento a tutte le celle del DataFrame
-        for col in df.columns:
-            df[col] = df[col].apply(lambda x: preprocess_value(x, col))
+        # Pre-elaborazione: valori '--', indirizzi email e formati ora
+        df = normalize_excel_data(df)
             
         # Formatta la data (supporta formato italiano GG/MM/AAAA)
-        if 'data' in df.columns:
-            try:
-                # Prova prima con il parametro dayfirst=True per il formato italiano
-                df['data'] = pd.to_datetime(df['data'], dayfirst=True).dt.strftime('%d/%m/%Y')
-            except Exception as e:
-                # Se fallisce, prova ad usare il formato mixed che è più flessibile
-                try:
-                    df['data'] = pd.to_datetime(df['data'], format='mixed').dt.strftime('%d/%m/%Y')
-                except Exception as e:
-                    # Se anche questo fallisce, mantieni i dati originali come stringhe
-                    error_msg = f"Attenzione: impossibile convertire le date. Verranno utilizzate come stringhe. Errore: {e}"
-                    if error_logger:
-                        error_logger.log_error(error_msg, exception=e, error_code="EXCEL-002")
-                    print(error_msg)
-                    # Assicurati che la colonna data sia di tipo stringa
-                    df['data'] = df['data'].astype(str)
-            
-        # Verifica che i percorsi formativi siano validi
-        valid_percorsi = [
-            'PeF60 CFU',
-            'PeF30 CFU',
-            'PeF30 CFU all.2', 
-            'PeF36 CFU', 
-            'PeF30 CFU (art. 13)', 
-            'PeF30 CFU all.2 art. 13',  # Variante senza parentesi
-            'PeF36 CFU all.5',    # Variante con allegato 5 in formato abbreviato
-            'PeF36 CFU (all.5)',   # Variante con parentesi
-            # Varianti senza "CFU" che vengono utilizzate nell'app
-            'PeF 60',
-            'PeF 30 all.2',
-            'PeF 36',
-            'PeF 30 art. 13'
-        ]
-        
-        # Normalizza i percorsi per gestire le varianti di scrittura
-        def normalize_percorso(p):
-            p = str(p).strip()
-            p = p.replace("(", "").replace(")", "")  # Rimuovi parentesi
-            p = p.replace("all.", "allegato")        # Standardizza abbreviazioni
-            p = p.replace("art.", "articolo")        # Standardizza abbreviazioni
-            return p
+        _formatta_date(df)
             
-        # Crea una versione normalizzata dei percorsi validi
-        normalized_valid = [normalize_percorso(p) for p in valid_percorsi]
-        
-        # Trova i percorsi non validi confrontando versioni normalizzate
-        invalid_percorsi = []
-        for percorso in df['tipo_percorso'].unique():
-            if normalize_percorso(percorso) not in normalized_valid and percorso not in valid_percorsi:
-                invalid_percorsi.append(percorso)
+        # Verifica che i percorsi formativi siano validi: ogni grafia distinta
+        # viene cercata una sola volta nel registro dei percorsi
+        codici = {percorso: codice_percorso(percorso) for percorso in df['tipo_percorso'].unique()}
+        invalid_percorsi = [percorso for percorso, codice in codici.items() if codice is None]
         
         if len(invalid_percorsi) > 0:
             error_msg = f"Percorsi formativi non validi: {', '.join(str(p) for p in invalid_percorsi)}"
@@ -145,17 +460,27 @@ def read_excel_file(file_path):
                 error_logger.log_error(error_msg, error_code="EXCEL-003")
             return None, error_msg
         
+        # Memorizza il codice canonico del percorso, così il generatore di PDF non deve cercarlo di nuovo
+        df['codice_percorso'] = pd.Categorical(df['tipo_percorso'].map(codici), categories=CODICI_PERCORSO)
+        
+        # I campi che ripetono pochi valori (aula, dipartimento, ...) vengono conservati come categorie
+        df = compact_dataframe(df)
+        
+        # L'impronta del file identifica il dataset: la validità delle righe viene calcolata una sola volta
+        df.attrs['sha256'] = sha256 or file_sha256(file_path)
+        
         # Esegui una validazione avanzata dei dati
-        validation_errors = validate_excel_data(df)
-        if validation_errors:
-            # Limita il numero di errori mostrati nel messaggio
+        validation_errors = validate_excel_frame(df)
+        if not validation_errors.empty:
+            # Limita il numero di errori mostrati nel messaggio: i messaggi vengono prodotti solo per questi
             max_errors_to_show = 5
-            error_examples = "\n- " + "\n- ".join(validation_errors[:max_errors_to_show])
+            righe_con_errori = validation_errors['riga'].nunique()
+            error_examples = "\n- " + "\n- ".join(format_validation_errors(df, validation_errors, max_errors_to_show))
             
-            if len(validation_errors) > max_errors_to_show:
-                error_examples += f"\n... e altri {len(validation_errors) - max_errors_to_show} errori."
+            if righe_con_errori > max_errors_to_show:
+                error_examples += f"\n... e altri {righe_con_errori - max_errors_to_show} errori."
             
-            error_msg = f"Il file contiene {len(validation_errors)} righe con errori di validazione. Esempi:{error_examples}"
+            error_msg = f"Il file contiene {righe_con_errori} righe con errori di validazione. Esempi:{error_examples}"
             
             # Aggiungi suggerimenti per i valori '--' e formati ora
             error_msg += "\n\nSuggerimenti:" 
@@ -163,9 +488,12 @@ def read_excel_file(file_path):
             error_msg += "\n- I formati ora supportati sono: HH:MM, HH:MM:SS (i secondi vengono rimossi), HH.MM e HHMM."
             
             if error_logger:
-                error_logger.log_error(f"Errori di validazione nel file Excel: {len(validation_errors)} righe con problemi", error_code="EXCEL-004")
+                error_logger.log_error(f"Errori di validazione nel file Excel: {righe_con_errori} righe con problemi", error_code="EXCEL-004")
             
             return None, error_msg
+        
+        # Calcola subito la validità delle singole righe, riutilizzata durante la generazione
+        row_validity(df)
             
         return df, None
         
@@ -174,7 +502,136 @@ def read_excel_file(file_path):
         if error_logger:
             error_logger.log_error(error_msg, exception=e, error_code="EXCEL-999")
         return None, error_msg
-        
+
+def read_excel_chunks(file_path, chunk_size=None):
+    """
+    Legge un file Excel a blocchi di righe, senza caricarlo interamente in memoria
+
+    Il foglio viene letto in sola lettura con openpyxl: ogni blocco viene
+    normalizzato e validato appena letto, così la generazione degli attestati può
+    iniziare prima che il file sia stato letto per intero. L'intestazione viene
+    verificata subito; gli errori di validazione non scartano il file ma vengono
+    restituiti blocco per blocco, con l'indice delle righe riferito all'intero foglio.
+    Le righe completamente vuote vengono saltate.
+
+    Utilizzo:
+        blocchi, error_message = read_excel_chunks(percorso)
+        for chunk, errors in blocchi:
+            ...
+
+    Args:
+        file_path (str | file-like): Percorso del file Excel (.xlsx) o file già aperto
+        chunk_size (int, optional): Righe per blocco. Default a config.EXCEL_CHUNK_ROWS.
+
+    Returns:
+        generator, str: Generatore di coppie (DataFrame del blocco, errori di validate_excel_frame)
+            e None, oppure None e il messaggio di errore
+    """
+    chunk_size = max(1, int(chunk_size or config.EXCEL_CHUNK_ROWS))
+    foglio, error_message = _open_excel_sheet(file_path)
+    if foglio is None:
+        return None, error_message
+    return _iter_excel_chunks(*foglio, chunk_size), None
+
+def check_excel_header(file_path):
+    """
+    Verifica solo l'intestazione di un file Excel, senza leggerne le righe
+
+    Da usare prima di una lettura a blocchi rimandata (es. durante la generazione):
+    il file viene chiuso subito dopo il controllo.
+
+    Args:
+        file_path (str | file-like): Percorso del file Excel (.xlsx) o file già aperto
+
+    Returns:
+        str: Messaggio di errore, oppure None se il foglio contiene tutte le colonne richieste
+    """
+    foglio, error_message = _open_excel_sheet(file_path)
+    if foglio is not None:
+        foglio[0].close()
+    return error_message
+
+def _open_excel_sheet(file_path):
+    """
+    Apre in sola lettura il primo foglio di un file Excel e ne verifica l'intestazione
+
+    Returns:
+        tuple, str: (workbook, iteratore delle righe successive, colonne) e None,
+            oppure None e il messaggio di errore (il file viene chiuso)
+    """
+    workbook = None
+    try:
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        righe = workbook.worksheets[0].iter_rows(values_only=True)
+        intestazione = next(righe, None) or ()
+        # Come pd.read_excel, le colonne senza intestazione diventano 'Unnamed: N'
+        colonne = [nome if nome is not None else f"Unnamed: {i}" for i, nome in enumerate(intestazione)]
+
+        missing_columns = [col for col in COLONNE_RICHIESTE if col not in colonne]
+        if missing_columns:
+            workbook.close()
+            error_msg = f"Colonne mancanti nel file Excel: {', '.join(missing_columns)}"
+            if error_logger:
+                error_logger.log_error(error_msg, error_code="EXCEL-001")
+            return None, error_msg
+    except Exception as e:
+        if workbook is not None:
+            workbook.close()
+        error_msg = f"Errore nella lettura del file Excel: {str(e)}"
+        if error_logger:
+            error_logger.log_error(error_msg, exception=e, error_code="EXCEL-999")
+        return None, error_msg
+
+    return (workbook, righe, colonne), None
+
+def _tipi_colonne(chunk):
+    """
+    Applica a un blocco letto con openpyxl i tipi di DTYPE_EXCEL usati da read_table
+    
+    Le celle lette in sola lettura mantengono il tipo di Excel (es. una classe di
+    concorso 12 resta un intero): i campi di testo vengono convertiti in stringhe
+    come nella lettura completa, lasciando vuote le celle vuote.
+    """
+    for col, dtype in DTYPE_EXCEL.items():
+        if col in chunk.columns and dtype == 'str':
+            chunk[col] = chunk[col].astype(dtype).where(chunk[col].notna())
+    return chunk
+
+def _iter_excel_chunks(workbook, righe, colonne, chunk_size):
+    """
+    Produce i blocchi normalizzati e validati di read_excel_chunks, chiudendo il file alla fine
+    """
+    num_colonne = len(colonne)
+    # Le righe del foglio sono numerate come in pd.read_excel: 0 per la prima riga dopo l'intestazione
+    numerate = enumerate(righe)
+    try:
+        while True:
+            blocco = list(itertools.islice(numerate, chunk_size))
+            if not blocco:
+                return
+            posizioni, valori = [], []
+            for posizione, riga in blocco:
+                if all(valore is None for valore in riga):
+                    continue
+                # In sola lettura le righe possono essere più corte o più lunghe dell'intestazione
+                posizioni.append(posizione)
+                valori.append(riga[:num_colonne] + (None,) * (num_colonne - len(riga)))
+            if not valori:
+                continue
+
+            chunk = _tipi_colonne(pd.DataFrame(valori, columns=colonne, index=pd.Index(posizioni)))
+            chunk = normalize_excel_data(chunk)
+            _formatta_date(chunk)
+            codici = {percorso: codice_percorso(percorso) for percorso in chunk['tipo_percorso'].unique()}
+            chunk['codice_percorso'] = pd.Categorical(chunk['tipo_percorso'].map(codici), categories=CODICI_PERCORSO)
+            yield chunk, validate_excel_frame(chunk)
+    except Exception as e:
+        if error_logger:
+            error_logger.log_error(f"Errore nella lettura a blocchi del file Excel: {str(e)}", exception=e, error_code="EXCEL-005")
+        raise
+    finally:
+        workbook.close()
+
 def validate_row(row):
     """
     Verifica che una riga del DataFrame contenga tutti i dati necessari
@@ -200,20 +657,9 @@ def validate_row(row):
     # Per i campi opzionali, i valori '--' e vuoti sono accettati e verranno gestiti in seguito
     # Non è necessario fare controlli sui campi opzionali poiché possono essere vuoti o contenere "--"
             
-    # Verifica formato email con supporto per formati complessi
+    # Verifica formato email con supporto per formati complessi ('Nome <email@example.com>', email @stud.uniroma3.it)
     email_text = str(row['email']).strip()
-    # Espressione regolare migliorata che supporta caratteri accentati, spazi e formati 'Nome <email@example.com>'
-    # Migliorata per supportare specificamente le email @stud.uniroma3.it
-    email_pattern = re.compile(r'.*?([a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9._%+\-]+@[a-zA-Z0-9.\-]+\.[a-zA-Z]{2,}).*')
-    
-    # Pattern specifico per email degli studenti di Roma Tre (mmm.mmmmmmm@stud.uniroma3.it)
-    student_email_pattern = re.compile(r'([a-zA-ZàèéìòóùÀÈÉÌÒÓÙ]{2,3}\.[a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9_\-]+@stud\.uniroma3\.it)')
-    
-    # Cerca nel testo usando entrambi i pattern
-    is_valid_standard = '@' in email_text and email_pattern.search(email_text)
-    is_valid_student = student_email_pattern.search(email_text)
-    
-    if not (is_valid_standard or is_valid_student):
+    if not is_valid_email(email_text):
         return False, f"Formato email non valido: {email_text}"
     
     # Verifica formato ora con gestione flessibile
@@ -248,6 +694,244 @@ def validate_row(row):
         
     return True, None
 
+# Campi che devono essere presenti e non vuoti in ogni riga da elaborare
+CAMPI_ESSENZIALI = ['nome_cognome', 'data', 'ora_inizio', 'ora_fine', 'tipo_lezione', 'tipo_percorso', 'email']
+
+# Validità delle righe dei dataset caricati, per impronta del file (i più recenti in fondo)
+_VALIDITA_RIGHE = OrderedDict()
+_VALIDITA_RIGHE_MAX = 16
+_validita_lock = threading.Lock()
+
+def validate_rows(df):
+    """
+    Applica validate_row a tutte le righe del DataFrame con operazioni sulle colonne
+    
+    Args:
+        df (pd.DataFrame): DataFrame da validare
+        
+    Returns:
+        pd.Series: Per ogni riga il messaggio di errore di validate_row, oppure None se la riga è valida
+    """
+    messaggi = np.full(len(df), None, dtype=object)
+    da_verificare = np.ones(len(df), dtype=bool)
+    
+    def segnala(mask, messaggio):
+        # Come validate_row, per ogni riga viene riportato solo il primo errore
+        colpite = np.flatnonzero(mask & da_verificare)
+        for posizione in colpite:
+            messaggi[posizione] = messaggio(posizione)
+        da_verificare[colpite] = False
+    
+    # Campi essenziali presenti e non vuoti
+    for field in CAMPI_ESSENZIALI:
+        vuoti = df[field].isna().to_numpy() | _unique_mask(df[field], lambda testo: testo.isin(['', '--']))
+        segnala(vuoti, lambda posizione, field=field: f"Campo essenziale '{field}' mancante o vuoto")
+    
+    # Formato email e formato delle ore
+    email = df['email'].astype(object)
+    segnala(~_unique_mask(email, _is_valid_email),
+            lambda posizione: f"Formato email non valido: {str(email.iat[posizione]).strip()}")
+    for col, campo in (('ora_inizio', 'inizio'), ('ora_fine', 'fine')):
+        segnala(~_unique_mask(df[col], _is_valid_ora),
+                lambda posizione, col=col, campo=campo: f"Formato ora {campo} non valido: {df[col].iat[posizione]}, deve essere HH:MM")
+    
+    return pd.Series(messaggi, index=df.index, dtype=object)
+
+def row_validity(df):
+    """
+    Restituisce la validità di ogni riga (come validate_row), calcolata una sola volta per dataset
+    
+    Il risultato viene conservato in base all'impronta del file da cui il dataset è
+    stato letto (df.attrs['sha256'], impostata da read_excel_file) e riutilizzato
+    anche per sottoinsiemi di righe dello stesso dataset.
+    
+    Args:
+        df (pd.DataFrame): DataFrame letto con read_excel_file o un suo sottoinsieme di righe
+        
+    Returns:
+        pd.Series: Per ogni riga di df il messaggio di errore, oppure None se la riga è valida;
+            la maschera delle righe valide è row_validity(df).isna()
+    """
+    chiave = df.attrs.get('sha256')
+    if chiave is None:
+        return validate_rows(df)
+    
+    with _validita_lock:
+        validita = _VALIDITA_RIGHE.get(chiave)
+        if validita is not None:
+            _VALIDITA_RIGHE.move_to_end(chiave)
+    if validita is None or not df.index.isin(validita.index).all():
+        validita = validate_rows(df)
+        with _validita_lock:
+            _VALIDITA_RIGHE[chiave] = validita
+            while len(_VALIDITA_RIGHE) > _VALIDITA_RIGHE_MAX:
+                _VALIDITA_RIGHE.popitem(last=False)
+    return validita.reindex(df.index)
+
+# Regole di validazione: codice -> descrizione
+REGOLE_VALIDAZIONE = {
+    'email_non_valida': "Indirizzo email non riconosciuto",
+    'ora_non_valida': "Ora non in uno dei formati HH:MM, HH:MM:SS, HH.MM o HHMM",
+    'percorso_non_valido': "Percorso formativo non presente nel registro",
+    'ora_fine_precedente': "Ora di fine non successiva all'ora di inizio",
+}
+
+# Colonne della tabella degli errori di validazione
+COLONNE_ERRORI = ['riga', 'colonna', 'regola', 'valore']
+
+ORA_HH_MM = re.compile(r'^([01]?[0-9]|2[0-3]):([0-5][0-9])$')
+
+def _unique_mask(series, predicate):
+    """
+    Valuta una condizione una sola volta per ogni valore distinto di una colonna
+
+    Args:
+        series (pd.Series): Colonna da verificare
+        predicate (callable): Funzione che riceve i valori distinti come testo senza spazi
+            iniziali e finali (pd.Series) e restituisce una maschera booleana
+
+    Returns:
+        np.ndarray: Maschera booleana con un valore per ogni riga
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    testo = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    return np.asarray(predicate(testo), dtype=bool)[codes]
+
+def _is_valid_email(testo):
+    return testo.map(is_valid_email)
+
+def _is_valid_ora(testo):
+    return (
+        testo.str.match(ORA_HH_MM) | testo.str.match(ORA_CON_SECONDI)
+        | testo.str.match(ORA_CON_PUNTO) | testo.str.match(ORA_COMPATTA)
+    )
+
+def _ora_confrontabile(testo):
+    """
+    Porta in HH:MM gli orari HH:MM:SS e HH.MM usati per confrontare inizio e fine
+    """
+    testo = testo.copy()
+    con_secondi = testo.str.match(ORA_CON_SECONDI)
+    testo[con_secondi] = testo[con_secondi].str[:5]
+    con_punto = testo.str.match(ORA_CON_PUNTO)
+    testo[con_punto] = testo[con_punto].str.replace('.', ':', regex=False)
+    return testo
+
+def _minuti(series):
+    """
+    Restituisce l'ora di ogni riga in minuti (NaN se non è confrontabile) e il testo confrontato
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    testo = _ora_confrontabile(pd.Series(uniques, dtype=object).astype(str).str.strip())
+    parti = testo.str.extract(ORA_HH_MM).astype(float)
+    minuti = (parti[0] * 60 + parti[1]).to_numpy()
+    return minuti[codes], testo.to_numpy(dtype=object)[codes]
+
+def validate_excel_frame(df):
+    """
+    Esegue una validazione avanzata dell'intero DataFrame, una regola alla volta su intere colonne
+    
+    Ogni regola viene valutata come maschera booleana sulla colonna, calcolata una
+    sola volta per ogni valore distinto. Il risultato è una tabella con un errore
+    per riga: può essere filtrata per regola o colonna, e i messaggi leggibili
+    vengono prodotti solo quando servono con format_validation_errors.
+    
+    Args:
+        df (pd.DataFrame): DataFrame da validare
+    
+    Returns:
+        pd.DataFrame: Errori con le colonne 'riga' (indice della riga nel DataFrame),
+            'colonna', 'regola' (codice di REGOLE_VALIDAZIONE) e 'valore'; vuota se non ci sono errori
+    """
+    controlli = []
+    
+    def aggiungi(mask, colonna, regola, valori):
+        posizioni = np.flatnonzero(mask)
+        if len(posizioni):
+            valori = pd.Series(valori, dtype=object).iloc[posizioni]
+            controlli.append(pd.DataFrame({
+                'posizione': posizioni,
+                'ordine': len(controlli),
+                'riga': df.index[posizioni],
+                'colonna': colonna,
+                'regola': regola,
+                'valore': valori.where(valori.notna(), np.nan).to_numpy()
+            }))
+    
+    # Formato email, con supporto per 'Nome <email>' e per le email degli studenti
+    if 'email' in df.columns:
+        email = df['email'].astype(object)
+        aggiungi(~_unique_mask(email, _is_valid_email), 'email', 'email_non_valida',
+                 email.where(email.notna(), np.nan).astype(str).str.strip())
+    
+    # Formato delle ore
+    for col in CAMPI_ORA:
+        if col in df.columns:
+            aggiungi(~_unique_mask(df[col], _is_valid_ora), col, 'ora_non_valida', df[col])
+    
+    # Percorso formativo presente nel registro
+    if 'tipo_percorso' in df.columns:
+        aggiungi(_unique_mask(df['tipo_percorso'], lambda testo: testo.map(codice_percorso).isna()),
+                 'tipo_percorso', 'percorso_non_valido', df['tipo_percorso'])
+    
+    # Ora di fine successiva all'ora di inizio, solo per gli orari confrontabili
+    if 'ora_inizio' in df.columns and 'ora_fine' in df.columns:
+        minuti_inizio, _ = _minuti(df['ora_inizio'])
+        minuti_fine, testo_fine = _minuti(df['ora_fine'])
+        with np.errstate(invalid='ignore'):
+            aggiungi(minuti_fine <= minuti_inizio, 'ora_fine', 'ora_fine_precedente', testo_fine)
+    
+    if not controlli:
+        return pd.DataFrame(columns=COLONNE_ERRORI)
+    errori = pd.concat(controlli, ignore_index=True)
+    errori = errori.sort_values(['posizione', 'ordine'], kind='stable')
+    return errori[COLONNE_ERRORI].reset_index(drop=True)
+
+def _messaggio_errore(df, errore):
+    """
+    Restituisce il messaggio leggibile di un singolo errore di validazione
+    """
+    regola, valore = errore.regola, errore.valore
+    if regola == 'email_non_valida':
+        return f"Email non valida: {valore}. Esempio formato: nome.cognome@uniroma3.it o xxx.yyyyyyy@stud.uniroma3.it"
+    if regola == 'ora_non_valida':
+        campo = 'inizio' if errore.colonna == 'ora_inizio' else 'fine'
+        return f"Formato ora {campo} non valido: {valore} (deve essere HH:MM)"
+    if regola == 'percorso_non_valido':
+        return f"Tipo percorso non valido: {valore}"
+    if regola == 'ora_fine_precedente':
+        ora_inizio = str(df.at[errore.riga, 'ora_inizio']).strip()
+        if ORA_CON_SECONDI.match(ora_inizio):
+            ora_inizio = ora_inizio[:5]
+        elif ORA_CON_PUNTO.match(ora_inizio):
+            ora_inizio = ora_inizio.replace('.', ':')
+        return f"Ora fine ({valore}) deve essere successiva a ora inizio ({ora_inizio})"
+    return f"{REGOLE_VALIDAZIONE.get(regola, regola)}: {valore}"
+
+def format_validation_errors(df, errors, limit=None):
+    """
+    Produce i messaggi leggibili degli errori di validazione, uno per riga del file
+    
+    Args:
+        df (pd.DataFrame): DataFrame validato
+        errors (pd.DataFrame): Errori restituiti da validate_excel_frame (eventualmente filtrati)
+        limit (int, optional): Numero massimo di righe per cui produrre il messaggio. Default a None (tutte).
+    
+    Returns:
+        list: Messaggi nel formato "Riga N [nome (email)]: errore; errore"
+    """
+    messages = []
+    for riga, errori_riga in itertools.groupby(errors.itertuples(index=False), key=lambda errore: errore.riga):
+        if limit is not None and len(messages) >= limit:
+            break
+        # Includi alcuni dati della riga per facilitare l'identificazione
+        nome = df.at[riga, 'nome_cognome'] if 'nome_cognome' in df.columns else 'Sconosciuto'
+        email = df.at[riga, 'email'] if 'email' in df.columns else None
+        row_info = f"{nome} ({email if email is not None and not pd.isna(email) else 'email mancante'})"
+        dettagli = '; '.join(_messaggio_errore(df, errore) for errore in errori_riga)
+        messages.append(f"Riga {riga+2} [{row_info}]: {dettagli}")
+    return messages
+
 def validate_excel_data(df):
     """
     Esegue una validazione avanzata dell'intero DataFrame
@@ -258,124 +942,4 @@ def validate_excel_data(df):
     Returns:
         list: Lista di errori di validazione per riga
     """
-    validation_errors = []
-    
-    # Espressione regolare migliorata per verificare il formato email
-    # Supporta caratteri accentati, spazi e formati complessi
-    # Pattern aggiornato per catturare correttamente l'intero indirizzo email
-    email_pattern = re.compile(r'.*?([a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9._%+\-]+@[a-zA-Z0-9.\-]+\.[a-zA-Z]{2,}).*')
-    
-    # Pattern specifico per studenti di Roma Tre (mmm.mmmmmmm@stud.uniroma3.it)
-    student_email_pattern = re.compile(r'([a-zA-ZàèéìòóùÀÈÉÌÒÓÙ]{2,3}\.[a-zA-ZàèéìòóùÀÈÉÌÒÓÙ0-9_\-]+@stud\.uniroma3\.it)')
-    
-    # Espressione regolare per verificare il formato ora (HH:MM)
-    ora_pattern = re.compile(r'^([01]?[0-9]|2[0-3]):([0-5][0-9])$')
-    
-    # Verifica percorsi formativi validi con normalizzazione
-    valid_percorsi = [
-        'PeF60 CFU', 
-        'PeF30 CFU all.2', 
-        'PeF36 CFU', 
-        'PeF30 CFU (art. 13)', 
-        'PeF30 CFU all.2 art. 13', 
-        'PeF36 CFU all.5', 
-        'PeF36 CFU (all.5)',
-        # Varianti senza "CFU" che vengono utilizzate nell'app
-        'PeF 60',
-        'PeF 30 all.2',
-        'PeF 36',
-        'PeF 30 art. 13'
-    ]
-    
-    # Funzione per normalizzare i percorsi
-    def normalize_percorso(p):
-        p = str(p).strip()
-        p = p.replace("(", "").replace(")", "")
-        p = p.replace("all.", "allegato")
-        p = p.replace("art.", "articolo")
-        return p
-        
-    normalized_valid = [normalize_percorso(p) for p in valid_percorsi]
-    
-    # Itera sulle righe del DataFrame
-    for idx, row in df.iterrows():
-        row_errors = []
-        
-        # Verifica formato email con supporto avanzato
-        if 'email' in row:
-            email_text = str(row['email']).strip()
-            # Cerca nel testo usando entrambi i pattern
-            is_valid_standard = '@' in email_text and email_pattern.search(email_text)
-            is_valid_student = student_email_pattern.search(email_text)
-            
-            if not (is_valid_standard or is_valid_student):
-                row_errors.append(f"Email non valida: {email_text}. Esempio formato: nome.cognome@uniroma3.it o xxx.yyyyyyy@stud.uniroma3.it")
-        
-        # Verifica formato ore con validazione flessibile
-        def is_valid_ora_format(ora_str):
-            ora_str = str(ora_str).strip()
-            
-            # Pattern standard HH:MM
-            if ora_pattern.match(ora_str):
-                return True
-                
-            # Pattern con secondi HH:MM:SS
-            if re.match(r'^([01]?[0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])$', ora_str):
-                return True
-                
-            # Pattern alternativi che potrebbero essere importati da Excel
-            if re.match(r'^([01]?[0-9]|2[0-3])\.([0-5][0-9])$', ora_str):  # HH.MM
-                return True
-                
-            if re.match(r'^([01]?[0-9]|2[0-3])([0-5][0-9])$', ora_str) and len(ora_str) >= 3:  # HHMM o HMM
-                return True
-                
-            return False
-        
-        if 'ora_inizio' in row and not is_valid_ora_format(row['ora_inizio']):
-            row_errors.append(f"Formato ora inizio non valido: {row['ora_inizio']} (deve essere HH:MM)")
-        if 'ora_fine' in row and not is_valid_ora_format(row['ora_fine']):
-            row_errors.append(f"Formato ora fine non valido: {row['ora_fine']} (deve essere HH:MM)")
-        
-        # Verifica tipo percorso con normalizzazione
-        if 'tipo_percorso' in row:
-            percorso = str(row['tipo_percorso'])
-            if percorso not in valid_percorsi and normalize_percorso(percorso) not in normalized_valid:
-                row_errors.append(f"Tipo percorso non valido: {row['tipo_percorso']}")
-        
-        # Verifica che l'ora di fine sia successiva all'ora di inizio
-        try:
-            if 'ora_inizio' in row and 'ora_fine' in row:
-                # Normalizza le ore rimuovendo i secondi se presenti
-                ora_inizio_str = str(row['ora_inizio']).strip()
-                ora_fine_str = str(row['ora_fine']).strip()
-                
-                # Se l'ora è nel formato HH:MM:SS, estrai solo HH:MM
-                if re.match(r'^([01]?[0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])$', ora_inizio_str):
-                    ora_inizio_str = ora_inizio_str[:5]
-                if re.match(r'^([01]?[0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])$', ora_fine_str):
-                    ora_fine_str = ora_fine_str[:5]
-                
-                # Converti altri formati a HH:MM prima di confrontare
-                if re.match(r'^([01]?[0-9]|2[0-3])\.([0-5][0-9])$', ora_inizio_str):  # HH.MM
-                    ora_inizio_str = ora_inizio_str.replace('.', ':')
-                if re.match(r'^([01]?[0-9]|2[0-3])\.([0-5][0-9])$', ora_fine_str):  # HH.MM
-                    ora_fine_str = ora_fine_str.replace('.', ':')
-                    
-                # Solo se le ore sono già nel formato standard, confrontale
-                if re.match(r'^([01]?[0-9]|2[0-3]):([0-5][0-9])$', ora_inizio_str) and re.match(r'^([01]?[0-9]|2[0-3]):([0-5][0-9])$', ora_fine_str):
-                    ora_inizio = datetime.strptime(ora_inizio_str, '%H:%M')
-                    ora_fine = datetime.strptime(ora_fine_str, '%H:%M')
-                    if ora_fine <= ora_inizio:
-                        row_errors.append(f"Ora fine ({ora_fine_str}) deve essere successiva a ora inizio ({ora_inizio_str})")
-        except ValueError:
-            # Errore già rilevato dai controlli precedenti
-            pass
-        
-        # Aggiungi errori per questa riga se presenti
-        if row_errors:
-            # Includi alcuni dati della riga per facilitare l'identificazione
-            row_info = f"{row['nome_cognome'] if 'nome_cognome' in row else 'Sconosciuto'} ({row['email'] if 'email' in row and not pd.isna(row['email']) else 'email mancante'})"
-            validation_errors.append(f"Riga {idx+2} [{row_info}]: {'; '.join(row_errors)}")
-    
-    return validation_errors
+    return format_validation_errors(df, validate_excel_frame(df))
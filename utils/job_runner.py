@@ -0,0 +1,304 @@
+"""
+Esecuzione in background dei lotti di generazione e invio degli attestati.
+
+Streamlit riesegue lo script a ogni interazione e interrompe l'esecuzione in
+corso: un lotto elaborato direttamente nello script si ferma al primo clic o
+quando la scheda del browser viene chiusa. Un JobRunner esegue invece i lotti
+su un thread separato dallo script; ogni lotto ha un identificativo e uno stato
+(avanzamento, messaggi, esito) che l'interfaccia legge a ogni aggiornamento.
+I lotti inviati mentre il thread è occupato restano in coda e vengono eseguiti
+nell'ordine in cui sono stati inviati.
+"""
+import uuid
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+# Importa error_logger se disponibile
+try:
+    from utils.error_logger import error_logger
+except ImportError:
+    error_logger = None
+
+# Stati di un lavoro
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+class Job:
+    """
+    Stato di un lavoro eseguito in background.
+
+    La funzione del lavoro riceve il Job e lo aggiorna con set_total, set_status,
+    add_result, add_skipped e set_unchanged; l'interfaccia ne legge una copia
+    coerente con snapshot().
+    """
+
+    def __init__(self, name, resource=None):
+        """
+        Args:
+            name (str): Descrizione del lavoro mostrata nell'interfaccia
+            resource (optional): Risorsa elaborata dal lavoro (es. il lotto dell'outbox). Default a None.
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.resource = resource
+        self.status = STATUS_QUEUED
+        self.created_at = _now()
+        self.started_at = None
+        self.finished_at = None
+        self.total = None
+        self.status_message = None
+        self.success_messages = []
+        self.error_messages = []
+        self.skipped = 0
+        self.unchanged = 0
+        self.error = None
+        self.result = None
+        self._lock = threading.Lock()
+
+    def set_total(self, total):
+        """
+        Imposta il numero di elementi da elaborare, usato per l'avanzamento
+        """
+        with self._lock:
+            self.total = total
+
+    def set_resource(self, resource):
+        """
+        Associa al lavoro la risorsa che elabora, se nota solo dopo l'avvio
+        """
+        with self._lock:
+            self.resource = resource
+
+    def set_status(self, message):
+        """
+        Imposta il messaggio di stato mostrato sopra la barra di avanzamento
+        """
+        with self._lock:
+            self.status_message = message
+
+    def add_result(self, success, message):
+        """
+        Registra l'esito di un elemento elaborato
+
+        Args:
+            success (bool): True se l'elemento è stato elaborato con successo
+            message (str): Messaggio da mostrare nel riepilogo
+        """
+        with self._lock:
+            (self.success_messages if success else self.error_messages).append(message)
+
+    def add_skipped(self, count=1):
+        """
+        Registra elementi saltati perché già elaborati in precedenza
+        """
+        with self._lock:
+            self.skipped += count
+
+    def set_unchanged(self, count):
+        """
+        Imposta il numero di righe non inviate perché invariate rispetto all'invio precedente
+        """
+        with self._lock:
+            self.unchanged = count
+
+    @property
+    def done(self):
+        """
+        Numero di elementi già elaborati, compresi quelli saltati
+        """
+        return len(self.success_messages) + len(self.error_messages) + self.skipped
+
+    @property
+    def progress(self):
+        """
+        Avanzamento tra 0 e 1, oppure None se il totale non è ancora noto
+        """
+        if not self.total:
+            return 1.0 if self.status not in ACTIVE_STATUSES else None
+        return min(1.0, self.done / self.total)
+
+    def snapshot(self):
+        """
+        Restituisce una copia dello stato del lavoro
+
+        Returns:
+            dict: Campi del lavoro, con copie delle liste dei messaggi
+        """
+        with self._lock:
+            return {
+                'id': self.id,
+                'name': self.name,
+                'resource': self.resource,
+                'status': self.status,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'total': self.total,
+                'done': self.done,
+                'progress': self.progress,
+                'status_message': self.status_message,
+                'success_messages': list(self.success_messages),
+                'error_messages': list(self.error_messages),
+                'skipped': self.skipped,
+                'unchanged': self.unchanged,
+                'error': self.error,
+                'result': self.result,
+            }
+
+class JobRunner:
+    """
+    Coda di lavori eseguiti su un pool di thread indipendente dallo script Streamlit.
+
+    Va creato una sola volta per processo (es. con st.cache_resource), così i
+    lavori continuano tra le riesecuzioni dello script e sono visibili da tutte
+    le sessioni, anche dopo la riconnessione del browser.
+
+    Utilizzo:
+        runner = JobRunner()
+        job_id = runner.submit("Lotto", funzione, argomento)  # chiama funzione(job, argomento)
+        stato = runner.get(job_id)
+    """
+
+    def __init__(self, max_workers=None, history=None):
+        """
+        Args:
+            max_workers (int, optional): Lavori eseguiti contemporaneamente. Default a config.JOB_WORKERS.
+            history (int, optional): Lavori conclusi conservati per il riepilogo. Default a config.JOB_HISTORY.
+        """
+        self.max_workers = max_workers or config.JOB_WORKERS
+        self.history = config.JOB_HISTORY if history is None else history
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="attestati-job")
+        self._jobs = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, func, *args, resource=None, **kwargs):
+        """
+        Accoda un lavoro
+
+        Args:
+            name (str): Descrizione del lavoro
+            func (callable): Funzione chiamata come func(job, *args, **kwargs); il valore restituito diventa job.result
+            resource (optional): Risorsa elaborata dal lavoro, vedi busy_resources(). Default a None.
+
+        Returns:
+            str: Identificativo del lavoro
+        """
+        job = Job(name, resource)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._futures[job.id] = self._executor.submit(self._run, job, func, args, kwargs)
+            self._prune()
+        return job.id
+
+    def _run(self, job, func, args, kwargs):
+        with job._lock:
+            if job.status == STATUS_CANCELLED:
+                return
+            job.status = STATUS_RUNNING
+            job.started_at = _now()
+        try:
+            result = func(job, *args, **kwargs)
+        except Exception as e:
+            if error_logger:
+                error_logger.log_error(f"Errore nel lavoro \"{job.name}\": {str(e)}", exception=e,
+                                       show_ui=False, error_code="JOB-001")
+            with job._lock:
+                job.status = STATUS_FAILED
+                job.error = str(e)
+                job.finished_at = _now()
+        else:
+            with job._lock:
+                job.status = STATUS_DONE
+                job.result = result
+                job.finished_at = _now()
+        finally:
+            with self._lock:
+                self._futures.pop(job.id, None)
+
+    def _prune(self):
+        # Conserva solo gli ultimi lavori conclusi
+        conclusi = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATUSES]
+        for job_id in conclusi[:max(0, len(conclusi) - self.history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """
+        Restituisce lo stato di un lavoro
+
+        Returns:
+            dict: Copia dello stato (vedi Job.snapshot), oppure None se il lavoro non esiste
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.snapshot() if job is not None else None
+
+    def jobs(self):
+        """
+        Restituisce lo stato di tutti i lavori conservati, nell'ordine di invio
+
+        Returns:
+            list: Copie dello stato dei lavori
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.snapshot() for job in jobs]
+
+    def busy_resources(self):
+        """
+        Restituisce le risorse dei lavori in coda o in esecuzione
+
+        Returns:
+            set: Risorse associate ai lavori attivi
+        """
+        with self._lock:
+            return {job.resource for job in self._jobs.values()
+                    if job.status in ACTIVE_STATUSES and job.resource is not None}
+
+    def cancel(self, job_id):
+        """
+        Annulla un lavoro ancora in coda; i lavori già avviati non vengono interrotti
+
+        Returns:
+            bool: True se il lavoro è stato annullato
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            future = self._futures.get(job_id)
+        if job is None:
+            return False
+        with job._lock:
+            if job.status != STATUS_QUEUED:
+                return False
+            job.status = STATUS_CANCELLED
+            job.finished_at = _now()
+        if future is not None:
+            future.cancel()
+        with self._lock:
+            self._futures.pop(job_id, None)
+        return True
+
+    def remove(self, job_id):
+        """
+        Rimuove dal riepilogo un lavoro concluso
+
+        Returns:
+            bool: True se il lavoro è stato rimosso
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in ACTIVE_STATUSES:
+                return False
+            del self._jobs[job_id]
+            return True
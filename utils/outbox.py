@@ -0,0 +1,349 @@
+"""
+Registro persistente (SQLite) delle email da inviare.
+
+Ogni lotto di invio viene registrato con una riga per messaggio e lo stato di
+ogni messaggio (queued, sending, sent, failed, skipped) viene aggiornato durante l'invio.
+Se l'applicazione si interrompe a metà lotto, i messaggi non ancora inviati
+possono essere ripresi senza reinviare quelli già consegnati.
+
+Ogni attestato consegnato viene inoltre registrato nel registro degli invii
+(tabella deliveries) con l'impronta di destinatario, lezione e modello
+(delivery_fingerprint): le righe già consegnate in un lotto precedente, anche
+di un altro file, possono così essere riconosciute e saltate.
+"""
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+
+import config
+
+# Stati di un messaggio
+STATUS_QUEUED = 'queued'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'  # Attestato già consegnato in un altro lotto
+
+# Campi della riga che identificano un attestato, oltre al modello
+CAMPI_IMPRONTA = ('email', 'data', 'ora_inizio', 'ora_fine', 'tipo_lezione')
+
+# Impronte cercate nel registro con una sola query
+LOOKUP_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    modello TEXT,
+    testo_modello TEXT,
+    logo BLOB,
+    firma BLOB,
+    created_at TEXT NOT NULL,
+    closed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id INTEGER NOT NULL REFERENCES batches(id),
+    row_index INTEGER NOT NULL,
+    recipient_email TEXT,
+    payload TEXT NOT NULL,
+    fingerprint TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    smtp_code INTEGER,
+    last_response TEXT,
+    updated_at TEXT NOT NULL,
+    UNIQUE (batch_id, row_index)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_batch_status ON messages (batch_id, status);
+CREATE TABLE IF NOT EXISTS deliveries (
+    fingerprint TEXT PRIMARY KEY,
+    recipient_email TEXT,
+    message_id INTEGER,
+    sent_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+def _read_image(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _campo_impronta(valore):
+    if valore is None:
+        return ''
+    return ' '.join(str(valore).split()).casefold()
+
+def delivery_fingerprint(row, modello):
+    """
+    Impronta stabile di un attestato: stesso destinatario, stessa lezione, stesso modello
+
+    Args:
+        row (AttestatoRecord | dict): Dati della riga
+        modello (str): Modello dell'attestato
+
+    Returns:
+        str: Impronta esadecimale (BLAKE2b a 128 bit)
+    """
+    campi = [_campo_impronta(row.get(campo)) for campo in CAMPI_IMPRONTA]
+    campi.append(_campo_impronta(modello or 'presenza'))
+    return hashlib.blake2b('\x1f'.join(campi).encode('utf-8'), digest_size=16).hexdigest()
+
+class EmailOutbox:
+    """
+    Outbox SQLite degli invii email.
+
+    La connessione è condivisa tra i thread dell'invio e protetta da un lock;
+    ogni cambio di stato viene salvato subito, così dopo un'interruzione il
+    database riflette l'ultimo stato noto di ogni messaggio.
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path (str, optional): Percorso del database. Default a config.OUTBOX_PATH.
+        """
+        self.db_path = db_path or config.OUTBOX_PATH
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        # Rientrante: i messaggi passati a create_batch possono essere generati consultando
+        # il registro degli invii (delivered) mentre il lotto viene registrato
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """
+        Chiude la connessione al database
+        """
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def create_batch(self, messages, name=None, modello=None, logo_path=None, firma_path=None, testo_modello=None):
+        """
+        Registra un nuovo lotto con tutti i suoi messaggi in stato 'queued'
+
+        Testo del modello, logo e firma vengono conservati nel lotto: i file caricati
+        dall'interfaccia possono essere sostituiti prima che un lotto interrotto venga ripreso.
+
+        Args:
+            messages (iterable): Coppie (indice della riga, dati della riga come dict)
+            name (str, optional): Nome del lotto (es. il nome del file Excel). Default a None.
+            modello (str, optional): Modello di attestato usato. Default a None.
+            logo_path (str, optional): Percorso del logo, di cui viene conservato il contenuto. Default a None.
+            firma_path (str, optional): Percorso della firma, di cui viene conservato il contenuto. Default a None.
+            testo_modello (str, optional): Testo del modello dell'attestato. Default a None.
+
+        Returns:
+            int: Identificativo del lotto
+        """
+        now = _now()
+        logo, firma = _read_image(logo_path), _read_image(firma_path)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO batches (name, modello, testo_modello, logo, firma, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, modello, testo_modello, logo, firma, now)
+            )
+            batch_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO messages (batch_id, row_index, recipient_email, payload, fingerprint, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (batch_id, int(row_index), str(row.get('email', '')), json.dumps(row, default=str),
+                     delivery_fingerprint(row, modello), now)
+                    for row_index, row in messages
+                )
+            )
+        return batch_id
+
+    def _update(self, message_id, sql, params):
+        with self._lock, self._conn:
+            self._conn.execute(sql, params + (_now(), message_id))
+
+    def mark_sending(self, message_id):
+        """
+        Segna un messaggio come in invio
+        """
+        self._update(message_id, "UPDATE messages SET status = ?, updated_at = ? WHERE id = ?", (STATUS_SENDING,))
+
+    def mark_sent(self, message_id, response=None):
+        """
+        Segna un messaggio come inviato, contando il tentativo, e lo registra nel registro degli invii
+
+        Args:
+            message_id (int): Identificativo del messaggio
+            response (str, optional): Risposta del server. Default a None.
+        """
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE messages SET status = ?, attempts = attempts + 1, smtp_code = NULL, last_response = ?, updated_at = ? WHERE id = ?",
+                (STATUS_SENT, response, now, message_id)
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO deliveries (fingerprint, recipient_email, message_id, sent_at) "
+                "SELECT fingerprint, recipient_email, id, ? FROM messages WHERE id = ? AND fingerprint IS NOT NULL",
+                (now, message_id)
+            )
+
+    def mark_skipped(self, message_id):
+        """
+        Segna un messaggio come saltato perché l'attestato risulta già consegnato
+        """
+        self._update(message_id, "UPDATE messages SET status = ?, updated_at = ? WHERE id = ?", (STATUS_SKIPPED,))
+
+    def is_delivered(self, fingerprint):
+        """
+        Verifica se un attestato risulta già consegnato
+
+        Args:
+            fingerprint (str): Impronta dell'attestato (delivery_fingerprint)
+
+        Returns:
+            bool: True se l'attestato è nel registro degli invii
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM deliveries WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return row is not None
+
+    def delivered(self, fingerprints):
+        """
+        Restituisce le impronte già presenti nel registro degli invii
+
+        Args:
+            fingerprints (iterable): Impronte da cercare
+
+        Returns:
+            set: Impronte degli attestati già consegnati
+        """
+        fingerprints = list(fingerprints)
+        trovate = set()
+        with self._lock:
+            for start in range(0, len(fingerprints), LOOKUP_CHUNK):
+                blocco = fingerprints[start:start + LOOKUP_CHUNK]
+                trovate.update(
+                    r[0] for r in self._conn.execute(
+                        f"SELECT fingerprint FROM deliveries WHERE fingerprint IN ({', '.join('?' * len(blocco))})", blocco
+                    )
+                )
+        return trovate
+
+    def mark_failed(self, message_id, error, smtp_code=None):
+        """
+        Segna un messaggio come non inviato in modo definitivo, contando il tentativo
+
+        Args:
+            message_id (int): Identificativo del messaggio
+            error (str): Messaggio di errore o risposta del server
+            smtp_code (int, optional): Codice di risposta SMTP, se disponibile. Default a None.
+        """
+        self._update(message_id, "UPDATE messages SET status = ?, attempts = attempts + 1, smtp_code = ?, last_response = ?, updated_at = ? WHERE id = ?",
+                     (STATUS_FAILED, smtp_code, error))
+
+    def mark_retry(self, message_id, error, smtp_code=None):
+        """
+        Rimette in coda un messaggio dopo un errore temporaneo, contando il tentativo
+
+        Args:
+            message_id (int): Identificativo del messaggio
+            error (str): Messaggio di errore o risposta del server
+            smtp_code (int, optional): Codice di risposta SMTP, se disponibile. Default a None.
+        """
+        self._update(message_id, "UPDATE messages SET status = ?, attempts = attempts + 1, smtp_code = ?, last_response = ?, updated_at = ? WHERE id = ?",
+                     (STATUS_QUEUED, smtp_code, error))
+
+    def pending(self, batch_id, include_failed=False):
+        """
+        Restituisce i messaggi di un lotto ancora da inviare, nell'ordine delle righe
+
+        I messaggi rimasti 'sending' (invio interrotto prima della conferma del server)
+        vengono inclusi: possono quindi essere inviati una seconda volta.
+
+        Args:
+            batch_id (int): Identificativo del lotto
+            include_failed (bool, optional): Se True include anche i messaggi non riusciti. Default a False.
+
+        Returns:
+            list: Dizionari con id, row_index, recipient_email, attempts, status, fingerprint e row (dati della riga)
+        """
+        statuses = [STATUS_QUEUED, STATUS_SENDING] + ([STATUS_FAILED] if include_failed else [])
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, row_index, recipient_email, payload, fingerprint, attempts, status FROM messages "
+                f"WHERE batch_id = ? AND status IN ({', '.join('?' * len(statuses))}) ORDER BY row_index",
+                [batch_id] + statuses
+            ).fetchall()
+        return [
+            {
+                'id': r['id'], 'row_index': r['row_index'], 'recipient_email': r['recipient_email'],
+                'attempts': r['attempts'], 'status': r['status'], 'fingerprint': r['fingerprint'],
+                'row': json.loads(r['payload'])
+            }
+            for r in rows
+        ]
+
+    def counts(self, batch_id):
+        """
+        Restituisce il numero di messaggi di un lotto per stato
+
+        Returns:
+            dict: {stato: numero di messaggi}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM messages WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall()
+        counts = {STATUS_QUEUED: 0, STATUS_SENDING: 0, STATUS_SENT: 0, STATUS_FAILED: 0, STATUS_SKIPPED: 0}
+        counts.update({status: n for status, n in rows})
+        return counts
+
+    def get_batch(self, batch_id):
+        """
+        Restituisce i dati di un lotto, compresi testo del modello, logo e firma (byte o None)
+
+        Returns:
+            dict: Dati del lotto o None se non esiste
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        return dict(row) if row else None
+
+    def incomplete_batches(self):
+        """
+        Restituisce i lotti non archiviati con messaggi ancora da inviare, dal più recente
+
+        Returns:
+            list: Dizionari con id, name, modello, created_at, closed e il numero di messaggi in sospeso
+                ('da_inviare'); testo del modello e immagini si leggono con get_batch
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT b.id, b.name, b.modello, b.created_at, b.closed, COUNT(m.id) AS da_inviare FROM batches b "
+                "JOIN messages m ON m.batch_id = b.id AND m.status IN (?, ?) "
+                "WHERE b.closed = 0 GROUP BY b.id ORDER BY b.id DESC",
+                (STATUS_QUEUED, STATUS_SENDING)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def close_batch(self, batch_id):
+        """
+        Archivia un lotto, che non verrà più proposto per la ripresa
+        """
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE batches SET closed = 1 WHERE id = ?", (batch_id,))
@@ -1,218 +1,785 @@
 import os
+import io
+import copy
+import time
+import queue
+import itertools
+import collections
+import multiprocessing
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, Flowable, Frame, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen.canvas import Canvas, _digester
 from datetime import datetime
 import config
 from PIL import Image as PILImage
+from utils.attestato_template import compile_template
+from utils.percorsi import codice_percorso, descrizione_percorso
 
 # Registra i font se necessario
 # pdfmetrics.registerFont(TTFont('Arial', 'Arial.ttf'))
 
-def generate_pdf(data, logo_path=None, firma_path=None, output_dir="output", modello="presenza"):
+def get_testo_modello(modello):
     """
-    Genera un PDF di attestato di presenza basato sui dati forniti
+    Restituisce il testo del modello di attestato configurato
     
     Args:
-        data (dict): Dizionario contenente i dati per il PDF
-        logo_path (str, optional): Percorso del logo. Default a None.
-        firma_path (str, optional): Percorso dell'immagine della firma. Default a None.
-        output_dir (str, optional): Directory di output. Default a "output".
-        modello (str, optional): Tipo di modello da utilizzare ('presenza', 'telematico', 'personalizzato'). Default a "presenza".
+        modello (str): Tipo di modello ('presenza', 'telematico', 'personalizzato')
         
     Returns:
-        str: Percorso del file PDF generato o None in caso di errore
+        str: Testo del modello
     """
-    try:
-        # Assicurati che la directory di output esista
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Crea un nome file basato sul nome e cognome e la data
-        file_name = f"attestato_{data['nome_cognome'].replace(' ', '_')}_{data['data'].replace('/', '-')}.pdf"
-        file_path = os.path.join(output_dir, file_name)
+    if modello == "telematico":
+        return config.ATTESTATO_TELEMATICO
+    elif modello == "personalizzato":
+        return config.ATTESTATO_PERSONALIZZATO
+    else:  # default: presenza
+        return config.ATTESTATO_PRESENZA
+
+class PdfRenderer:
+    """
+    Generatore di attestati riutilizzabile per un intero lotto.
+    
+    Stili, dimensioni delle immagini e testo del modello vengono preparati una sola
+    volta nel costruttore; render() esegue solo il lavoro specifico di ogni riga.
+    """
+    
+    def __init__(self, modello="presenza", logo_path=None, firma_path=None, testo_modello=None):
+        """
+        Prepara gli elementi comuni a tutti gli attestati del lotto.
         
-        # Crea il documento PDF
-        doc = SimpleDocTemplate(file_path, pagesize=A4, 
-                                rightMargin=2*cm, leftMargin=2*cm, 
-                                topMargin=2*cm, bottomMargin=2*cm)
+        Args:
+            modello (str, optional): Tipo di modello da utilizzare ('presenza', 'telematico', 'personalizzato'). Default a "presenza".
+            logo_path (str, optional): Percorso del logo. Default a None.
+            firma_path (str, optional): Percorso dell'immagine della firma. Default a None.
+            testo_modello (str, optional): Testo del modello. Default al testo configurato per il modello.
+        """
+        self.modello = modello
         
         # Crea gli stili
         styles = getSampleStyleSheet()
-        title_style = styles['Title']
-        normal_style = styles['Normal']
+        self.title_style = styles['Title']
+        self.normal_style = styles['Normal']
         
-        # Crea il contenuto del PDF
-        content = []
+        # Calcola una sola volta le dimensioni di logo e firma
+        self.logo = self._load_logo(logo_path)
+        self.firma = self._load_firma(firma_path)
         
-        # Aggiungi il logo se disponibile
-        if logo_path and os.path.exists(logo_path):
-            # Ridimensiona il logo per adattarlo alla pagina
-            # Usa PIL per ottenere le dimensioni corrette dell'immagine
-            try:
-                pil_img = PILImage.open(logo_path)
-                img_width, img_height = pil_img.size
-                aspect_ratio = img_width / img_height
-                
-                # Imposta un'altezza più piccola per il logo (da 2cm a 1.5cm)
-                logo = Image(logo_path)
-                logo.drawHeight = 1.5*cm
-                logo.drawWidth = logo.drawHeight * aspect_ratio
-                
-                # Limita la larghezza massima a 7 cm
-                if logo.drawWidth > 7*cm:
-                    logo.drawWidth = 7*cm
-                    logo.drawHeight = logo.drawWidth / aspect_ratio
-                
-                content.append(logo)
-                # Aggiungi spazio dopo il logo
-                content.append(Spacer(1, 0.5*cm))
-            except Exception as e:
-                print(f"Errore nel caricamento del logo: {str(e)}")
-        
-        # Seleziona il modello di testo appropriato
-        if modello == "telematico":
-            testo_modello = config.ATTESTATO_TELEMATICO
-        elif modello == "personalizzato":
-            testo_modello = config.ATTESTATO_PERSONALIZZATO
-        else:  # default: presenza
-            testo_modello = config.ATTESTATO_PRESENZA
-            
-        # Prepara il percorso completo
-        percorsi_completi = {
-            "PeF60 CFU": "PeF60 CFU (allegato 1 al DPCM 4 agosto 2023)",
-            "PeF30 CFU all.2": "PeF30 CFU all.2 (allegato 2 al DPCM 4 agosto 2023)",
-            "PeF36 CFU": "PeF36 CFU (allegato 5 al DPCM 4 agosto 2023)",
-            "PeF30 CFU (art. 13)": "PeF30 CFU all.2 (art. 13 del DPCM 4 agosto 2023)",
-            "PeF30 CFU all.2 art. 13": "PeF30 CFU all.2 (art. 13 del DPCM 4 agosto 2023)",
-            "PeF36 CFU all.5": "PeF36 CFU (allegato 5 al DPCM 4 agosto 2023)",
-            "PeF36 CFU (all.5)": "PeF36 CFU (allegato 5 al DPCM 4 agosto 2023)"
-        }
-        
-        # Funzione per normalizzare i percorsi (simile a quella in excel_reader.py)
-        def normalize_percorso(p):
-            p = str(p).strip()
-            p = p.replace("(", "").replace(")", "")  # Rimuovi parentesi
-            p = p.replace("all.", "allegato")        # Standardizza abbreviazioni
-            p = p.replace("art.", "articolo")        # Standardizza abbreviazioni
-            return p
-            
-        # Trova il percorso completo che corrisponde al tipo_percorso selezionato
-        percorso_selezionato = None
-        percorso_normalizzato = normalize_percorso(data['tipo_percorso'])
-        
-        for key, percorso in percorsi_completi.items():
-            # Confronta in modo diretto, come sottostringa o in formato normalizzato
-            if (key == data['tipo_percorso'] or 
-                key in data['tipo_percorso'] or 
-                normalize_percorso(key) == percorso_normalizzato):
-                percorso_selezionato = percorso
-                break
+        # Seleziona il modello di testo appropriato e lo compila: i segnaposto errati
+        # vengono segnalati qui, prima di iniziare il lotto
+        if testo_modello is None:
+            testo_modello = get_testo_modello(modello)
+        self.template = compile_template(testo_modello, modello)
+        self.titolo = self.template.titolo
+        self.sottotitolo = self.template.sottotitolo
+    
+    @staticmethod
+    def _image_size(image_path):
+        """
+        Legge con PIL le dimensioni in pixel di un'immagine
         
-        # Se non è stato trovato, usa il valore originale
-        if not percorso_selezionato:
-            percorso_selezionato = data['tipo_percorso']
-            print(f"Avviso: Percorso formativo '{data['tipo_percorso']}' non mappato a una descrizione completa")
+        Returns:
+            tuple: (larghezza, altezza) dell'immagine
+        """
+        with PILImage.open(image_path) as pil_img:
+            return pil_img.size
+    
+    def _load_logo(self, logo_path):
+        """
+        Calcola le dimensioni di disegno del logo
         
-        # Formatta il testo del modello con i dati
-        linee_testo = testo_modello.strip().split('\n')
+        Returns:
+            tuple: (percorso, larghezza, altezza) oppure None se il logo non è disponibile
+        """
+        if not logo_path or not os.path.exists(logo_path):
+            return None
+        try:
+            img_width, img_height = self._image_size(logo_path)
+            aspect_ratio = img_width / img_height
+            
+            # Imposta un'altezza più piccola per il logo (da 2cm a 1.5cm)
+            draw_height = 1.5*cm
+            draw_width = draw_height * aspect_ratio
+            
+            # Limita la larghezza massima a 7 cm
+            if draw_width > 7*cm:
+                draw_width = 7*cm
+                draw_height = draw_width / aspect_ratio
+            
+            return logo_path, draw_width, draw_height
+        except Exception as e:
+            print(f"Errore nel caricamento del logo: {str(e)}")
+            return None
+    
+    def _load_firma(self, firma_path):
+        """
+        Calcola le dimensioni di disegno della firma
         
-        # Aggiungi il titolo (prime due linee) con stile speciale
-        content.append(Paragraph(linee_testo[0], title_style))
-        content.append(Paragraph(linee_testo[1], normal_style))
-        content.append(Spacer(1, 0.5*cm))
+        Returns:
+            tuple: (percorso, larghezza, altezza) oppure None se la firma non è disponibile
+        """
+        if not firma_path or not os.path.exists(firma_path):
+            return None
+        try:
+            img_width, img_height = self._image_size(firma_path)
+            aspect_ratio = img_width / img_height
+            
+            # Imposta altezza firma a massimo 2 cm
+            draw_height = min(2*cm, img_height)
+            draw_width = draw_height * aspect_ratio
+            
+            # Limita la larghezza massima a 5 cm
+            if draw_width > 5*cm:
+                draw_width = 5*cm
+                draw_height = draw_width / aspect_ratio
+            
+            return firma_path, draw_width, draw_height
+        except Exception as e:
+            print(f"Errore nel caricamento della firma: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _image_flowable(image_info):
+        """
+        Crea il flowable di un'immagine con le dimensioni già calcolate
+        """
+        image_path, draw_width, draw_height = image_info
+        image = Image(image_path)
+        image.drawWidth = draw_width
+        image.drawHeight = draw_height
+        return image
+    
+    def percorso_completo(self, tipo_percorso, codice=None):
+        """
+        Restituisce la descrizione completa di un percorso formativo
+        
+        Args:
+            tipo_percorso (str): Percorso formativo indicato nel file Excel
+            codice (str, optional): Codice canonico già calcolato dal lettore Excel. Default a None.
+            
+        Returns:
+            str: Descrizione completa o il valore originale se il percorso non è mappato
+        """
+        # Il codice canonico è già presente per le righe lette da read_excel_file
+        if not isinstance(codice, str):
+            codice = codice_percorso(tipo_percorso)
+        descrizione = descrizione_percorso(codice)
+        if descrizione is not None:
+            return descrizione
+        
+        # Se non è stato trovato, usa il valore originale
+        print(f"Avviso: Percorso formativo '{tipo_percorso}' non mappato a una descrizione completa")
+        return tipo_percorso
+    
+    def format_testo(self, data, middle=False, data_rilascio=None):
+        """
+        Sostituisce i dati di una riga nel testo del modello
         
-        # Formatta il resto del testo con i dati del certificato
+        Args:
+            data (dict | AttestatoRecord): Dati per il PDF (dizionario o record di utils.records)
+            middle (bool, optional): Se True formatta solo il blocco con i dati della riga. Default a False.
+            data_rilascio (str, optional): Data di rilascio. Default alla data odierna.
+            
+        Returns:
+            str: Testo formattato
+        """
         # Aggiungi la data di rilascio (oggi) come data_rilascio
-        data_rilascio = datetime.now().strftime("%d/%m/%Y")
+        if data_rilascio is None:
+            data_rilascio = datetime.now().strftime("%d/%m/%Y")
         
-        # Gestisci il caso in cui classe_concorso sia "--" o vuoto
+        # I campi opzionali con "--" o vuoti vengono lasciati vuoti
         classe_concorso = data.get('classe_concorso', '')
         if classe_concorso == '--' or not classe_concorso.strip():
             classe_concorso = ""
-        
-        # Gestisci i campi opzionali aula, dipartimento e indirizzo
         aula = data.get('aula', '')
-        dipartimento = data.get('dipartimento', '')
-        indirizzo = data.get('indirizzo', '')
-        
         if aula == '--' or not aula.strip():
             aula = ""
+        dipartimento = data.get('dipartimento', '')
         if dipartimento == '--' or not dipartimento.strip():
             dipartimento = ""
+        indirizzo = data.get('indirizzo', '')
         if indirizzo == '--' or not indirizzo.strip():
             indirizzo = ""
-            
-        # Modifica il template in base alla presenza o assenza di campi
-        template_text = '\n'.join(linee_testo[2:])
-        
-        # Rimuovi classe_concorso se vuoto
-        if not classe_concorso:
-            template_text = template_text.replace(" – {classe_concorso}", "")
-            
-        # Modifica il testo per lezioni in presenza quando dipartimento è vuoto
-        if modello == "presenza" and not dipartimento:
-            # Sostituisci "l'aula {aula} del dipartimento di {dipartimento}" con "l'aula {aula}"
-            template_text = template_text.replace("l'aula {aula} del dipartimento di {dipartimento}", "l'aula {aula}")
-        
-        testo_formattato = template_text.format(
-            nome_cognome=data['nome_cognome'],
-            data=data['data'],
-            data_rilascio=data_rilascio,  # Data di rilascio (oggi)
-            ora_inizio=data['ora_inizio'],
-            ora_fine=data['ora_fine'],
-            aula=aula,
-            dipartimento=dipartimento,
-            indirizzo=indirizzo,
-            tipo_lezione=data['tipo_lezione'],
-            tipo_percorso=percorso_selezionato,
-            classe_concorso=classe_concorso,
-            universita=config.UNIVERSITA,
-            direttore_cafis=config.DIRETTORE_CAFIS
-        )
         
-        # Dividi il testo formattato in paragrafi e aggiungili al contenuto
-        for paragrafo in testo_formattato.split('\n'):
+        return self.template.format({
+            'nome_cognome': data['nome_cognome'],
+            'data': data['data'],
+            'data_rilascio': data_rilascio,
+            'ora_inizio': data['ora_inizio'],
+            'ora_fine': data['ora_fine'],
+            'aula': aula,
+            'dipartimento': dipartimento,
+            'indirizzo': indirizzo,
+            'tipo_lezione': data['tipo_lezione'],
+            'tipo_percorso': self.percorso_completo(data['tipo_percorso'], data.get('codice_percorso')),
+            'classe_concorso': classe_concorso,
+            'universita': config.UNIVERSITA,
+            'direttore_cafis': config.DIRETTORE_CAFIS
+        }, middle=middle)
+    
+    def paragraphs(self, testo):
+        """
+        Converte un testo in paragrafi, con uno spazio al posto di ogni linea vuota
+        
+        Args:
+            testo (str): Testo già formattato
+            
+        Returns:
+            list: Flowable dei paragrafi
+        """
+        content = []
+        for paragrafo in testo.split('\n'):
             if paragrafo.strip():  # Ignora linee vuote
-                content.append(Paragraph(paragrafo, normal_style))
+                content.append(Paragraph(paragrafo, self.normal_style))
             else:
                 content.append(Spacer(1, 0.5*cm))
+        return content
+    
+    def header_flowables(self):
+        """
+        Restituisce logo e titolo dell'attestato
+        """
+        content = []
         
-        # Aggiungi la firma se disponibile
-        if firma_path and os.path.exists(firma_path):
-            try:
-                # Aggiungi spazio prima della firma
-                content.append(Spacer(1, 1*cm))
-                
-                # Ridimensiona la firma per adattarla alla pagina
-                pil_img = PILImage.open(firma_path)
-                img_width, img_height = pil_img.size
-                aspect_ratio = img_width / img_height
-                
-                # Imposta altezza firma a massimo 2 cm
-                firma = Image(firma_path)
-                firma.drawHeight = min(2*cm, firma.drawHeight)
-                firma.drawWidth = firma.drawHeight * aspect_ratio
-                
-                # Limita la larghezza massima a 5 cm
-                if firma.drawWidth > 5*cm:
-                    firma.drawWidth = 5*cm
-                    firma.drawHeight = firma.drawWidth / aspect_ratio
-                    
-                content.append(firma)
-            except Exception as e:
-                print(f"Errore nel caricamento della firma: {str(e)}")
-        
-        # Genera il PDF
-        doc.build(content)
+        # Aggiungi il logo se disponibile
+        if self.logo:
+            content.append(self._image_flowable(self.logo))
+            # Aggiungi spazio dopo il logo
+            content.append(Spacer(1, 0.5*cm))
+        
+        # Aggiungi il titolo (prime due linee) con stile speciale
+        content.append(Paragraph(self.titolo, self.title_style))
+        content.append(Paragraph(self.sottotitolo, self.normal_style))
+        content.append(Spacer(1, 0.5*cm))
+        return content
+    
+    def firma_flowables(self):
+        """
+        Restituisce la firma dell'attestato, se disponibile
+        """
+        if not self.firma:
+            return []
+        # Aggiungi spazio prima della firma
+        return [Spacer(1, 1*cm), self._image_flowable(self.firma)]
+    
+    def build_content(self, data):
+        """
+        Costruisce i flowable dell'attestato per una riga
+        
+        Args:
+            data (dict | AttestatoRecord): Dati per il PDF (dizionario o record di utils.records)
+            
+        Returns:
+            list: Flowable da passare a SimpleDocTemplate.build()
+        """
+        testo_formattato = self.format_testo(data)
+        return self.header_flowables() + self.paragraphs(testo_formattato) + self.firma_flowables()
+    
+    def render_bytes(self, data):
+        """
+        Genera il PDF di attestato per una riga in memoria
+        
+        Args:
+            data (dict | AttestatoRecord): Dati per il PDF (dizionario o record di utils.records)
+            
+        Returns:
+            bytes: Contenuto del PDF o None in caso di errore
+        """
+        try:
+            buffer = io.BytesIO()
+            
+            # Crea il documento PDF
+            doc = SimpleDocTemplate(buffer, pagesize=A4, 
+                                    rightMargin=2*cm, leftMargin=2*cm, 
+                                    topMargin=2*cm, bottomMargin=2*cm)
+            
+            # Genera il PDF
+            doc.build(self.build_content(data))
+            
+            return buffer.getvalue()
+            
+        except Exception as e:
+            print(f"Errore nella generazione del PDF: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return None
+    
+    def render(self, data, output_dir="output"):
+        """
+        Genera il PDF di attestato per una riga e lo salva su disco
+        
+        Args:
+            data (dict | AttestatoRecord): Dati per il PDF (dizionario o record di utils.records)
+            output_dir (str, optional): Directory di output. Default a "output".
+            
+        Returns:
+            str: Percorso del file PDF generato o None in caso di errore
+        """
+        pdf_bytes = self.render_bytes(data)
+        if pdf_bytes is None:
+            return None
+        return save_pdf(pdf_bytes, pdf_file_name(data), output_dir)
+
+def pdf_file_name(data):
+    """
+    Restituisce il nome del file PDF di un attestato, basato sul nome e cognome e la data
+    
+    Args:
+        data (dict | AttestatoRecord): Dati per il PDF (dizionario o record di utils.records)
         
+    Returns:
+        str: Nome del file PDF
+    """
+    return f"attestato_{data['nome_cognome'].replace(' ', '_')}_{data['data'].replace('/', '-')}.pdf"
+
+def save_pdf(pdf_bytes, file_name, output_dir="output"):
+    """
+    Salva su disco un PDF generato in memoria
+    
+    Args:
+        pdf_bytes (bytes): Contenuto del PDF
+        file_name (str): Nome del file
+        output_dir (str, optional): Directory di output. Default a "output".
+        
+    Returns:
+        str: Percorso del file PDF salvato o None in caso di errore
+    """
+    try:
+        # Assicurati che la directory di output esista
+        os.makedirs(output_dir, exist_ok=True)
+        file_path = os.path.join(output_dir, file_name)
+        with open(file_path, "wb") as pdf_file:
+            pdf_file.write(pdf_bytes)
         return file_path
+    except Exception as e:
+        print(f"Errore nel salvataggio del PDF: {str(e)}")
+        return None
+
+def generate_pdf(data, logo_path=None, firma_path=None, output_dir="output", modello="presenza"):
+    """
+    Genera un PDF di attestato di presenza basato sui dati forniti
+    
+    Per generare molti attestati con le stesse impostazioni è preferibile creare
+    un PdfRenderer e chiamarne render() per ogni riga.
+    
+    Args:
+        data (dict | AttestatoRecord): Dati per il PDF (dizionario o record di utils.records)
+        logo_path (str, optional): Percorso del logo. Default a None.
+        firma_path (str, optional): Percorso dell'immagine della firma. Default a None.
+        output_dir (str, optional): Directory di output; se None il PDF viene generato
+            solo in memoria e ne vengono restituiti i byte. Default a "output".
+        modello (str, optional): Tipo di modello da utilizzare ('presenza', 'telematico', 'personalizzato'). Default a "presenza".
         
+    Returns:
+        str: Percorso del file PDF generato (bytes se output_dir è None) o None in caso di errore
+    """
+    try:
+        renderer = PdfRenderer(modello, logo_path, firma_path)
     except Exception as e:
         print(f"Errore nella generazione del PDF: {str(e)}")
-        import traceback
-        traceback.print_exc()
         return None
+    if output_dir is None:
+        return renderer.render_bytes(data)
+    return renderer.render(data, output_dir)
+
+# Larghezza utile della pagina: A4 meno i margini di 2 cm e il padding predefinito (6 pt) del frame
+FRAME_WIDTH = A4[0] - 4*cm - 12
+
+class _CachedImage:
+    """
+    XObject di un'immagine caricato e compresso una sola volta e registrato
+    in ogni documento che lo utilizza, come farebbe Canvas.drawImage().
+    """
+    
+    def __init__(self, image_path, mask="auto"):
+        # Stesso nome che Canvas.drawImage() assegna a un'immagine indicata per percorso
+        self.name = _digester(f"{image_path}{mask}".encode('utf-8'))
+        self.xobject = pdfdoc.PDFImageXObject(self.name, image_path, mask=mask)
+        self.xobject.name = self.name
+    
+    def register(self, canv):
+        """
+        Registra l'immagine nel documento del canvas se non è già presente
+        """
+        doc = canv._doc
+        reg_name = doc.getXObjectName(self.name)
+        if doc.idToObject.get(reg_name) is not None:
+            return
+        
+        image = copy.copy(self.xobject)
+        canv._setXObjects(image)
+        doc.Reference(image, reg_name)
+        doc.addForm(self.name, image)
+        
+        # Maschera di trasparenza delle immagini con canale alfa
+        smask = getattr(self.xobject, '_smask', None)
+        if smask:
+            del image._smask
+            mask_reg_name = doc.getXObjectName(smask.name)
+            if doc.idToObject.get(mask_reg_name) is None:
+                mask_image = copy.copy(smask)
+                canv._setXObjects(mask_image)
+                image.smask = doc.Reference(mask_image, mask_reg_name)
+            else:
+                image.smask = pdfdoc.PDFObjectReference(mask_reg_name)
+
+class _StaticLayer(Flowable):
+    """
+    Gruppo di flowable uguale per tutte le righe del lotto, disegnato una volta
+    come Form XObject e poi richiamato con doForm().
+    """
+    
+    def __init__(self, name, flowables, images):
+        Flowable.__init__(self)
+        self.name = name
+        self.flowables = flowables
+        self.images = images
+        self.width = FRAME_WIDTH
+        self.spaceBefore = flowables[0].getSpaceBefore()
+        self.spaceAfter = flowables[-1].getSpaceAfter()
+        
+        # Misura l'altezza del gruppo impilandolo in un frame come farebbe SimpleDocTemplate
+        canv = Canvas(io.BytesIO(), pagesize=A4)
+        frame_height = A4[1]
+        frame = self._layout_frame(frame_height)
+        self._add_flowables(frame, canv)
+        self.height = frame_height - frame._y - self.spaceAfter
+    
+    def _layout_frame(self, height):
+        return Frame(0, 0, self.width, height,
+                     leftPadding=0, bottomPadding=0, rightPadding=0, topPadding=0)
+    
+    def _add_flowables(self, frame, canv):
+        for image in self.images:
+            image.register(canv)
+        for flowable in self.flowables:
+            frame.add(flowable, canv)
+    
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+    
+    def draw(self):
+        canv = self.canv
+        # Il form viene definito alla prima occorrenza nel documento e poi riutilizzato
+        if not canv.hasForm(self.name):
+            canv.beginForm(self.name)
+            self._add_flowables(self._layout_frame(self.height), canv)
+            canv.endForm()
+        canv.doForm(self.name)
+
+class StaticLayerPdfRenderer(PdfRenderer):
+    """
+    Variante di PdfRenderer che disegna una sola volta la parte fissa dell'attestato.
+    
+    Logo, titolo, le righe del modello senza dati della riga (es. "VISTO") e la firma
+    vengono impaginati alla creazione del renderer e inseriti nel PDF come Form XObject;
+    le immagini vengono compresse una sola volta per l'intero lotto. Per ogni riga
+    viene impaginato solo il paragrafo con i dati variabili. Il risultato visivo è lo
+    stesso di PdfRenderer (vedi tests/test_pdf_generator.py).
+    
+    Il vantaggio è solo per render_document, dove la parte fissa compare una sola
+    volta nel file: un PDF con un solo attestato è invece più grande di quello di
+    PdfRenderer, perché contiene anche la definizione dei form. Per i file di una
+    sola riga (allegati email, PDF salvati) va usato PdfRenderer.
+    
+    Registra immagini e form direttamente nel documento del canvas (canv._doc,
+    canv._setXObjects): dipende da dettagli interni di reportlab, verificati dai test.
+    """
+    
+    def __init__(self, modello="presenza", logo_path=None, firma_path=None, testo_modello=None):
+        PdfRenderer.__init__(self, modello, logo_path, firma_path, testo_modello)
+        
+        images = {}
+        for image_info in (self.logo, self.firma):
+            if image_info:
+                images[image_info[0]] = _CachedImage(image_info[0])
+        
+        # La data di rilascio è la stessa per tutto il lotto
+        self.data_rilascio = datetime.now().strftime("%d/%m/%Y")
+        
+        # Le righe del modello prima e dopo il blocco con i dati della riga sono fisse
+        testo_iniziale = self._format_static(self.template.righe_iniziali)
+        testo_finale = self._format_static(self.template.righe_finali)
+        
+        header = self.header_flowables() + testo_iniziale
+        footer = testo_finale + self.firma_flowables()
+        layer_id = f"attestato_{id(self):x}"
+        self.header_layer = self._static_layer(f"{layer_id}_intestazione", header, images)
+        self.footer_layer = self._static_layer(f"{layer_id}_chiusura", footer, images)
+    
+    def _format_static(self, linee):
+        """
+        Formatta le righe fisse del modello con i valori comuni a tutto il lotto
+        """
+        if not linee:
+            return []
+        testo = '\n'.join(linee).format(
+            data_rilascio=self.data_rilascio,
+            universita=config.UNIVERSITA,
+            direttore_cafis=config.DIRETTORE_CAFIS
+        )
+        return self.paragraphs(testo)
+    
+    def _image_flowable(self, image_info):
+        image = PdfRenderer._image_flowable(image_info)
+        # Disegna per percorso, così il canvas riusa l'XObject già registrato
+        image._img = None
+        return image
+    
+    @staticmethod
+    def _static_layer(name, flowables, images):
+        if not flowables:
+            return None
+        used_images = [images[f.filename] for f in flowables if isinstance(f, Image)]
+        return _StaticLayer(name, flowables, used_images)
+    
+    def build_content(self, data):
+        """
+        Costruisce i flowable dell'attestato per una riga
+        
+        Args:
+            data (dict | AttestatoRecord): Dati per il PDF (dizionario o record di utils.records)
+            
+        Returns:
+            list: Flowable da passare a SimpleDocTemplate.build()
+        """
+        content = []
+        if self.header_layer:
+            content.append(self.header_layer)
+        if self.template.ha_righe_variabili:
+            content.extend(self.paragraphs(self.format_testo(data, True, self.data_rilascio)))
+        if self.footer_layer:
+            content.append(self.footer_layer)
+        return content
+    
+    def render_document(self, rows, output_path):
+        """
+        Genera un unico PDF con un attestato per pagina
+        
+        La parte fissa e le immagini compaiono una sola volta nel file e sono
+        richiamate da ogni pagina.
+        
+        Args:
+            rows (list): Lista di dizionari con i dati dei PDF
+            output_path (str): Percorso del file PDF da creare
+            
+        Returns:
+            str: Percorso del file PDF generato o None in caso di errore
+        """
+        try:
+            output_dir = os.path.dirname(output_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            
+            content = []
+            for i, data in enumerate(rows):
+                if i > 0:
+                    content.append(PageBreak())
+                content.extend(self.build_content(data))
+            
+            doc = SimpleDocTemplate(output_path, pagesize=A4,
+                                    rightMargin=2*cm, leftMargin=2*cm,
+                                    topMargin=2*cm, bottomMargin=2*cm)
+            doc.build(content)
+            return output_path
+        except Exception as e:
+            print(f"Errore nella generazione del PDF: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+# Valori di configurazione modificabili a runtime dall'interfaccia (modelli di testo,
+# direttore) che devono essere replicati nei processi di lavoro del pool
+_CONFIG_SNAPSHOT_KEYS = [
+    'ATTESTATO_PRESENZA', 'ATTESTATO_TELEMATICO', 'ATTESTATO_PERSONALIZZATO',
+    'DIRETTORE_CAFIS', 'UNIVERSITA'
+]
+
+def _config_snapshot():
+    """
+    Cattura i valori correnti di configurazione da trasmettere ai processi di lavoro
+    
+    Returns:
+        dict: Valori di configurazione correnti
+    """
+    return {key: getattr(config, key) for key in _CONFIG_SNAPSHOT_KEYS if hasattr(config, key)}
+
+def _init_worker(snapshot):
+    """
+    Inizializza un processo di lavoro applicando la configurazione del processo principale
+    
+    Args:
+        snapshot (dict): Valori di configurazione catturati con _config_snapshot()
+    """
+    for key, value in snapshot.items():
+        setattr(config, key, value)
+
+# Renderer del processo di lavoro corrente, riutilizzati tra i blocchi dello stesso lotto
+_worker_renderers = {}
+
+def _render_chunk(chunk, logo_path, firma_path, output_dir, modello):
+    """
+    Genera in un processo di lavoro i PDF di un blocco di righe
+    
+    Args:
+        chunk (list): Lista di coppie (indice, dati) da elaborare
+        
+    Returns:
+        list: Lista di coppie (indice, percorso del PDF o None)
+    """
+    key = (modello, logo_path, firma_path)
+    renderer = _worker_renderers.get(key)
+    if renderer is None:
+        renderer = _worker_renderers[key] = PdfRenderer(modello, logo_path, firma_path)
+    return [(index, renderer.render(data, output_dir)) for index, data in chunk]
+
+def _default_mp_context():
+    """
+    Restituisce il contesto multiprocessing predefinito per il pool di generazione
+    
+    Returns:
+        multiprocessing.context.BaseContext: Contesto forkserver se disponibile, altrimenti spawn
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+def generate_pdfs_batch(rows, logo_path=None, firma_path=None, output_dir="output", modello="presenza",
+                        max_workers=None, chunk_size=1, timeout=None, ordered=True, mp_context=None):
+    """
+    Genera i PDF di un intero lotto di righe distribuendo il lavoro su un pool di processi
+    
+    Ogni processo usa un PdfRenderer equivalente a generate_pdf(), quindi i PDF prodotti
+    sono identici a quelli della generazione sequenziale.
+    
+    Al pool viene affidato al più un blocco per processo, con una scadenza calcolata
+    dal momento dell'invio (timeout per ogni riga del blocco). Quando un blocco scade
+    il pool viene terminato, così il processo bloccato non resta attivo, e i blocchi
+    ancora in corso ripartono su un nuovo pool.
+    
+    Args:
+        rows (iterable): Dizionari o AttestatoRecord con i dati dei PDF (come per generate_pdf); possono essere
+            prodotti in modo pigro (es. durante la lettura a blocchi del file Excel)
+        logo_path (str, optional): Percorso del logo. Default a None.
+        firma_path (str, optional): Percorso dell'immagine della firma. Default a None.
+        output_dir (str, optional): Directory di output. Default a "output".
+        modello (str, optional): Tipo di modello da utilizzare. Default a "presenza".
+        max_workers (int, optional): Numero di processi. Default al numero di CPU.
+        chunk_size (int, optional): Numero di righe assegnate a ogni processo per volta. Default a 1.
+        timeout (float, optional): Secondi massimi per riga; le righe oltre il limite
+            vengono restituite con percorso None. Default a None (nessun limite).
+        ordered (bool, optional): Se True restituisce i risultati nell'ordine delle righe,
+            altrimenti appena disponibili. Default a True.
+        mp_context (multiprocessing.context.BaseContext, optional): Contesto multiprocessing.
+            Default a None (forkserver dove disponibile, altrimenti spawn).
+        
+    Yields:
+        tuple: (indice della riga, percorso del PDF generato o None in caso di errore)
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = max(1, int(chunk_size))
+    
+    # Le righe vengono lette solo quando servono: basta conoscere le prime per scegliere la modalità
+    rows = iter(rows)
+    head = list(itertools.islice(rows, chunk_size + 1))
+    if not head:
+        return
+    
+    # Con un solo processo o poche righe il pool costa più di quanto fa risparmiare;
+    # con un limite di tempo serve invece sempre un processo separato da poter terminare
+    if not timeout and (max_workers <= 1 or len(head) <= chunk_size):
+        renderer = PdfRenderer(modello, logo_path, firma_path)
+        for index, data in enumerate(itertools.chain(head, rows)):
+            yield index, renderer.render(data, output_dir)
+        return
+    
+    # Suddivide le righe in blocchi mantenendo l'indice originale
+    indexed_rows = enumerate(itertools.chain(head, rows))
+    chunks = iter(lambda: list(itertools.islice(indexed_rows, chunk_size)), [])
+    # I lotti partono da un thread di un processo con più thread (JobRunner, Streamlit):
+    # con fork i processi ereditano anche i lock tenuti dagli altri thread e possono
+    # bloccarsi. La configurazione arriva comunque ai processi tramite _init_worker.
+    context = mp_context or _default_mp_context()
+    
+    def new_pool():
+        return context.Pool(processes=max_workers, initializer=_init_worker, initargs=(_config_snapshot(),))
+    
+    pool = new_pool()
+    try:
+        # Esiti dei blocchi: (identificativo, risultati, errore), inseriti dal thread dei risultati del pool
+        esiti = queue.Queue()
+        pending = {}
+        retry = collections.deque()
+        completed = {}
+        task_ids = itertools.count()
+        next_index = 0
+        
+        def submit_chunks():
+            # Un blocco per processo: il tempo trascorso dall'invio è tempo di generazione
+            while len(pending) < max_workers:
+                chunk = retry.popleft() if retry else next(chunks, None)
+                if chunk is None:
+                    return
+                task_id = next(task_ids)
+                deadline = time.monotonic() + timeout * len(chunk) if timeout else None
+                pending[task_id] = (chunk, deadline)
+                pool.apply_async(
+                    _render_chunk, (chunk, logo_path, firma_path, output_dir, modello),
+                    callback=lambda results, task_id=task_id: esiti.put((task_id, results, None)),
+                    error_callback=lambda error, task_id=task_id: esiti.put((task_id, None, error))
+                )
+        
+        def record(task_id, results, error):
+            if task_id not in pending:
+                return
+            chunk, _ = pending.pop(task_id)
+            if error is not None:
+                print(f"Errore nel processo di generazione PDF: {str(error)}")
+                results = [(index, None) for index, _ in chunk]
+            for index, pdf_path in results:
+                completed[index] = pdf_path
+        
+        submit_chunks()
+        while pending:
+            deadlines = [deadline for _, deadline in pending.values() if deadline is not None]
+            wait_timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                record(*esiti.get(timeout=wait_timeout))
+            except queue.Empty:
+                # Le righe dei blocchi scaduti non vengono generate
+                now = time.monotonic()
+                for task_id, (chunk, deadline) in list(pending.items()):
+                    if deadline is not None and deadline <= now:
+                        del pending[task_id]
+                        print(f"Timeout nella generazione del PDF per le righe {chunk[0][0] + 1}-{chunk[-1][0] + 1}")
+                        for index, _ in chunk:
+                            completed[index] = None
+                # Termina il pool con i processi bloccati; i blocchi non conclusi ripartono su un nuovo pool
+                pool.terminate()
+                pool.join()
+                while not esiti.empty():
+                    record(*esiti.get_nowait())
+                retry.extend(chunk for chunk, _ in pending.values())
+                pending.clear()
+                pool = new_pool()
+            
+            # Affida al pool i blocchi successivi prima di restituire i risultati
+            submit_chunks()
+            
+            # Restituisce i risultati disponibili
+            if ordered:
+                while next_index in completed:
+                    yield next_index, completed.pop(next_index)
+                    next_index += 1
+            else:
+                for index in list(completed):
+                    yield index, completed.pop(index)
+    finally:
+        # Non attende i processi eventualmente bloccati
+        pool.terminate()
+        pool.join()
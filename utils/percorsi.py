@@ -0,0 +1,81 @@
+"""
+Registro dei percorsi formativi.
+
+Ogni percorso ha un codice canonico, una descrizione completa per gli attestati
+e l'elenco delle grafie accettate nei file Excel. Le grafie sono indicizzate
+una sola volta in forma normalizzata, così la ricerca è una lettura di dizionario.
+"""
+import re
+from functools import lru_cache
+
+# Codice canonico -> descrizione completa riportata negli attestati
+PERCORSI = {
+    'PEF60': "PeF60 CFU (allegato 1 al DPCM 4 agosto 2023)",
+    'PEF30_ALL2': "PeF30 CFU all.2 (allegato 2 al DPCM 4 agosto 2023)",
+    'PEF36_ALL5': "PeF36 CFU (allegato 5 al DPCM 4 agosto 2023)",
+    'PEF30_ART13': "PeF30 CFU all.2 (art. 13 del DPCM 4 agosto 2023)",
+}
+
+# Codice canonico -> grafie accettate nel file Excel
+VARIANTI_PERCORSI = {
+    'PEF60': ['PeF60 CFU', 'PeF 60'],
+    'PEF30_ALL2': ['PeF30 CFU all.2', 'PeF 30 all.2'],
+    'PEF36_ALL5': ['PeF36 CFU', 'PeF36 CFU all.5', 'PeF36 CFU (all.5)', 'PeF 36'],
+    'PEF30_ART13': ['PeF30 CFU (art. 13)', 'PeF30 CFU all.2 art. 13', 'PeF 30 art. 13'],
+}
+
+# Codici nell'ordine usato per le categorie della colonna 'codice_percorso'
+CODICI_PERCORSO = list(PERCORSI)
+
+# Grafie mostrate all'utente come valori ammessi
+PERCORSI_VALIDI = [varianti[0] for varianti in VARIANTI_PERCORSI.values()]
+
+_SPAZI = re.compile(r'\s+')
+
+def normalize_percorso(p):
+    """
+    Riduce una grafia del percorso alla forma usata come chiave dell'indice
+
+    Args:
+        p: Valore della colonna tipo_percorso
+
+    Returns:
+        str: Percorso normalizzato
+    """
+    p = str(p).strip()
+    p = p.replace("(", "").replace(")", "")  # Rimuovi parentesi
+    p = p.replace("all.", "allegato")        # Standardizza abbreviazioni
+    p = p.replace("art.", "articolo")        # Standardizza abbreviazioni
+    return _SPAZI.sub(' ', p).strip().casefold()
+
+# Indice grafia normalizzata -> codice canonico
+_INDICE_PERCORSI = {
+    normalize_percorso(variante): codice
+    for codice, varianti in VARIANTI_PERCORSI.items()
+    for variante in varianti
+}
+
+@lru_cache(maxsize=256)
+def codice_percorso(tipo_percorso):
+    """
+    Restituisce il codice canonico di un percorso formativo
+
+    Args:
+        tipo_percorso (str): Percorso formativo indicato nel file Excel
+
+    Returns:
+        str: Codice canonico oppure None se il percorso non è riconosciuto
+    """
+    return _INDICE_PERCORSI.get(normalize_percorso(tipo_percorso))
+
+def descrizione_percorso(codice):
+    """
+    Restituisce la descrizione completa associata a un codice canonico
+
+    Args:
+        codice (str): Codice canonico del percorso
+
+    Returns:
+        str: Descrizione completa oppure None se il codice non esiste
+    """
+    return PERCORSI.get(codice)
@@ -0,0 +1,291 @@
+"""
+Pipeline a stadi per generare e inviare gli attestati di un lotto.
+
+Generando il PDF di ogni messaggio solo quando l'invio lo richiede, la CPU resta
+ferma mentre si attende il server SMTP e la rete resta ferma mentre reportlab
+genera il PDF. Qui ogni fase ha un proprio thread:
+
+    validazione -> generazione PDF -> costruzione MIME -> invio
+
+collegati da code di dimensione limitata. La generazione procede in anticipo
+sull'invio di al più `render_ahead` messaggi: quando la coda è piena lo stadio
+si ferma finché l'invio non ne libera un posto, così la memoria occupata dai PDF
+non cresce con la dimensione del lotto. Per ogni stadio vengono misurati il
+tempo di lavoro e le attese, da cui si ricava l'utilizzo.
+"""
+import time
+import queue
+import threading
+
+import config
+from utils.email_sender import SmtpConnectionPool, build_message
+from utils.email_dispatcher import dispatch_emails, MESSAGE_FIELDS
+
+# Segnale di fine inviato da uno stadio al successivo
+_FINE = object()
+
+# Intervallo (secondi) con cui gli stadi in attesa verificano se la pipeline è stata fermata
+_POLL = 0.1
+
+# Stadi nell'ordine di esecuzione
+STAGES = ('validazione', 'generazione', 'mime', 'invio')
+
+class StageStats:
+    """
+    Tempi di uno stadio della pipeline.
+
+    occupato è il tempo di lavoro, attesa_input il tempo passato ad aspettare
+    elementi dallo stadio precedente e attesa_output quello passato ad aspettare
+    posto nella coda dello stadio successivo (contropressione).
+    """
+
+    def __init__(self, name, workers=1):
+        """
+        Args:
+            name (str): Nome dello stadio
+            workers (int, optional): Elementi elaborati in parallelo dallo stadio. Default a 1.
+        """
+        self.name = name
+        self.workers = workers
+        self.elementi = 0
+        self.occupato = 0.0
+        self.attesa_input = 0.0
+        self.attesa_output = 0.0
+
+    def utilizzo(self, elapsed):
+        """
+        Frazione del tempo in cui lo stadio ha lavorato
+
+        Args:
+            elapsed (float): Durata totale della pipeline in secondi
+
+        Returns:
+            float: Utilizzo tra 0 e 1
+        """
+        if elapsed <= 0:
+            return 0.0
+        return min(1.0, self.occupato / (elapsed * self.workers))
+
+    def as_dict(self, elapsed):
+        return {
+            'elementi': self.elementi,
+            'occupato': self.occupato,
+            'attesa_input': self.attesa_input,
+            'attesa_output': self.attesa_output,
+            'utilizzo': self.utilizzo(elapsed),
+        }
+
+class AttestatoPipeline:
+    """
+    Genera e invia le email di un lotto con gli stadi eseguiti in parallelo.
+
+    Gli elementi sono dizionari con la chiave 'id'. La funzione render riceve un
+    elemento valido e restituisce (True, messaggio) con la chiave 'id' e i campi di
+    MESSAGE_FIELDS, oppure (False, messaggio di errore). Gli elementi scartati da
+    validate o render, o il cui messaggio non può essere costruito, vengono
+    segnalati con on_error(id, errore) e non proseguono.
+
+    Utilizzo:
+        pipeline = AttestatoPipeline(render, on_error=segnala, on_result=esito)
+        stats = pipeline.run(elementi)
+    """
+
+    def __init__(self, render, validate=None, on_error=None, on_send=None, on_result=None, on_retry=None,
+                 render_ahead=None, concurrency=None, limiter=None, retry_policy=None, pool=None):
+        """
+        Args:
+            render (callable): Funzione che genera il messaggio di un elemento, vedi sopra
+            validate (callable, optional): Funzione che restituisce None per un elemento valido, altrimenti il messaggio di errore. Default a None.
+            on_error (callable, optional): Funzione chiamata con (id, errore) per gli elementi scartati prima dell'invio. Default a None.
+            on_send (callable, optional): Funzione chiamata con il messaggio appena prima che entri nella finestra di invio. Default a None.
+            on_result (callable, optional): Funzione chiamata con (id, successo, errore, codice SMTP) per ogni invio. Default a None.
+            on_retry (callable, optional): Funzione chiamata con (id, errore, codice SMTP, secondi di attesa) per ogni ripetizione. Default a None.
+            render_ahead (int, optional): Messaggi generati in anticipo sull'invio. Default a config.PIPELINE_RENDER_AHEAD.
+            concurrency (int, optional): Numero di sessioni SMTP usate in parallelo. Default a config.SMTP_CONCURRENCY.
+            limiter (AdaptiveRateLimiter, optional): Limitatore della velocità di invio. Default a None.
+            retry_policy (RetryPolicy, optional): Politica di ripetizione degli errori temporanei. Default a None.
+            pool (SmtpConnectionPool, optional): Pool di sessioni da usare; se None ne viene creato uno per ogni run. Default a None.
+        """
+        self.render = render
+        self.validate = validate
+        self.on_error = on_error
+        self.on_send = on_send
+        self.on_result = on_result
+        self.on_retry = on_retry
+        self.render_ahead = max(1, render_ahead or config.PIPELINE_RENDER_AHEAD)
+        self.concurrency = max(1, concurrency or config.SMTP_CONCURRENCY)
+        self.limiter = limiter
+        self.retry_policy = retry_policy
+        self.pool = pool
+        self.elapsed = 0.0
+        self.stats = {}
+
+    def _get(self, source, stats):
+        """
+        Prende il prossimo elemento dalla coda, oppure _FINE se la pipeline è stata fermata
+        """
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return source.get(timeout=_POLL)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        return _FINE
+        finally:
+            stats.attesa_input += time.perf_counter() - start
+
+    def _put(self, target, item, stats):
+        """
+        Mette un elemento nella coda appena c'è posto
+
+        Returns:
+            bool: False se la pipeline è stata fermata prima di trovare posto
+        """
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    target.put(item, timeout=_POLL)
+                    return True
+                except queue.Full:
+                    if self._stop.is_set():
+                        return False
+        finally:
+            stats.attesa_output += time.perf_counter() - start
+
+    def _discard(self, item, error):
+        if self.on_error:
+            self.on_error(item.get('id'), error)
+
+    def _run_stage(self, stats, work, target, source=None, items=None):
+        """
+        Corpo del thread di uno stadio: elabora gli elementi della coda source (o dell'iterabile items)
+        e mette nella coda target quelli per cui work non restituisce None
+        """
+        try:
+            if items is not None:
+                items = iter(items)
+            while not self._stop.is_set():
+                if items is not None:
+                    start = time.perf_counter()
+                    item = next(items, _FINE)
+                    stats.occupato += time.perf_counter() - start
+                else:
+                    item = self._get(source, stats)
+                if item is _FINE:
+                    break
+                start = time.perf_counter()
+                result = work(item)
+                stats.occupato += time.perf_counter() - start
+                stats.elementi += 1
+                if result is not None and not self._put(target, result, stats):
+                    break
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            self._put(target, _FINE, stats)
+
+    def _validate(self, item):
+        error = self.validate(item) if self.validate is not None else None
+        if error is not None:
+            self._discard(item, error)
+            return None
+        return item
+
+    def _render(self, item):
+        success, message = self.render(item)
+        if not success:
+            self._discard(item, message)
+            return None
+        return message
+
+    def _build(self, message):
+        try:
+            mime = build_message(**{campo: message[campo] for campo in MESSAGE_FIELDS if campo in message})
+        except Exception as e:
+            self._discard(message, f"Errore nella preparazione dell'email: {str(e)}")
+            return None
+        # Il PDF resta solo nel messaggio MIME: i byte originali possono essere rilasciati
+        return {'id': message.get('id'), 'mime': mime}
+
+    def _messages(self, source, stats):
+        """
+        Messaggi pronti per l'invio, letti dall'ultima coda man mano che il dispatcher ne chiede
+        """
+        while True:
+            message = self._get(source, stats)
+            if message is _FINE:
+                return
+            stats.elementi += 1
+            if self.on_send:
+                self.on_send(message)
+            yield message
+
+    def run(self, items):
+        """
+        Elabora e invia tutti gli elementi
+
+        Args:
+            items (iterable): Elementi del lotto, letti dallo stadio di validazione man mano che c'è posto
+
+        Returns:
+            dict: Per ogni stadio, elementi elaborati, secondi di lavoro e di attesa e utilizzo (vedi StageStats)
+
+        Raises:
+            Exception: Il primo errore non gestito di uno stadio
+        """
+        self._stop = threading.Event()
+        self._errors = []
+        stats = {
+            name: StageStats(name, self.concurrency if name == 'invio' else 1)
+            for name in STAGES
+        }
+        validi = queue.Queue(maxsize=self.render_ahead)
+        generati = queue.Queue(maxsize=self.render_ahead)
+        pronti = queue.Queue(maxsize=1)
+        threads = [
+            threading.Thread(target=self._run_stage, name="pipeline-validazione",
+                             args=(stats['validazione'], self._validate, validi), kwargs={'items': items}),
+            threading.Thread(target=self._run_stage, name="pipeline-generazione",
+                             args=(stats['generazione'], self._render, generati, validi)),
+            threading.Thread(target=self._run_stage, name="pipeline-mime",
+                             args=(stats['mime'], self._build, pronti, generati)),
+        ]
+        pool = self.pool if self.pool is not None else SmtpConnectionPool(size=self.concurrency)
+        tempo_invio = pool.stats['tempo_invio']
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            # L'invio avviene nel thread chiamante, sulle sessioni del pool
+            dispatch_emails(
+                self._messages(pronti, stats['invio']), concurrency=self.concurrency, pool=pool,
+                on_result=self.on_result, limiter=self.limiter, retry_policy=self.retry_policy,
+                on_retry=self.on_retry
+            )
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            if self.pool is None:
+                pool.close()
+            self.elapsed = time.perf_counter() - start
+            stats['invio'].occupato = pool.stats['tempo_invio'] - tempo_invio
+        if self._errors:
+            raise self._errors[0]
+        self.stats = {name: stage.as_dict(self.elapsed) for name, stage in stats.items()}
+        return self.stats
+
+def format_stage_report(stats):
+    """
+    Descrive in una riga l'utilizzo degli stadi di una pipeline
+
+    Args:
+        stats (dict): Risultato di AttestatoPipeline.run
+
+    Returns:
+        str: Es. "validazione 1%, generazione 87%, mime 4%, invio 62%"
+    """
+    return ", ".join(f"{name} {stage['utilizzo']:.0%}" for name, stage in stats.items())
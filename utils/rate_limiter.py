@@ -0,0 +1,125 @@
+"""
+Limitatore di velocità a token bucket per l'invio delle email.
+
+La velocità è espressa in messaggi al minuto. Quando il server segnala un
+sovraccarico (es. risposte 421, 451 o codici estesi 4.7.x) la velocità viene
+ridotta subito e poi riportata gradualmente al valore configurato man mano che
+gli invii tornano a riuscire.
+"""
+import time
+import threading
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket con riduzione moltiplicativa e recupero graduale della velocità.
+
+    Utilizzo sincrono:
+        limiter = AdaptiveRateLimiter(30)
+        limiter.acquire()          # attende il proprio turno
+        ...invio...
+        limiter.report(throttled=False)
+
+    Per l'uso con asyncio, try_acquire() non blocca e restituisce i secondi da attendere.
+    """
+
+    def __init__(self, messages_per_minute, burst=1, min_messages_per_minute=None,
+                 backoff_factor=0.5, recovery_after=10, recovery_step=None, clock=time.monotonic):
+        """
+        Args:
+            messages_per_minute (float): Velocità massima in messaggi al minuto
+            burst (int, optional): Messaggi inviabili di seguito senza attesa. Default a 1.
+            min_messages_per_minute (float, optional): Velocità minima dopo i rallentamenti. Default a un decimo della massima (almeno 1).
+            backoff_factor (float, optional): Fattore applicato alla velocità a ogni segnalazione di sovraccarico. Default a 0.5.
+            recovery_after (int, optional): Invii riusciti consecutivi necessari per aumentare la velocità. Default a 10.
+            recovery_step (float, optional): Aumento in messaggi al minuto a ogni recupero. Default a un decimo della massima.
+            clock (callable, optional): Orologio monotono in secondi. Default a time.monotonic.
+        """
+        if messages_per_minute <= 0:
+            raise ValueError("La velocità deve essere maggiore di zero")
+        self.max_rate = messages_per_minute / 60
+        self.min_rate = min(self.max_rate, (min_messages_per_minute or max(1, messages_per_minute / 10)) / 60)
+        self.rate = self.max_rate
+        self.capacity = max(1, burst)
+        self.backoff_factor = backoff_factor
+        self.recovery_after = recovery_after
+        self.recovery_step = (recovery_step or messages_per_minute / 10) / 60
+        self.clock = clock
+
+        self.tokens = float(self.capacity)
+        self.updated = clock()
+        self.successi_consecutivi = 0
+        self._lock = threading.Lock()
+        self.stats = {'attese': 0, 'secondi_attesa': 0.0, 'rallentamenti': 0, 'recuperi': 0}
+
+    @property
+    def messages_per_minute(self):
+        """
+        Velocità corrente in messaggi al minuto
+        """
+        return self.rate * 60
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """
+        Prova a prendere un token senza attendere
+
+        Returns:
+            float: 0 se il token è stato preso, altrimenti i secondi da attendere prima di riprovare
+        """
+        with self._lock:
+            self._refill(self.clock())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Attende finché non è disponibile un token e lo prende
+
+        Returns:
+            float: Secondi trascorsi in attesa
+        """
+        atteso = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+            atteso += wait
+        if atteso:
+            self.record_wait(atteso)
+        return atteso
+
+    def record_wait(self, seconds):
+        """
+        Registra un'attesa nelle statistiche
+        """
+        with self._lock:
+            self.stats['attese'] += 1
+            self.stats['secondi_attesa'] += seconds
+
+    def report(self, throttled=False):
+        """
+        Comunica l'esito di un invio per adattare la velocità
+
+        Args:
+            throttled (bool, optional): True se il server ha segnalato un sovraccarico. Default a False.
+        """
+        with self._lock:
+            self._refill(self.clock())
+            if throttled:
+                # Rallenta subito e svuota il bucket, così il prossimo invio attende un intero intervallo
+                self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+                self.tokens = min(self.tokens, 0.0)
+                self.successi_consecutivi = 0
+                self.stats['rallentamenti'] += 1
+            elif self.rate < self.max_rate:
+                self.successi_consecutivi += 1
+                if self.successi_consecutivi >= self.recovery_after:
+                    self.rate = min(self.max_rate, self.rate + self.recovery_step)
+                    self.successi_consecutivi = 0
+                    self.stats['recuperi'] += 1
@@ -0,0 +1,87 @@
+"""
+Righe del dataset come record compatti per la generazione degli attestati.
+
+Estrarre una riga con df.iloc[i] crea ogni volta una pd.Series; per un lotto
+intero le righe vengono invece convertite una sola volta, colonna per colonna,
+in oggetti AttestatoRecord con __slots__, che occupano poca memoria, si passano
+ai processi di generazione dei PDF e si leggono sia come attributi sia come
+dizionario (record['nome_cognome'], record.get('aula')), come le righe usate in
+precedenza da generate_pdf e prepare_attestato.
+"""
+from utils.excel_reader import COLONNE_RICHIESTE
+
+# Campi di un record: le colonne del file Excel e il codice canonico del percorso
+CAMPI_RECORD = tuple(COLONNE_RICHIESTE) + ('codice_percorso',)
+
+class AttestatoRecord:
+    """
+    Dati dell'attestato di una riga del file.
+
+    Utilizzo:
+        record = AttestatoRecord.from_mapping({'nome_cognome': 'Mario Rossi', ...})
+        record.nome_cognome == record['nome_cognome']
+    """
+
+    __slots__ = CAMPI_RECORD
+
+    def __init__(self, nome_cognome=None, data=None, ora_inizio=None, ora_fine=None, aula=None,
+                 dipartimento=None, indirizzo=None, tipo_lezione=None, tipo_percorso=None,
+                 classe_concorso=None, email=None, codice_percorso=None):
+        self.nome_cognome = nome_cognome
+        self.data = data
+        self.ora_inizio = ora_inizio
+        self.ora_fine = ora_fine
+        self.aula = aula
+        self.dipartimento = dipartimento
+        self.indirizzo = indirizzo
+        self.tipo_lezione = tipo_lezione
+        self.tipo_percorso = tipo_percorso
+        self.classe_concorso = classe_concorso
+        self.email = email
+        self.codice_percorso = codice_percorso
+
+    @classmethod
+    def from_mapping(cls, row):
+        """
+        Crea un record da un dizionario o da una riga del DataFrame; i campi assenti valgono None
+        """
+        return cls(*(row.get(campo) for campo in CAMPI_RECORD))
+
+    def __getitem__(self, campo):
+        if campo not in CAMPI_RECORD:
+            raise KeyError(campo)
+        return getattr(self, campo)
+
+    def get(self, campo, default=None):
+        """
+        Restituisce il valore di un campo, o default se il campo non esiste
+        """
+        return getattr(self, campo) if campo in CAMPI_RECORD else default
+
+    def keys(self):
+        return CAMPI_RECORD
+
+    def to_dict(self):
+        """
+        Restituisce i campi del record come dizionario
+        """
+        return {campo: getattr(self, campo) for campo in CAMPI_RECORD}
+
+    def __repr__(self):
+        return f"AttestatoRecord({self.nome_cognome!r}, {self.data!r})"
+
+def dataframe_records(df):
+    """
+    Converte le righe di un DataFrame in record, leggendo ogni colonna una sola volta
+
+    Args:
+        df (pd.DataFrame): DataFrame letto con read_excel_file (o un suo sottoinsieme di righe)
+
+    Returns:
+        list: Un AttestatoRecord per ogni riga, nello stesso ordine
+    """
+    colonne = [
+        df[campo].to_numpy(dtype=object) if campo in df.columns else [None] * len(df)
+        for campo in CAMPI_RECORD
+    ]
+    return [AttestatoRecord(*valori) for valori in zip(*colonne)]
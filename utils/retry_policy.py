@@ -0,0 +1,127 @@
+"""
+Politica di ripetizione degli invii email non riusciti.
+
+Gli errori vengono classificati in base al codice di risposta SMTP: le risposte
+4xx e gli errori di rete (timeout, connessione chiusa dal server) sono temporanei
+e l'invio viene ripetuto con un'attesa che cresce in modo esponenziale, con una
+componente casuale per non far ripartire tutti i messaggi nello stesso istante;
+le risposte 5xx (es. destinatario inesistente, credenziali errate) sono definitive.
+"""
+import random
+import smtplib
+import threading
+
+# Esiti della classificazione di un errore
+TRANSIENT = 'temporaneo'
+PERMANENT = 'definitivo'
+
+def classify_smtp_error(error):
+    """
+    Classifica un errore di invio come temporaneo o definitivo
+
+    Args:
+        error (Exception): Eccezione sollevata durante l'invio (None se l'errore non ha un'eccezione)
+
+    Returns:
+        str: TRANSIENT se conviene ripetere l'invio, PERMANENT altrimenti
+    """
+    if error is None:
+        # Errori di configurazione (es. credenziali mancanti)
+        return PERMANENT
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # Temporaneo se almeno un destinatario è stato rifiutato con un codice 4xx
+        codes = [code for code, _ in error.recipients.values()]
+        return TRANSIENT if any(400 <= code < 500 for code in codes) else PERMANENT
+    if isinstance(error, smtplib.SMTPResponseException):
+        # Include autenticazione, mittente rifiutato, DATA rifiutato e connessione rifiutata
+        return TRANSIENT if 400 <= error.smtp_code < 500 else PERMANENT
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return TRANSIENT
+    if isinstance(error, smtplib.SMTPException):
+        # Es. estensione non supportata dal server: ripetere non cambia l'esito
+        return PERMANENT
+    if isinstance(error, OSError):
+        # Timeout, connessione rifiutata o interrotta
+        return TRANSIENT
+    return PERMANENT
+
+class RetryPolicy:
+    """
+    Decide se e dopo quanto ripetere un invio non riuscito e ne tiene le statistiche.
+
+    L'attesa prima del tentativo n+1 è scelta a caso tra metà e l'intero valore di
+    min(max_delay, base_delay * 2^(n-1)). Una politica va usata per un solo lotto,
+    così le statistiche si riferiscono a quel lotto.
+
+    Utilizzo:
+        policy = RetryPolicy(max_attempts=4)
+        delay = policy.next_delay(errore, tentativo)
+        if delay is not None:
+            ...ripeti l'invio tra delay secondi...
+    """
+
+    def __init__(self, max_attempts=4, base_delay=5, max_delay=120, rng=random.random):
+        """
+        Args:
+            max_attempts (int, optional): Numero massimo di tentativi per messaggio, compreso il primo. Default a 4.
+            base_delay (float, optional): Attesa in secondi prima del secondo tentativo. Default a 5.
+            max_delay (float, optional): Attesa massima in secondi tra due tentativi. Default a 120.
+            rng (callable, optional): Generatore di numeri casuali in [0, 1). Default a random.random.
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng
+        self._lock = threading.Lock()
+        self.stats = {
+            'ritentativi': 0, 'secondi_attesa': 0.0, 'recuperati': 0,
+            'errori_temporanei': 0, 'errori_definitivi': 0, 'tentativi_esauriti': 0
+        }
+
+    def backoff(self, attempt):
+        """
+        Restituisce l'attesa prima del tentativo successivo
+
+        Args:
+            attempt (int): Numero del tentativo appena fallito (1 per il primo)
+
+        Returns:
+            float: Secondi di attesa
+        """
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return cap / 2 + self.rng() * cap / 2
+
+    def next_delay(self, error, attempt):
+        """
+        Registra un tentativo fallito e decide se ripeterlo
+
+        Args:
+            error (Exception): Eccezione che ha causato l'errore (None se non disponibile)
+            attempt (int): Numero del tentativo appena fallito (1 per il primo)
+
+        Returns:
+            float: Secondi da attendere prima del nuovo tentativo, oppure None se l'invio non va ripetuto
+        """
+        with self._lock:
+            if classify_smtp_error(error) == PERMANENT:
+                self.stats['errori_definitivi'] += 1
+                return None
+            self.stats['errori_temporanei'] += 1
+            if attempt >= self.max_attempts:
+                self.stats['tentativi_esauriti'] += 1
+                return None
+            delay = self.backoff(attempt)
+            self.stats['ritentativi'] += 1
+            self.stats['secondi_attesa'] += delay
+            return delay
+
+    def record_success(self, attempt):
+        """
+        Registra un invio riuscito
+
+        Args:
+            attempt (int): Numero del tentativo riuscito (1 per il primo)
+        """
+        if attempt > 1:
+            with self._lock:
+                self.stats['recuperati'] += 1
@@ -0,0 +1,143 @@
+"""
+Dataset caricato da una sessione dell'app, scaricabile su disco quando la sessione è inattiva.
+
+Ogni sessione del browser conserva il DataFrame del file caricato finché resta
+aperta, anche se l'utente non la usa più. Un SessionDataset tiene il DataFrame
+in memoria solo mentre viene usato: se non viene letto per un certo tempo il
+DataFrame viene salvato in un file Parquet e rilasciato, e viene ricaricato dal
+file alla lettura successiva. Il file viene eliminato quando la sessione termina.
+
+Il DataFrame di un file caricato è anche nella cache condivisa delle letture
+(ParsedUploadCache): quando viene scaricato su disco viene tolto anche dalla
+cache, altrimenti resterebbe in memoria e la rilettura dal file Parquet ne
+creerebbe una seconda copia.
+"""
+import os
+import time
+import uuid
+import weakref
+import threading
+
+import pandas as pd
+
+import config
+from utils.excel_reader import engine_available, upload_cache
+
+# Importa error_logger se disponibile
+try:
+    from utils.error_logger import error_logger
+except ImportError:
+    error_logger = None
+
+# Dataset di tutte le sessioni attive, esaminati da spill_idle_datasets
+_datasets = weakref.WeakSet()
+_datasets_lock = threading.Lock()
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class SessionDataset:
+    """
+    DataFrame di una sessione che può essere scaricato su un file Parquet.
+
+    Il DataFrame restituito da get() va trattato in sola lettura: il file Parquet
+    viene scritto una sola volta e le modifiche successive andrebbero perse.
+
+    Utilizzo:
+        dataset = SessionDataset(df)
+        df = dataset.get()
+    """
+
+    def __init__(self, df, spill_dir=None, cache=None):
+        """
+        Args:
+            df (pd.DataFrame): DataFrame della sessione
+            spill_dir (str, optional): Directory dei file Parquet. Default a config.DATASET_SPILL_DIR.
+            cache (ParsedUploadCache, optional): Cache da cui è stato letto il DataFrame. Default a upload_cache.
+        """
+        self._df = df
+        # Impronta del file letto (vedi read_excel_file), chiave del DataFrame nella cache
+        self.cache_key = df.attrs.get('sha256')
+        self.cache = upload_cache if cache is None else cache
+        self.rows = len(df)
+        self.spill_dir = spill_dir or config.DATASET_SPILL_DIR
+        self.path = None
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+        with _datasets_lock:
+            _datasets.add(self)
+
+    @property
+    def spilled(self):
+        """
+        True se il DataFrame è su disco e non in memoria
+        """
+        return self._df is None
+
+    def get(self):
+        """
+        Restituisce il DataFrame, ricaricandolo dal file Parquet se era stato scaricato
+
+        Returns:
+            pd.DataFrame: DataFrame della sessione
+        """
+        with self._lock:
+            self.last_used = time.monotonic()
+            if self._df is None:
+                self._df = pd.read_parquet(self.path)
+            return self._df
+
+    def spill(self):
+        """
+        Salva il DataFrame su un file Parquet e lo rilascia dalla memoria
+
+        Returns:
+            bool: True se il DataFrame è stato scaricato, False se era già su disco o se pyarrow non è installato
+        """
+        with self._lock:
+            if self._df is None or not engine_available('pyarrow'):
+                return False
+            if self.path is None:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.parquet")
+                try:
+                    self._df.to_parquet(path)
+                except Exception as e:
+                    _remove_file(path)
+                    if error_logger:
+                        error_logger.log_error(f"Impossibile salvare il dataset della sessione su disco: {str(e)}",
+                                               exception=e, error_code="DATA-001")
+                    return False
+                self.path = path
+                # Il file viene eliminato quando il dataset non è più usato da nessuna sessione
+                weakref.finalize(self, _remove_file, path)
+            if self.cache_key:
+                # Le altre sessioni che usano lo stesso DataFrame ne tengono comunque un riferimento
+                self.cache.discard(self.cache_key, self._df)
+            self._df = None
+            return True
+
+def spill_idle_datasets(max_idle_seconds=None):
+    """
+    Scarica su disco i dataset delle sessioni non usati da più di max_idle_seconds
+
+    Args:
+        max_idle_seconds (float, optional): Inattività dopo cui scaricare un dataset.
+            Default a config.DATASET_SPILL_AFTER_SECONDS; 0 disattiva lo scaricamento.
+
+    Returns:
+        int: Numero di dataset scaricati
+    """
+    max_idle_seconds = config.DATASET_SPILL_AFTER_SECONDS if max_idle_seconds is None else max_idle_seconds
+    if max_idle_seconds <= 0:
+        return 0
+    now = time.monotonic()
+    with _datasets_lock:
+        datasets = list(_datasets)
+    return sum(
+        1 for dataset in datasets
+        if not dataset.spilled and now - dataset.last_used > max_idle_seconds and dataset.spill()
+    )
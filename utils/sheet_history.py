@@ -0,0 +1,199 @@
+"""
+Elaborazione incrementale dei file ricaricati.
+
+Chi coordina i corsi tiene spesso un unico file di presenze a cui aggiunge le
+nuove righe e che ricarica ogni settimana: senza un confronto con il
+caricamento precedente tutte le righe verrebbero elaborate di nuovo. Per ogni
+riga viene calcolata un'impronta a 64 bit di tutte le colonne del file
+(row_fingerprints, con le funzioni di hash vettoriali di pandas) e le impronte
+delle righe elaborate vengono conservate, per nome del file, modello e modalità
+di invio, in un database SQLite (SheetHistory). Al caricamento successivo
+SheetDiff confronta le impronte del file con quelle conservate e solo le righe
+nuove o modificate proseguono verso la generazione.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils.excel_reader import COLONNE_RICHIESTE
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheets (
+    name TEXT NOT NULL,
+    modello TEXT NOT NULL,
+    invio_email INTEGER NOT NULL,
+    righe INTEGER NOT NULL,
+    fingerprints BLOB NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (name, modello, invio_email)
+);
+"""
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+def row_fingerprints(df):
+    """
+    Calcola l'impronta di ogni riga a partire da tutte le colonne del file
+
+    L'impronta non dipende dal tipo delle colonne (testo, categorie, stringhe Arrow),
+    quindi un file letto per intero o a blocchi produce le stesse impronte.
+
+    Args:
+        df (pd.DataFrame): DataFrame letto con read_excel_file o un blocco di read_excel_chunks
+
+    Returns:
+        np.ndarray: Impronte (uint64) nell'ordine delle righe
+    """
+    return pd.util.hash_pandas_object(df[COLONNE_RICHIESTE], index=False).to_numpy(dtype=np.uint64)
+
+class SheetDiff:
+    """
+    Confronto delle righe di un file con la versione elaborata in precedenza.
+
+    compare() restituisce la maschera delle righe nuove o modificate e ne
+    annota le impronte; le righe che poi non vengono elaborate (non valide o non
+    riuscite) vanno tolte con discard(), così al caricamento successivo vengono
+    proposte di nuovo.
+
+    Con only_changed=False tutte le righe vengono considerate nuove, ma le
+    impronte della versione precedente vengono comunque conservate.
+
+    Utilizzo:
+        diff = SheetDiff(history.previous(nome_file, modello, invio_email))
+        nuove = diff.compare(df)
+        ...
+        history.save(nome_file, modello, invio_email, diff.fingerprints())
+    """
+
+    def __init__(self, previous=None, only_changed=True):
+        """
+        Args:
+            previous (dict, optional): Versione precedente restituita da SheetHistory.previous. Default a None (tutte le righe sono nuove).
+            only_changed (bool, optional): Se False tutte le righe vengono elaborate di nuovo. Default a True.
+        """
+        self.previous = previous['fingerprints'] if previous else np.empty(0, dtype=np.uint64)
+        self.only_changed = only_changed
+        self.unchanged = 0
+        self._nuove = {}
+
+    def compare(self, df, indici=None):
+        """
+        Individua le righe nuove o modificate
+
+        Args:
+            df (pd.DataFrame): Righe da confrontare
+            indici (array, optional): Numero di riga nel file di ogni riga di df. Default alle posizioni 0..len(df)-1.
+
+        Returns:
+            np.ndarray: Maschera booleana delle righe nuove o modificate
+        """
+        impronte = row_fingerprints(df)
+        if self.only_changed:
+            nuove = ~np.isin(impronte, self.previous)
+        else:
+            nuove = np.ones(len(impronte), dtype=bool)
+        indici = np.arange(len(df)) if indici is None else np.asarray(indici)
+        self.unchanged += int(len(nuove) - nuove.sum())
+        self._nuove.update(zip(indici[nuove].tolist(), impronte[nuove].tolist()))
+        return nuove
+
+    def discard(self, indice):
+        """
+        Esclude una riga non elaborata dalle impronte da conservare
+        """
+        self._nuove.pop(int(indice), None)
+
+    def fingerprints(self):
+        """
+        Restituisce le impronte da conservare: quelle della versione precedente e delle righe elaborate
+
+        Returns:
+            np.ndarray: Impronte ordinate e senza ripetizioni
+        """
+        elaborate = np.fromiter(self._nuove.values(), dtype=np.uint64, count=len(self._nuove))
+        return np.union1d(self.previous, elaborate)
+
+class SheetHistory:
+    """
+    Impronte delle righe già elaborate di ogni file, conservate in SQLite.
+
+    Le impronte di un file sono salvate come un unico array ordinato: anche per
+    100.000 righe si tratta di meno di 1 MB, letto e scritto con una sola query.
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path (str, optional): Percorso del database. Default a config.SHEET_HISTORY_PATH.
+        """
+        self.db_path = db_path or config.SHEET_HISTORY_PATH
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """
+        Chiude la connessione al database
+        """
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def previous(self, name, modello, send_mail):
+        """
+        Restituisce la versione elaborata in precedenza di un file
+
+        Args:
+            name (str): Nome del file
+            modello (str): Modello dell'attestato
+            send_mail (bool): True se gli attestati sono stati inviati per email
+
+        Returns:
+            dict: righe, updated_at e fingerprints (array ordinato), oppure None se il file non è mai stato elaborato
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT righe, fingerprints, updated_at FROM sheets WHERE name = ? AND modello = ? AND invio_email = ?",
+                (name, modello or 'presenza', int(bool(send_mail)))
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'righe': row['righe'],
+            'updated_at': row['updated_at'],
+            'fingerprints': np.frombuffer(row['fingerprints'], dtype=np.uint64),
+        }
+
+    def save(self, name, modello, send_mail, fingerprints):
+        """
+        Conserva le impronte delle righe elaborate di un file, sostituendo quelle precedenti
+
+        Args:
+            name (str): Nome del file
+            modello (str): Modello dell'attestato
+            send_mail (bool): True se gli attestati sono stati inviati per email
+            fingerprints (np.ndarray): Impronte da conservare (vedi SheetDiff.fingerprints)
+        """
+        impronte = np.unique(np.asarray(fingerprints, dtype=np.uint64))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sheets (name, modello, invio_email, righe, fingerprints, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (name, modello or 'presenza', int(bool(send_mail)), len(impronte), impronte.tobytes(), _now())
+            )